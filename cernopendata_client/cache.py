@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client content-addressed download cache."""
+
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    import fcntl
+
+    fcntl_available = True
+except ImportError:
+    fcntl_available = False
+
+from .config import DOWNLOAD_CACHE_LOCK_FILE
+
+FICLONE = 0x40049409
+"""Linux ioctl request cloning the extents of a file into another one."""
+
+CACHE_READ_MODE = 0o444
+"""Permission bits of the files stored in the download cache."""
+
+CACHE_WRITE_MODE = 0o222
+"""Permission bits that must not be set on a usable cached file."""
+
+
+def copy_file(src, dest):
+    """Materialise a file at a new path without transferring it again.
+
+    The file is reflinked on file systems supporting copy-on-write clones,
+    otherwise hardlinked if possible, otherwise copied within the kernel with
+    copy_file_range, and as a last resort copied through user space.
+
+    :param src: Path of the existing file
+    :param dest: Path of the new file, replaced if it exists
+    :type src: str
+    :type dest: str
+
+    :return: Method used, one of 'reflink', 'hardlink', 'copy_file_range' or
+        'copy'
+    :rtype: str
+    """
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if fcntl_available:
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return "reflink"
+            except OSError:
+                pass
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+            except OSError:
+                pass
+            if not remaining:
+                return "copy_file_range"
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst)
+    return "copy"
+
+
+def evict_files(directory, max_size, keep=None):
+    """Remove the least recently used files of a directory over a size limit.
+
+    :param directory: Directory of the cached files, searched recursively
+    :param max_size: Maximum total size of the files in bytes, None for no
+        limit
+    :param keep: Path of a file never to evict
+    :type directory: str
+    :type max_size: int
+    :type keep: str
+
+    :return: Total size of the remaining files in bytes, None if there is no
+        limit
+    :rtype: int
+    """
+    if not max_size:
+        return None
+    files = []
+    for dirpath, _dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            file_path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file_path))
+    total_size = sum(size for _mtime, size, _path in files)
+    for _mtime, size, file_path in sorted(files):
+        if total_size <= max_size:
+            break
+        if file_path == keep:
+            continue
+        try:
+            os.remove(file_path)
+        except OSError:
+            continue
+        total_size -= size
+    return total_size
+
+
+class DownloadCache:
+    """Download cache shared by all records and processes of a machine.
+
+    Files are stored under the key of their ADLER32 checksum and size, so
+    that a file referenced by several records is transferred only once.
+    Cached files are read-only, so that a file hardlinked into a record
+    directory cannot be changed in place for every other record sharing it.
+    Cache hits refresh the modification time of the cached file, and the
+    least recently used files are evicted when the cache grows over its size
+    limit. A lock file serialises the processes changing the cache.
+    """
+
+    def __init__(self, path, max_size=None):
+        """Initialise class instance.
+
+        :param path: Directory of the cache
+        :param max_size: Maximum size of the cache in bytes, None for no limit
+        :type path: str
+        :type max_size: int
+        """
+        self.path = path
+        self.max_size = max_size
+        self.objects_path = os.path.join(path, "objects")
+        self.thread_lock = threading.Lock()
+        os.makedirs(self.objects_path, exist_ok=True)
+
+    @contextlib.contextmanager
+    def lock(self, exclusive=False):
+        """Hold the cache lock, shared for readers and exclusive for writers."""
+        with self.thread_lock, open(
+            os.path.join(self.path, DOWNLOAD_CACHE_LOCK_FILE), "a"
+        ) as lock_file:
+            if fcntl_available:
+                fcntl.flock(
+                    lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                )
+            try:
+                yield
+            finally:
+                if fcntl_available:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def get_object_path(self, checksum, size):
+        """Return the path of the cached file with a checksum and size.
+
+        :param checksum: ADLER32 checksum of the file in the server format
+        :param size: Size of the file in bytes
+        :type checksum: str
+        :type size: int
+
+        :return: Path of the cached file, or None for files without ADLER32
+            checksum or size
+        :rtype: str
+        """
+        if not checksum or not checksum.startswith("adler32:") or size is None:
+            return None
+        key = "{}-{}".format(checksum[8:].lower(), size)
+        return os.path.join(self.objects_path, key[:2], key)
+
+    def check_object(self, object_path, size):
+        """Check that a cached file is read-only and has the expected size.
+
+        :param object_path: Path of the cached file
+        :param size: Size of the file in bytes
+        :type object_path: str
+        :type size: int
+
+        :return: Whether the cached file can be used
+        :rtype: bool
+        """
+        try:
+            stat = os.stat(object_path)
+        except OSError:
+            return False
+        return stat.st_size == size and not stat.st_mode & CACHE_WRITE_MODE
+
+    def fetch(self, checksum, size, file_dest):
+        """Materialise a cached file at its destination.
+
+        :param checksum: ADLER32 checksum of the file in the server format
+        :param size: Size of the file in bytes
+        :param file_dest: Local destination path of the file
+        :type checksum: str
+        :type size: int
+        :type file_dest: str
+
+        :return: Method used to materialise the file, or None on cache miss
+        :rtype: str
+        """
+        object_path = self.get_object_path(checksum, size)
+        if object_path is None:
+            return None
+        with self.lock():
+            if not self.check_object(object_path, size):
+                return None
+            try:
+                os.utime(object_path)
+            except OSError:
+                return None
+            method = copy_file(object_path, file_dest)
+        if os.path.getsize(file_dest) != size:
+            os.remove(file_dest)
+            return None
+        return method
+
+    def store(self, file_path, checksum, size):
+        """Add a downloaded file to the cache and evict old files over the limit.
+
+        :param file_path: Path of the downloaded file
+        :param checksum: ADLER32 checksum of the file in the server format
+        :param size: Size of the file in bytes
+        :type file_path: str
+        :type checksum: str
+        :type size: int
+        """
+        object_path = self.get_object_path(checksum, size)
+        if object_path is None or (self.max_size and size > self.max_size):
+            return
+        with self.lock(exclusive=True):
+            if self.check_object(object_path, size):
+                os.utime(object_path)
+                return
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(object_path))
+            os.close(fd)
+            try:
+                copy_file(file_path, tmp_path)
+                os.chmod(tmp_path, CACHE_READ_MODE)
+                os.replace(tmp_path, object_path)
+            except OSError:
+                if os.path.lexists(tmp_path):
+                    os.remove(tmp_path)
+                return
+            self.evict(keep=object_path)
+
+    def evict(self, keep=None):
+        """Remove the least recently used files until the cache fits its limit.
+
+        Must be called with the exclusive cache lock held.
+
+        :param keep: Path of a cached file never to evict
+        :type keep: str
+        """
+        evict_files(self.objects_path, self.max_size, keep=keep)
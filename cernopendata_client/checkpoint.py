@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client segment checkpoints of interrupted downloads."""
+
+import json
+import os
+import threading
+
+from .config import (
+    DOWNLOAD_CHECKPOINT_SIZE,
+    DOWNLOAD_PART_SUFFIX,
+    DOWNLOAD_SEGMENTS_SUFFIX,
+)
+
+
+def get_checkpoint_path(part_path):
+    """Return the path of the segment checkpoint stored next to a part file.
+
+    :param part_path: Path of the part file
+    :type part_path: str
+
+    :return: Path of the segment checkpoint
+    :rtype: str
+    """
+    return part_path + DOWNLOAD_SEGMENTS_SUFFIX
+
+
+def read_checkpoint(part_path, file_size):
+    """Return the segments checkpointed for a part file of the given size.
+
+    :param part_path: Path of the part file
+    :param file_size: Size of the remote file in bytes
+    :type part_path: str
+    :type file_size: int
+
+    :return: List of [start, end, offset, adler32] lists of the segments,
+        where offset is the first byte not yet written, or None if there is
+        no valid checkpoint for the part file
+    :rtype: list
+    """
+    try:
+        if os.path.getsize(part_path) != file_size:
+            return None
+        with open(get_checkpoint_path(part_path)) as f:
+            checkpoint = json.load(f)
+        if checkpoint["size"] != file_size:
+            return None
+        segments = [
+            [int(value) for value in segment] for segment in checkpoint["segments"]
+        ]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if not all(len(segment) == 4 for segment in segments):
+        return None
+    return segments
+
+
+def get_checkpoint_segments(part_path, file_size):
+    """Return the byte ranges of the segmented download checkpointed for a part file.
+
+    :param part_path: Path of the part file
+    :param file_size: Size of the remote file in bytes
+    :type part_path: str
+    :type file_size: int
+
+    :return: List of inclusive (start, end) byte offsets, empty if there is
+        no valid checkpoint for the part file
+    :rtype: list
+    """
+    segments = read_checkpoint(part_path, file_size) or []
+    return [(start, end) for start, end, _, _ in segments]
+
+
+def remove_checkpoint(part_path):
+    """Remove the segment checkpoint of a part file if there is one.
+
+    :param part_path: Path of the part file
+    :type part_path: str
+    """
+    try:
+        os.remove(get_checkpoint_path(part_path))
+    except FileNotFoundError:
+        pass
+
+
+class SegmentCheckpoint:
+    """Crash-safe record of the bytes written by every segment of a download.
+
+    The checkpoint is a JSON file next to the part file listing, for every
+    segment, the first byte not yet written and the ADLER32 value of the
+    bytes written before it. It is only updated after the part file is
+    flushed to disk, so that an interrupted download fetches only the byte
+    ranges missing from the part file.
+    """
+
+    def __init__(self, part_path, file_size, file_segments):
+        """Initialise class instance, resuming the checkpoint of the part file.
+
+        :param part_path: Path of the part file
+        :param file_size: Size of the remote file in bytes
+        :param file_segments: List of inclusive (start, end) byte offsets
+        :type part_path: str
+        :type file_size: int
+        :type file_segments: list
+        """
+        self.path = get_checkpoint_path(part_path)
+        self.file_size = file_size
+        self.lock = threading.Lock()
+        self.segments = {start: [end, start, 1] for start, end in file_segments}
+        self.resumed = False
+        segments = read_checkpoint(part_path, file_size)
+        if segments is not None and [
+            (start, end) for start, end, _, _ in segments
+        ] == list(file_segments):
+            self.segments = {
+                start: [end, offset, adler32]
+                for start, end, offset, adler32 in segments
+            }
+            self.resumed = True
+
+    def get_written(self):
+        """Return the number of bytes written by all segments.
+
+        :return: Number of bytes written
+        :rtype: int
+        """
+        return sum(offset - start for start, (_, offset, _) in self.segments.items())
+
+    def get_progress(self, start):
+        """Return where a segment resumes from.
+
+        :param start: First byte of the segment
+        :type start: int
+
+        :return: Tuple of the first byte not yet written and the ADLER32 value
+            of the bytes written before it
+        :rtype: tuple
+        """
+        _, offset, adler32 = self.segments[start]
+        return offset, adler32
+
+    def update(self, start, offset, adler32, part_file):
+        """Record the progress of a segment once enough of it is written.
+
+        :param start: First byte of the segment
+        :param offset: First byte of the segment not yet written
+        :param adler32: ADLER32 value of the bytes of the segment before offset
+        :param part_file: Part file the segment is written to
+        :type start: int
+        :type offset: int
+        :type adler32: int
+        :type part_file: file
+        """
+        end, saved_offset, _ = self.segments[start]
+        if offset <= end and offset - saved_offset < DOWNLOAD_CHECKPOINT_SIZE:
+            return
+        part_file.flush()
+        os.fsync(part_file.fileno())
+        with self.lock:
+            self.segments[start] = [end, offset, adler32]
+            self.save()
+
+    def save(self):
+        """Write the checkpoint atomically."""
+        checkpoint = {
+            "size": self.file_size,
+            "segments": [
+                [start, end, offset, adler32]
+                for start, (end, offset, adler32) in sorted(self.segments.items())
+            ],
+        }
+        temporary_path = self.path + DOWNLOAD_PART_SUFFIX
+        with open(temporary_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(temporary_path, self.path)
@@ -10,7 +10,6 @@
 
 import click
 import json
-import os
 import requests
 import sys
 import re
@@ -23,15 +22,7 @@ from .searcher import (
     get_record_as_json,
     verify_recid,
 )
-from .downloader import (
-    check_error,
-    download_single_file,
-    get_download_files_by_name,
-    get_download_files_by_range,
-    get_download_files_by_regexp,
-    get_download_path,
-    get_file_subdirectories,
-)
+from .downloader import stream_files
 from .validator import (
     validate_range,
     validate_recid,
@@ -39,6 +30,9 @@ from .validator import (
     validate_directory,
     validate_retry_limit,
     validate_retry_sleep,
+    validate_jobs,
+    validate_segments,
+    validate_output,
 )
 from .walker import get_list_directory
 from .verifier import get_file_info_local, verify_file_info
@@ -48,9 +42,22 @@ from .config import (
     LIST_DIRECTORY_TIMEOUT,
     DOWNLOAD_RETRY_LIMIT,
     DOWNLOAD_RETRY_SLEEP,
+    DOWNLOAD_HTTP_VERSION,
+    DOWNLOAD_JOBS,
+    DOWNLOAD_ORDER,
+    DOWNLOAD_SEGMENTS,
+    HTTP_POOL_MAXSIZE,
+    SERVE_CACHE_PORT,
 )
-from .utils import parse_parameters
-from .printer import display_message
+from .cache import DownloadCache
+from .history import ThroughputHistory
+from .scheduler import DownloadScheduler, RecordPrefetcher, get_record_selectors
+from .proxy import CacheProxy
+from .session import configure_session
+from .ratelimit import configure_rate_limit
+from .retry import configure_retry
+from .utils import parse_rate, parse_size
+from .printer import configure_display, display_message
 
 from .version import __version__
 
@@ -199,9 +206,29 @@ def get_file_locations(server, recid, doi, title, protocol, expand, verbose):
 
 
 @cernopendata_client.command()
-@click.option("--recid", type=click.INT, help="Record ID (exact match)")
-@click.option("--doi", help="Digital Object Identifier (exact match)")
-@click.option("--title", help="Record title (exact match, no wildcards)")
+@click.option(
+    "--recid",
+    multiple=True,
+    type=click.INT,
+    help="Record ID (exact match), can be given several times",
+)
+@click.option(
+    "--doi",
+    multiple=True,
+    help="Digital Object Identifier (exact match), can be given several times",
+)
+@click.option(
+    "--title",
+    multiple=True,
+    help="Record title (exact match, no wildcards), can be given several times",
+)
+@click.option(
+    "--query",
+    "query",
+    type=click.STRING,
+    help="Download the records matching a search query of the portal "
+    "(e.g. 'experiment:CMS AND type:Dataset')",
+)
 @click.option(
     "--protocol",
     default="http",
@@ -244,6 +271,14 @@ def get_file_locations(server, recid, doi, title, protocol, expand, verbose):
     type=click.STRING,
     help="Download files from a specified list range (i-j)",
 )
+@click.option(
+    "--shard",
+    "shard",
+    type=click.STRING,
+    help="Download only shard i of N shards of near-equal total size of the "
+    "selected files (i/N). Jobs given different shards of the same record "
+    "download different files without any coordination",
+)
 @click.option(
     "--verify",
     "verify",
@@ -265,143 +300,260 @@ def get_file_locations(server, recid, doi, title, protocol, expand, verbose):
     "retry_sleep",
     default=DOWNLOAD_RETRY_SLEEP,
     type=click.INT,
-    help="Sleep time in seconds before retrying downloads [default={}]".format(
-        DOWNLOAD_RETRY_SLEEP
-    ),
+    help="Initial sleep time in seconds before retrying downloads, doubled "
+    "after every retry [default={}]".format(DOWNLOAD_RETRY_SLEEP),
 )
 @click.option(
     "--download-engine",
     "download_engine",
-    type=click.Choice(["requests", "pycurl", "xrootd"]),
+    type=click.Choice(["requests", "pycurl", "pycurl-multi", "race", "xrootd"]),
     help="Download engine to use when downloading files."
-    "The available values are 'requests', 'pycurl', 'xrootd'."
-    "[default=requests (for HTTP protocol), xrootd (for XRootD protocol)]",
+    "The available values are 'requests', 'pycurl', 'pycurl-multi', 'race', "
+    "'xrootd'. "
+    "[default=historically fastest available engine (for HTTP protocol), "
+    "xrootd (for XRootD protocol)]",
+)
+@click.option(
+    "--jobs",
+    "jobs",
+    default=DOWNLOAD_JOBS,
+    type=click.INT,
+    help="Number of files to download concurrently [default={}]".format(DOWNLOAD_JOBS),
+)
+@click.option(
+    "--cache-dir",
+    "cache_dir",
+    type=click.Path(file_okay=False),
+    help="Directory of a download cache shared by all records and processes: "
+    "files found in it are linked or copied instead of being downloaded, and "
+    "downloaded files are added to it",
+)
+@click.option(
+    "--cache-size",
+    "cache_size",
+    type=click.STRING,
+    help="Maximum size of the download cache, optionally followed by K, M, G or "
+    "T, the least recently used files being evicted [default=no limit]",
+)
+@click.option(
+    "--order",
+    "order",
+    default=DOWNLOAD_ORDER,
+    type=click.Choice(["metadata", "largest-first", "smallest-first"]),
+    help="Order in which files are transferred: in record metadata order, "
+    "largest files first to minimise the total time of parallel downloads, "
+    "or smallest files first for quick partial results "
+    "[default={}]".format(DOWNLOAD_ORDER),
+)
+@click.option(
+    "--output",
+    "output",
+    type=click.STRING,
+    help="Stream the selected files in order to the standard output ('-') or "
+    "to a named pipe instead of saving them",
+)
+@click.option(
+    "--http-version",
+    "http_version",
+    default=DOWNLOAD_HTTP_VERSION,
+    type=click.Choice(["auto", "2", "1.1"]),
+    help="HTTP version of the pycurl download engines: 'auto' negotiates "
+    "HTTP/2 over HTTPS and keeps HTTP/1.1 connections alive otherwise, '2' "
+    "also speaks HTTP/2 over HTTP, falling back to HTTP/1.1 for servers "
+    "refusing it, '1.1' never uses HTTP/2 [default={}]".format(DOWNLOAD_HTTP_VERSION),
+)
+@click.option(
+    "--limit-rate",
+    "limit_rate",
+    type=click.STRING,
+    help="Maximum download rate of all files together in bytes per second, "
+    "optionally followed by K, M or G (e.g. 50M)",
+)
+@click.option(
+    "--limit-rate-per-transfer",
+    "limit_rate_per_transfer",
+    type=click.STRING,
+    help="Maximum download rate of every single file in bytes per second, "
+    "optionally followed by K, M or G (e.g. 10M)",
+)
+@click.option(
+    "--journal/--no-journal",
+    "journal",
+    default=True,
+    help="Record the state of the downloaded files in a journal next to the "
+    "record directory [default=journal]",
+)
+@click.option(
+    "--queue",
+    "queue",
+    is_flag=True,
+    default=False,
+    help="Share the download of the record with other download-files "
+    "processes, possibly on other nodes, writing to the same directory on a "
+    "shared file system: every file is claimed by one process, and the "
+    "files of processes which went away are claimed again",
+)
+@click.option(
+    "--incremental/--no-incremental",
+    "incremental",
+    default=True,
+    help="Skip the files which are already downloaded completely "
+    "[default=incremental]",
+)
+@click.option(
+    "--segments",
+    "segments",
+    default=DOWNLOAD_SEGMENTS,
+    type=click.INT,
+    help="Number of byte ranges (HTTP protocol) or streams (XRootD protocol) "
+    "to download each large file in concurrently [default={}]".format(
+        DOWNLOAD_SEGMENTS
+    ),
 )
 def download_files(
     server,
     recid,
     doi,
     title,
+    query,
     protocol,
     expand,
     names,
     regexp,
     ranges,
+    shard,
     dryrun,
     verify,
     retry_limit,
     retry_sleep,
     download_engine,
+    jobs,
+    segments,
+    journal,
+    queue,
+    incremental,
+    limit_rate,
+    limit_rate_per_transfer,
+    http_version,
+    output,
+    order,
+    cache_dir,
+    cache_size,
 ):
-    """Download data files belonging to a record.
+    """Download data files belonging to records.
 
-    Select a CERN Open Data bibliographic record by a record ID, a
-    DOI, or a title and download data files belonging to this record.
+    Select CERN Open Data bibliographic records by record IDs, DOIs, titles
+    or a search query and download data files belonging to these records.
 
     Examples: \n
     \t $ cernopendata-client download-files --recid 5500\n
+    \t $ cernopendata-client download-files --recid 5500 --recid 5501 --jobs 4\n
+    \t $ cernopendata-client download-files --query 'experiment:CMS AND type:Dataset' --jobs 4\n
     \t $ cernopendata-client download-files --recid 5500 --filter-name BuildFile.xml\n
     \t $ cernopendata-client download-files --recid 5500 --filter-regexp py$\n
     \t $ cernopendata-client download-files --recid 5500 --filter-range 1-4\n
     \t $ cernopendata-client download-files --recid 5500 --filter-range 1-2,5-7\n
-    \t $ cernopendata-client download-files --recid 5500 --filter-regexp py --filter-range 1-2
+    \t $ cernopendata-client download-files --recid 5500 --filter-regexp py --filter-range 1-2\n
+    \t $ cernopendata-client download-files --recid 5500 --jobs 4\n
+    \t $ cernopendata-client download-files --recid 5500 --segments 8\n
+    \t $ cernopendata-client download-files --recid 5500 --download-engine pycurl-multi --jobs 16\n
+    \t $ cernopendata-client download-files --recid 5500 --download-engine pycurl-multi --http-version 2\n
+    \t $ cernopendata-client download-files --recid 5500 --jobs 4 --limit-rate 50M\n
+    \t $ cernopendata-client download-files --recid 5500 --jobs 4 --order largest-first\n
+    \t $ cernopendata-client download-files --recid 5500 --cache-dir /scratch/cache --cache-size 100G\n
+    \t $ cernopendata-client download-files --recid 5500 --filter-name BuildFile.xml --output -\n
+    \t $ cernopendata-client download-files --recid 5500 --shard 2/10\n
+    \t $ cernopendata-client download-files --recid 5500 --queue --jobs 4
     """
     validate_server(server)
-    if recid is not None:
-        validate_recid(recid)
+    for record_id in recid:
+        validate_recid(record_id)
     if retry_limit:
         validate_retry_limit(retry_limit=retry_limit)
     if retry_sleep:
         validate_retry_sleep(retry_sleep=retry_sleep)
-    # Get record metadata and resolve recid from DOI/title if needed
-    record_json = get_record_as_json(server, recid, doi, title)
-    record_recid = record_json["metadata"]["recid"]
-    file_locations_info = get_files_list(server, record_json, protocol, expand)
-    file_locations = [file_[0] for file_ in file_locations_info]
-    download_file_locations = []
-
-    if names:
-        parsed_name_filters = parse_parameters(names)
-        dload_file_location_name = get_download_files_by_name(
-            names=parsed_name_filters, file_locations=file_locations
-        )
-        download_file_locations = dload_file_location_name
-    if regexp:
-        dload_file_location_regexp = get_download_files_by_regexp(
-            regexp=regexp,
-            file_locations=file_locations,
-            filtered_files=download_file_locations if names else None,
-        )
-        download_file_locations = dload_file_location_regexp
-    if ranges:
-        parsed_range_filters = parse_parameters(ranges)
-        dload_file_location_range = get_download_files_by_range(
-            ranges=parsed_range_filters,
-            file_locations=file_locations,
-            filtered_files=download_file_locations if names or regexp else None,
-        )
-        download_file_locations = dload_file_location_range
-
-    if names or regexp or ranges:
-        if not download_file_locations:
-            display_message(
-                msg_type="error",
-                msg="No files matching the filters",
-            )
-            sys.exit(1)
-    else:
-        download_file_locations = file_locations
+    validate_jobs(jobs=jobs)
+    validate_segments(segments=segments)
+    validate_output(output=output, protocol=protocol)
+    # keep the standard output for the streamed file contents
+    configure_display(err=output == "-")
+    configure_session(
+        pool_maxsize=max(HTTP_POOL_MAXSIZE, jobs * segments),
+        http_version=http_version,
+    )
+    configure_retry(limit=retry_limit, sleep=retry_sleep)
+    configure_rate_limit(
+        rate=parse_rate(limit_rate),
+        transfer_rate=parse_rate(limit_rate_per_transfer, "--limit-rate-per-transfer"),
+    )
+    # Get record metadata, resolving recids from DOIs/titles/query if needed,
+    # ahead of the downloads of the files of the previous records
+    records = RecordPrefetcher(
+        server,
+        get_record_selectors(server, recid, doi, title, query),
+        protocol=protocol,
+        expand=expand,
+        names=names,
+        regexp=regexp,
+        ranges=ranges,
+        shard=shard,
+    )
 
     if dryrun:
-        display_message(msg="\n".join(download_file_locations))
-        sys.exit(0)
-
-    total_files = len(download_file_locations)
-    base_path = record_recid
-    if not os.path.isdir(base_path):
-        try:
-            os.mkdir(base_path)
-        except OSError:
-            display_message(
-                msg_type="error",
-                msg="Creation of the directory {} failed".format(base_path),
-            )
-    file_subdirs = get_file_subdirectories(download_file_locations)
-    if not download_engine:
-        if protocol.startswith("http"):
-            download_engine = "requests"
-        elif protocol == "xrootd":
-            download_engine = "xrootd"
-    for file_location in download_file_locations:
-        path = get_download_path(base_path, file_location, file_subdirs)
-        display_message(
-            msg_type="info",
-            msg="Downloading file {} of {}".format(
-                download_file_locations.index(file_location) + 1, total_files
-            ),
-        )
-        download_single_file(
-            path=path,
-            file_location=file_location,
-            protocol=protocol,
-            download_engine=download_engine,
-        )
-        check_error(
-            path=path,
-            file_location=file_location,
-            protocol=protocol,
+        for record_files in records:
+            display_message(msg="\n".join(record_files.file_locations))
+        sys.exit(1 if records.failed else 0)
+
+    if output:
+        selected_records = list(records)
+        stream_files(
+            [
+                file_location
+                for record_files in selected_records
+                for file_location in record_files.file_locations
+            ],
+            output,
             retry_limit=retry_limit,
             retry_sleep=retry_sleep,
+            file_sizes={
+                file_location: file_size
+                for record_files in selected_records
+                for file_location, file_size in record_files.file_sizes.items()
+            },
+            file_checksums={
+                file_location: file_checksum
+                for record_files in selected_records
+                for file_location, file_checksum in record_files.file_checksums.items()
+            },
+            verify=verify,
         )
-        if verify:
-            file_info_remote = get_file_info_remote(
-                server,
-                record_recid,
-                protocol=protocol,
-                filtered_files=[file_location],
-            )
-            file_info_local = get_file_info_local(record_recid)
-            verify_file_info(file_info_local, file_info_remote)
+        if records.failed:
+            sys.exit(1)
+        display_message(msg_type="info", msg="Success!")
+        return
+
+    history = ThroughputHistory()
+    scheduler = DownloadScheduler(
+        protocol,
+        download_engine=download_engine,
+        jobs=jobs,
+        order=order,
+        journal=journal,
+        queue=queue,
+        cache=DownloadCache(cache_dir, parse_size(cache_size)) if cache_dir else None,
+        history=history,
+        options={
+            "retry_limit": retry_limit,
+            "retry_sleep": retry_sleep,
+            "segments": segments,
+            "verify": verify,
+            "incremental": incremental,
+        },
+    )
+    scheduler.download(records)
+    history.save()
+    if not scheduler.report(records.failed):
+        sys.exit(1)
     display_message(
         msg_type="info",
         msg="Success!",
@@ -477,6 +629,70 @@ def verify_files(server, recid, doi, title):
     )
 
 
+@cernopendata_client.command()
+@click.option(
+    "--server",
+    default=SERVER_HTTP_URI,
+    type=click.STRING,
+    help="Which CERN Open Data server to cache? [default={}]".format(SERVER_HTTP_URI),
+)
+@click.option(
+    "--cache-dir",
+    "cache_dir",
+    required=True,
+    type=click.Path(file_okay=False),
+    help="Directory where metadata and files are cached",
+)
+@click.option(
+    "--cache-size",
+    "cache_size",
+    type=click.STRING,
+    help="Maximum size of the cache, optionally followed by K, M, G or T, the "
+    "least recently used entries being evicted [default=no limit]",
+)
+@click.option(
+    "--host",
+    "host",
+    default="127.0.0.1",
+    type=click.STRING,
+    help="Address to listen on, e.g. 0.0.0.0 to serve the whole network "
+    "[default=127.0.0.1]",
+)
+@click.option(
+    "--port",
+    "port",
+    default=SERVE_CACHE_PORT,
+    type=click.INT,
+    help="Port to listen on [default={}]".format(SERVE_CACHE_PORT),
+)
+def serve_cache(server, cache_dir, cache_size, host, port):
+    """Run a caching proxy of a CERN Open Data server.
+
+    Serve record metadata and files of a CERN Open Data server from a local
+    cache, so that the machines of a site download every file only once.
+    Point the other clients to the proxy using their --server option.
+
+    Examples: \n
+    \t $ cernopendata-client serve-cache --cache-dir /scratch/cache\n
+    \t $ cernopendata-client serve-cache --cache-dir /scratch/cache --cache-size 1T --host 0.0.0.0 --port 8080\n
+    \t $ cernopendata-client download-files --recid 5500 --server http://proxy.example.org:8080
+    """
+    validate_server(server)
+    proxy = CacheProxy((host, port), server, cache_dir, parse_size(cache_size))
+    display_message(
+        msg_type="info",
+        msg="Serving {} from {} on http://{}:{}".format(
+            server, cache_dir, host, proxy.server_address[1]
+        ),
+    )
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.server_close()
+
+
 @cernopendata_client.command()
 @click.option(
     "-R",
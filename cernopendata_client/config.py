@@ -26,6 +26,15 @@ PRINTER_COLOUR_NOTE = "blue"
 PRINTER_COLOUR_ERROR = "red"
 """Default colour for error messages on terminal."""
 
+SEARCH_PAGE_SIZE = 100
+"""Number of records fetched per request when searching records."""
+
+HTTP_POOL_CONNECTIONS = 10
+"""Default number of hosts to keep HTTP connection pools for."""
+
+HTTP_POOL_MAXSIZE = 10
+"""Default maximum number of kept-alive HTTP connections per host."""
+
 LIST_DIRECTORY_TIMEOUT = 60
 """Default timeout for list-directory command."""
 
@@ -33,12 +42,112 @@ DOWNLOAD_RETRY_LIMIT = 10
 """Default retries for getting a file from the server."""
 
 DOWNLOAD_RETRY_SLEEP = 5
-"""Sleep time in seconds before retrying downloads."""
+"""Sleep time in seconds before retrying downloads, doubled after every retry."""
+
+RETRY_BACKOFF_MAX = 300
+"""Maximum sleep time in seconds of the exponential backoff between retries."""
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+"""HTTP status codes of the transient server failures which are retried."""
+
+RETRY_BREAKER_THRESHOLD = 5
+"""Number of consecutive failures after which a server is paused."""
+
+RETRY_BREAKER_PAUSE = 30
+"""Time in seconds the requests to a failing server are paused for."""
+
+DOWNLOAD_JOBS = 1
+"""Default number of files downloaded concurrently."""
+
+DOWNLOAD_PREFETCH_RECORDS = 4
+"""Number of records whose metadata is fetched ahead of the download of their files."""
+
+DOWNLOAD_ORDER = "metadata"
+"""Default order in which files are transferred."""
+
+DOWNLOAD_SEGMENTS = 1
+"""Default number of byte ranges a single file is downloaded in concurrently."""
+
+DOWNLOAD_HTTP_VERSION = "auto"
+"""Default HTTP version of the pycurl download engines.
+
+'auto' negotiates HTTP/2 on TLS connections and keeps HTTP/1.1 connections
+alive otherwise, '2' also speaks HTTP/2 on cleartext connections, falling back
+to HTTP/1.1 for servers refusing it, and '1.1' never uses HTTP/2."""
+
+DOWNLOAD_HTTP2_STREAMS = 8
+"""Number of transfers of the pycurl-multi engine multiplexed per HTTP/2 connection."""
+
+DOWNLOAD_SEGMENT_MIN_SIZE = 16 * 1024 * 1024
+"""Minimum size in bytes of a byte range of a segmented download."""
+
+DOWNLOAD_CHUNK_SIZE_MIN = 64 * 1024
+"""Initial size in bytes of the blocks read from the server."""
+
+DOWNLOAD_CHUNK_SIZE_MAX = 8 * 1024 * 1024
+"""Maximum size in bytes of the blocks read from the server."""
+
+DOWNLOAD_CHUNK_TIME = 0.1
+"""Read time in seconds below which the size of the read blocks is doubled."""
+
+DOWNLOAD_PROGRESS_INTERVAL = 0.5
+"""Minimum time in seconds between two download progress updates."""
+
+DOWNLOAD_RACE_PROBE_SIZE = 1024 * 1024
+"""Size in bytes of the start of a file fetched over each protocol when racing them."""
+
+DOWNLOAD_RACE_STALL_TIMEOUT = 30
+"""Time in seconds without data after which a raced download fails over."""
+
+DOWNLOAD_RATE_BURST_TIME = 0.5
+"""Time in seconds of transfer at the maximum rate allowed in a single burst."""
+
+DOWNLOAD_HISTORY_SMOOTHING = 0.3
+"""Weight of the latest transfer in the throughput history of an engine."""
+
+DOWNLOAD_HISTORY_EXPLORATION_RATE = 0.1
+"""Fraction of downloads trying a random engine instead of the fastest one."""
+
+DOWNLOAD_HISTORY_MAX_AGE = 7 * 24 * 3600
+"""Time in seconds after which the throughput history of an engine is refreshed."""
+
+DOWNLOAD_PART_SUFFIX = ".part"
+"""Suffix of the file a download is written to until it is validated and renamed."""
+
+DOWNLOAD_SEGMENTS_SUFFIX = ".segments"
+"""Suffix of the checkpoint of the segments written to a part file."""
+
+DOWNLOAD_CHECKPOINT_SIZE = 64 * 1024 * 1024
+"""Number of bytes a segment writes between two checkpoints of a segmented download."""
+
+DOWNLOAD_JOURNAL_SUFFIX = ".journal"
+"""Suffix of the download journal stored next to a record directory."""
+
+DOWNLOAD_QUEUE_SUFFIX = ".queue"
+"""Suffix of the work queue directory stored next to a record directory."""
+
+DOWNLOAD_QUEUE_LEASE_TIME = 60
+"""Time in seconds after which a claim of the work queue which was not renewed is abandoned."""
+
+DOWNLOAD_CACHE_LOCK_FILE = "lock"
+"""Name of the lock file serialising the processes sharing a download cache."""
+
+SERVE_CACHE_PORT = 8080
+"""Default port of the site-local caching proxy."""
+
+SERVE_CACHE_METADATA_TTL = 3600
+"""Time in seconds the caching proxy serves metadata without asking the server."""
+
+SERVE_CACHE_EVICT_RATIO = 0.9
+"""Fraction of its size limit the caching proxy evicts its cache down to."""
 
 DOWNLOAD_ERROR_PAGE = {"size": 3846, "checksum": "adler32:a82d5324"}
 """Error page info from the server."""
 
-DOWNLOAD_ENGINE_PROTOCOL_HTTP_MAP = ["pycurl", "requests"]
+VERIFIER_CHUNK_SIZE = 8 * 1024 * 1024
+"""Size in bytes of the blocks read when checksumming local files."""
+
+DOWNLOAD_ENGINE_PROTOCOL_HTTP_MAP = ["pycurl", "pycurl-multi", "race", "requests"]
 """Download engines compatible with HTTP protocol."""
 
 DOWNLOAD_ENGINE_PROTOCOL_XROOTD_MAP = ["xrootd"]
@@ -9,10 +9,24 @@
 """cernopendata-client file downloading related utilities."""
 
 from __future__ import print_function
+import contextlib
+import itertools
 import sys
 import os
 import re
+import threading
 import time
+import zlib
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+
+    fcntl_available = True
+except ImportError:
+    fcntl_available = False
 
 try:
     import requests
@@ -36,32 +50,212 @@ except ImportError:
     xrootd_available = False
 
 
-from .validator import validate_range
+from .checkpoint import (
+    SegmentCheckpoint,
+    get_checkpoint_path,
+    get_checkpoint_segments,
+    remove_checkpoint,
+)
+from .utils import parse_parameters
+from .validator import validate_range, validate_shard
 from .printer import display_message
-from .verifier import get_file_checksum
+from .ratelimit import get_rate_limit, get_rate_limiter
+from .retry import (
+    RETRYABLE_ERRORS,
+    RetryableError,
+    call_with_retry,
+    check_retry_status,
+    get_circuit_breaker,
+    get_retry_delay,
+    get_retry_limit,
+    parse_retry_after,
+    request_with_retry,
+)
+from .session import (
+    check_curl_http2_refused,
+    get_curl_http_version,
+    get_curl_retry_errors,
+    get_curl_share,
+    get_session,
+    is_curl_http2,
+)
+from .verifier import (
+    combine_adler32,
+    format_adler32_checksum,
+    get_file_adler32,
+    get_file_info,
+    verify_file_info,
+)
 from .config import (
+    DOWNLOAD_CHUNK_SIZE_MAX,
+    DOWNLOAD_CHUNK_SIZE_MIN,
+    DOWNLOAD_CHUNK_TIME,
     DOWNLOAD_ERROR_PAGE,
     DOWNLOAD_ENGINE_PROTOCOL_HTTP_MAP,
     DOWNLOAD_ENGINE_PROTOCOL_XROOTD_MAP,
+    DOWNLOAD_HTTP2_STREAMS,
+    DOWNLOAD_PART_SUFFIX,
+    DOWNLOAD_PROGRESS_INTERVAL,
+    DOWNLOAD_RACE_PROBE_SIZE,
+    DOWNLOAD_RACE_STALL_TIMEOUT,
+    DOWNLOAD_SEGMENT_MIN_SIZE,
+    RETRY_STATUS_CODES,
     SERVER_ROOT_URI,
 )
 
 
+class DownloadError(Exception):
+    """Failure of the download of a file which is not worth retrying.
+
+    Download engines raise it instead of exiting, so that the failure of a
+    file transferred by a worker thread is reported with the other failed
+    files of its record.
+    """
+
+
+def progress_due(downloader, download_t, download_d):
+    """Return True if the download progress of a file should be shown now.
+
+    Progress is shown at most every DOWNLOAD_PROGRESS_INTERVAL seconds and
+    when the download completes, independently of the size of the chunks.
+
+    :param downloader: Downloader engine instance of the file
+    :param download_t: Total number of bytes to download
+    :param download_d: Number of bytes downloaded so far
+    :type download_t: int
+    :type download_d: int
+
+    :return: True if the progress should be shown
+    :rtype: bool
+    """
+    now = time.monotonic()
+    done = 0 < download_t <= download_d
+    if not done and now - downloader.progress_time < DOWNLOAD_PROGRESS_INTERVAL:
+        return False
+    downloader.progress_time = now
+    return True
+
+
+def is_download_error_page(file_location, status_code, headers, first_bytes):
+    """Return True if a response carries the error page of the server instead of a file.
+
+    The error page is recognised from the start of the response, before
+    anything is written to disk, by its status code, its content type or its
+    first bytes, unless the requested file is itself an HTML page.
+
+    :param file_location: Remote location of a file
+    :param status_code: HTTP status code of the response
+    :param headers: Response headers with lowercase names
+    :param first_bytes: First bytes of the response body
+    :type file_location: str
+    :type status_code: int
+    :type headers: dict
+    :type first_bytes: bytes
+
+    :return: True if the response is an error page
+    :rtype: bool
+    """
+    if status_code not in (200, 206):
+        return True
+    if file_location.lower().endswith((".html", ".htm")):
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/html":
+        return True
+    return (
+        bytes(first_bytes)
+        .lstrip()[:14]
+        .lower()
+        .startswith((b"<!doctype html", b"<html"))
+    )
+
+
+def is_permanent_error_status(status_code):
+    """Return True if a response status means that retrying the download is useless.
+
+    Client errors other than request timeouts and rate limiting mean that the
+    file is missing or not accessible, so the download fails at once instead
+    of being retried like the error page of the server.
+
+    :param status_code: HTTP status code of the response
+    :type status_code: int
+
+    :return: True if the status is a permanent client error
+    :rtype: bool
+    """
+    return 400 <= status_code < 500 and status_code not in (
+        (408, 416) + RETRY_STATUS_CODES
+    )
+
+
+def check_download_status(file_location, status_code):
+    """Raise DownloadError if the server refused to send a file for good.
+
+    :param file_location: Remote location of a file
+    :param status_code: HTTP status code of the response
+    :type file_location: str
+    :type status_code: int
+    """
+    if is_permanent_error_status(status_code):
+        raise DownloadError(
+            "Download of {} failed: server responded with status {}.".format(
+                file_location.split("/")[-1], status_code
+            )
+        )
+
+
+def iter_response(response):
+    """Yield response body in chunks read into a reusable buffer.
+
+    The size of the chunks starts at DOWNLOAD_CHUNK_SIZE_MIN and doubles
+    up to DOWNLOAD_CHUNK_SIZE_MAX while the server fills them quickly, so
+    that fast transfers need only a few Python-level iterations per GiB.
+    The yielded memoryview is only valid until the next chunk is read.
+
+    :param response: Streamed response of the server
+    :type response: requests.Response
+    """
+    response.raw.decode_content = True
+    chunk_size = DOWNLOAD_CHUNK_SIZE_MIN
+    buffer = memoryview(bytearray(chunk_size))
+    while True:
+        read_start = time.monotonic()
+        size = response.raw.readinto(buffer)
+        if not size:
+            return
+        yield buffer[:size]
+        if (
+            size == chunk_size
+            and chunk_size < DOWNLOAD_CHUNK_SIZE_MAX
+            and time.monotonic() - read_start < DOWNLOAD_CHUNK_TIME
+        ):
+            chunk_size = min(chunk_size * 2, DOWNLOAD_CHUNK_SIZE_MAX)
+            buffer = memoryview(bytearray(chunk_size))
+
+
 class DownloaderHttpRequests:
     """Downloader class for managing download related utilities with requests downloader engine."""
 
-    def __init__(self, path, file_location, mode, file_size_offline):
+    def __init__(self, path, file_location, mode, file_size_offline, progress=True):
         """Initialise class instance."""
         self.kb = 1024
         self.path = path
         self.mode = mode
+        self.progress = progress
         self.file_location = file_location
         self.file_name = self.file_location.split("/")[-1]
-        self.file_dest = self.path + "/" + self.file_name
+        self.file_dest = get_part_path(self.path + "/" + self.file_name)
         self.file_size_offline = file_size_offline if file_size_offline else 0
+        self.downloaded = 0
+        self.adler32 = 1
+        self.progress_time = 0
+        self.error_page = False
+        self.rate_limiter = get_rate_limiter()
 
     def show_download_progress(self, download_t=None, download_d=None):
         """Show download progress of a file."""
+        if not self.progress or not progress_due(self, download_t, download_d):
+            return
         display_message(
             msg_type="progress",
             msg="Progress: {}/{} KiB ({}%)\r".format(
@@ -74,11 +268,35 @@ class DownloaderHttpRequests:
 
     def file_downloader(self):
         """Download single file with requests."""
-        headers = {}
+        headers = {"Accept-Encoding": "identity"}
         if self.file_size_offline:
             headers["Range"] = "bytes={}-".format(self.file_size_offline)
-        response = requests.get(self.file_location, headers=headers, stream=True)
+        response = get_session().get(self.file_location, headers=headers, stream=True)
+        check_retry_status(response)
+        if is_permanent_error_status(response.status_code):
+            response.close()
+            check_download_status(self.file_location, response.status_code)
+        if self.file_size_offline and response.status_code == 416:
+            # the file was complete already
+            response.close()
+            self.start_checksum()
+            return
+        if self.file_size_offline and response.status_code == 200:
+            # the server does not honour the byte range, start from scratch
+            self.mode = "wb"
+            self.file_size_offline = 0
         total_size = int(response.headers.get("content-length", 0))
+        chunks = iter_response(response)
+        first_chunk = next(chunks, b"")
+        self.error_page = is_download_error_page(
+            self.file_location,
+            response.status_code,
+            {name.lower(): value for name, value in response.headers.items()},
+            first_chunk[:64],
+        )
+        if self.error_page:
+            response.close()
+            return
         with open(self.file_dest, self.mode) as f:
             display_message(
                 msg_type="note",
@@ -87,41 +305,108 @@ class DownloaderHttpRequests:
                     self.file_name,
                 ),
             )
-            downloaded = self.file_size_offline
+            self.start_checksum()
             total_size = total_size + self.file_size_offline
-            for data in response.iter_content(chunk_size=1024):
-                downloaded += len(data)
+            for data in itertools.chain([first_chunk], chunks):
+                self.rate_limiter.consume(len(data))
+                self.downloaded += len(data)
+                self.adler32 = zlib.adler32(data, self.adler32)
                 try:
                     f.write(data)
-                except Exception:
-                    display_message(
-                        msg_type="error",
-                        msg="Download error occured. Please try again.",
+                except OSError as e:
+                    raise DownloadError(
+                        "Writing {} failed: {}.".format(self.file_name, e)
                     )
-                    sys.exit(1)
                 self.show_download_progress(
-                    download_t=total_size, download_d=downloaded
+                    download_t=total_size, download_d=self.downloaded
+                )
+        if self.downloaded < total_size:
+            raise RetryableError(
+                "Connection closed after {} of {} bytes".format(
+                    self.downloaded, total_size
                 )
-                headers = {}
+            )
+
+    def segment_downloader(self, start, end):
+        """Download byte range of a file with requests into its place.
+
+        The download resumes from the bytes of the range already written
+        according to the segment checkpoint.
+
+        :return: False if the server did not honour the byte range
+        :rtype: bool
+        """
+        offset, adler32 = self.checkpoint.get_progress(start)
+        if offset > end:
+            self.segments_adler32[start] = adler32
+            return True
+        headers = {
+            "Accept-Encoding": "identity",
+            "Range": "bytes={}-{}".format(offset, end),
+        }
+        response = get_session().get(self.file_location, headers=headers, stream=True)
+        check_retry_status(response)
+        if response.status_code != 206:
+            response.close()
+            return False
+        with open(self.file_dest, "r+b") as f:
+            f.seek(offset)
+            for data in iter_response(response):
+                self.rate_limiter.consume(len(data))
+                adler32 = zlib.adler32(data, adler32)
+                try:
+                    f.write(data)
+                except OSError as e:
+                    raise DownloadError(
+                        "Writing {} failed: {}.".format(self.file_name, e)
+                    )
+                offset += len(data)
+                self.checkpoint.update(start, offset, adler32, f)
+                self.segment_downloaded(len(data))
+        self.segments_adler32[start] = adler32
+        return True
+
+    def segment_downloaded(self, size):
+        """Account downloaded bytes of a segment and show download progress."""
+        with self.segments_lock:
+            self.downloaded += size
+            self.show_download_progress(
+                download_t=self.file_size, download_d=self.downloaded
+            )
+
+    def start_checksum(self):
+        """Start the running checksum, accounting for already downloaded data."""
+        self.downloaded = self.file_size_offline
+        self.adler32 = 1
+        if self.file_size_offline:
+            self.adler32 = get_file_adler32(self.file_dest)
 
 
 class DownloaderHttpPycurl:
     """Downloader class for managing download related utilities with pycurl downloader engine."""
 
-    def __init__(self, path, file_location, mode, file_size_offline):
+    def __init__(self, path, file_location, mode, file_size_offline, progress=True):
         """Initialise class instance."""
         self.kb = 1024
         self.path = path
         self.mode = mode
+        self.progress = progress
         self.file_location = file_location
         self.file_name = self.file_location.split("/")[-1]
-        self.file_dest = self.path + "/" + self.file_name
+        self.file_dest = get_part_path(self.path + "/" + self.file_name)
         self.file_size_offline = file_size_offline if file_size_offline else 0
+        self.downloaded = 0
+        self.adler32 = 1
+        self.progress_time = 0
+        self.error_page = False
+        self.rate_limiter = get_rate_limiter()
 
     def show_download_progress(
         self, download_t=None, download_d=None, upload_t=None, upload_d=None
     ):
         """Show download progress of a file."""
+        if not self.progress or not progress_due(self, download_t, download_d):
+            return
         download_t = download_t + self.file_size_offline
         download_d = download_d + self.file_size_offline
         display_message(
@@ -137,9 +422,7 @@ class DownloaderHttpPycurl:
     def file_downloader(self):
         """Download single file with pycurl."""
         c = pycurl.Curl()
-        c.setopt(c.URL, self.file_location)
-        if self.mode == "ab":
-            c.setopt(c.RESUME_FROM, self.file_size_offline)
+        c.setopt(c.SHARE, get_curl_share())
         with open(self.file_dest, self.mode) as f:
             display_message(
                 msg_type="note",
@@ -148,157 +431,1609 @@ class DownloaderHttpPycurl:
                     self.file_name,
                 ),
             )
-            c.setopt(c.WRITEDATA, f)
+            self.prepare_transfer(c, f)
             c.setopt(c.NOPROGRESS, False)
             c.setopt(c.XFERINFOFUNCTION, self.show_download_progress)
             try:
                 c.perform()
-            except Exception:
-                display_message(
-                    msg_type="error",
-                    msg="Download error occured. Please try again.",
+            except pycurl.error as e:
+                c.close()
+                if self.error_page:
+                    return
+                if check_curl_http2_refused(
+                    self.file_location,
+                    self.http_version,
+                    e.args[0],
+                    responded=bool(self.status_code),
+                ):
+                    return self.file_downloader()
+                if e.args[0] == pycurl.E_RANGE_ERROR and self.mode == "ab":
+                    # the server does not honour the byte range, start from scratch
+                    self.mode = "wb"
+                    self.file_size_offline = 0
+                    return self.file_downloader()
+                error = self.get_retryable_error(*e.args)
+                if error is not None:
+                    raise error
+                check_download_status(self.file_location, self.status_code)
+                raise DownloadError(
+                    "Download of {} failed: {}.".format(self.file_name, e.args[1])
+                )
+            c.close()
+        error = self.get_retryable_error()
+        if error is not None:
+            raise error
+        check_download_status(self.file_location, self.status_code)
+
+    def get_retryable_error(self, errnum=None, errmsg=None):
+        """Return the error of a failed transfer if it is worth retrying.
+
+        :param errnum: pycurl error code of the transfer, if it failed
+        :param errmsg: pycurl error message of the transfer, if it failed
+        :type errnum: int
+        :type errmsg: str
+
+        :return: Error to retry the transfer after, or None
+        :rtype: RetryableError
+        """
+        if self.status_code in RETRY_STATUS_CODES:
+            return RetryableError(
+                "Server responded with status {}".format(self.status_code),
+                retry_after=self.retry_after,
+            )
+        if errnum in get_curl_retry_errors():
+            return RetryableError("Download error occured: {}".format(errmsg))
+        return None
+
+    def prepare_transfer(self, c, f):
+        """Set up a curl handle to download the file into an open file.
+
+        The transfer is aborted before anything is written if the server
+        responds with its error page.
+        """
+        c.setopt(c.URL, self.file_location)
+        self.http_version = get_curl_http_version(self.file_location)
+        c.setopt(c.HTTP_VERSION, self.http_version)
+        if self.mode == "ab":
+            c.setopt(c.RESUME_FROM, self.file_size_offline)
+        self.start_checksum()
+        self.error_page = False
+        self.status_code = 0
+        self.retry_after = None
+        headers = {}
+
+        def read_header(line):
+            line = line.decode("iso-8859-1").strip()
+            if line.startswith("HTTP/"):
+                self.status_code = int(line.split()[1])
+                headers.clear()
+            elif ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+                if name.strip().lower() == "retry-after":
+                    self.retry_after = parse_retry_after(value.strip())
+
+        def write_data(data):
+            if self.status_code in RETRY_STATUS_CODES or is_permanent_error_status(
+                self.status_code
+            ):
+                return 0  # abort the transfer
+            if self.downloaded == self.file_size_offline and is_download_error_page(
+                self.file_location, self.status_code, headers, data[:64]
+            ):
+                self.error_page = True
+                return 0  # abort the transfer
+            self.rate_limiter.consume(len(data))
+            f.write(data)
+            self.downloaded += len(data)
+            self.adler32 = zlib.adler32(data, self.adler32)
+
+        c.setopt(c.HEADERFUNCTION, read_header)
+        c.setopt(c.WRITEFUNCTION, write_data)
+
+    def segment_downloader(self, start, end):
+        """Download byte range of a file with pycurl into its place.
+
+        The download resumes from the bytes of the range already written
+        according to the segment checkpoint.
+
+        :return: False if the server did not honour the byte range
+        :rtype: bool
+        """
+        offset, adler32 = self.checkpoint.get_progress(start)
+        if offset > end:
+            self.segments_adler32[start] = adler32
+            return True
+        c = pycurl.Curl()
+        c.setopt(c.SHARE, get_curl_share())
+        c.setopt(c.URL, self.file_location)
+        c.setopt(c.RANGE, "{}-{}".format(offset, end))
+        http_version = get_curl_http_version(self.file_location)
+        c.setopt(c.HTTP_VERSION, http_version)
+        status = []
+        retry_after = [None]
+        written = [offset, adler32]
+
+        def read_header(line):
+            if line.startswith(b"HTTP/"):
+                status.append(int(line.split()[1]))
+            elif line.lower().startswith(b"retry-after:"):
+                retry_after[0] = parse_retry_after(line[12:].decode().strip())
+
+        with open(self.file_dest, "r+b") as f:
+            f.seek(offset)
+
+            def write_segment(data):
+                if status[-1] != 206:
+                    return 0  # abort the transfer
+                self.rate_limiter.consume(len(data))
+                f.write(data)
+                written[0] += len(data)
+                written[1] = zlib.adler32(data, written[1])
+                self.checkpoint.update(start, written[0], written[1], f)
+                self.segment_downloaded(len(data))
+
+            c.setopt(c.HEADERFUNCTION, read_header)
+            c.setopt(c.WRITEFUNCTION, write_segment)
+            try:
+                c.perform()
+            except pycurl.error as e:
+                c.close()
+                if check_curl_http2_refused(
+                    self.file_location, http_version, e.args[0], responded=bool(status)
+                ):
+                    return self.segment_downloader(start, end)
+                if status and status[-1] in RETRY_STATUS_CODES:
+                    raise RetryableError(
+                        "Server responded with status {}".format(status[-1]),
+                        retry_after=retry_after[0],
+                    )
+                if status and status[-1] != 206:
+                    return False
+                if e.args[0] in get_curl_retry_errors():
+                    raise RetryableError("Download error occured: {}".format(e.args[1]))
+                raise DownloadError(
+                    "Download of {} failed: {}.".format(self.file_name, e.args[1])
                 )
-                sys.exit(1)
             c.close()
+        self.segments_adler32[start] = written[1]
+        return True
+
+    def segment_downloaded(self, size):
+        """Account downloaded bytes of a segment and show download progress."""
+        with self.segments_lock:
+            self.downloaded += size
+            self.show_download_progress(
+                download_t=self.file_size,
+                download_d=self.downloaded,
+            )
+
+    def start_checksum(self):
+        """Start the running checksum, accounting for already downloaded data."""
+        self.downloaded = self.file_size_offline
+        self.adler32 = 1
+        if self.file_size_offline:
+            self.adler32 = get_file_adler32(self.file_dest)
+
+
+class DownloaderHttpPycurlMulti:
+    """Downloader class for managing concurrent downloads with pycurl multi interface engine.
+
+    At most max_transfers connections are opened to the server. If HTTP/2 is
+    used, DOWNLOAD_HTTP2_STREAMS transfers are multiplexed over every one of
+    them, which saves a round trip per file when downloading many small
+    files. Servers speaking HTTP/1.1 only get the same number of kept-alive
+    connections, the extra transfers waiting for a connection to be free.
+    """
+
+    def __init__(
+        self, downloaders, max_transfers=1, http2=True, progress=True, file_sizes=None
+    ):
+        """Initialise class instance.
+
+        :param downloaders: pycurl downloaders of the files to download
+        :param max_transfers: Maximum number of concurrent connections
+        :param http2: Multiplex transfers over HTTP/2 connections?
+        :param progress: Show download progress of the files?
+        :param file_sizes: Sizes of the remote files in bytes by location, if known
+        :type downloaders: list
+        :type max_transfers: int
+        :type http2: bool
+        :type progress: bool
+        :type file_sizes: dict
+        """
+        self.kb = 1024
+        self.downloaders = downloaders
+        self.file_sizes = file_sizes or {}
+        self.max_transfers = max_transfers
+        self.http2 = http2 and any(
+            is_curl_http2(get_curl_http_version(d.file_location)) for d in downloaders
+        )
+        self.progress = progress
+        self.progress_time = 0
+
+    def show_download_progress(self, files_done=None):
+        """Show download progress of all files."""
+        download_t = len(self.downloaders)
+        if not self.progress or not progress_due(self, download_t, files_done):
+            return
+        display_message(
+            msg_type="progress",
+            msg="Progress: {}/{} files, {} KiB\r".format(
+                files_done,
+                download_t,
+                int(sum(d.downloaded for d in self.downloaders) / self.kb),
+            ),
+        )
+        sys.stdout.flush()
+
+    def setup_multi(self):
+        """Return a multi handle reusing and, if possible, multiplexing connections."""
+        m = pycurl.CurlMulti()
+        if self.http2 and hasattr(pycurl, "PIPE_MULTIPLEX"):
+            m.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+        if hasattr(pycurl, "M_MAX_HOST_CONNECTIONS"):
+            m.setopt(pycurl.M_MAX_HOST_CONNECTIONS, self.max_transfers)
+        return m
+
+    def start_transfer(self, m, c, downloader):
+        """Open the part file and add its transfer to the multi handle.
+
+        :return: False if another process is downloading the file
+        :rtype: bool
+        """
+        c.file = open_part_file(downloader.file_dest, blocking=False)
+        if c.file is None:
+            display_message(
+                msg_type="note",
+                msg="File {} is being downloaded by another process.".format(
+                    downloader.file_name
+                ),
+            )
+            self.busy.append(downloader)
+            return False
+        if downloader.mode is None:
+            # the part file is only looked at once its lock is held
+            file_size = self.file_sizes.get(downloader.file_location)
+            c.file = adopt_incomplete_file(c.file, downloader.file_dest, file_size)
+            downloader.mode, file_size_offline = get_download_mode(
+                downloader.file_location,
+                downloader.path + "/" + downloader.file_name,
+                file_size,
+            )
+            downloader.file_size_offline = file_size_offline or 0
+        if downloader.mode == "wb":
+            c.file.truncate(0)
+        display_message(
+            msg_type="note",
+            msg="File: ./{}/{}".format(downloader.path, downloader.file_name),
+        )
+        c.reset()
+        c.downloader = downloader
+        downloader.prepare_transfer(c, c.file)
+        # blocking in a callback would stall all transfers of the multi handle,
+        # so the rate of every transfer is limited by libcurl itself
+        downloader.rate_limiter = get_rate_limiter(per_transfer=False)
+        transfer_rate = get_rate_limit()[1]
+        if transfer_rate:
+            c.setopt(c.MAX_RECV_SPEED_LARGE, transfer_rate)
+        if self.http2 and is_curl_http2(downloader.http_version):
+            c.setopt(c.PIPEWAIT, 1)
+        m.add_handle(c)
+        return True
+
+    def finish_transfer(self, m, c, errnum, errmsg):
+        """Remove a finished transfer from the multi handle.
+
+        :return: Delay in seconds after which the transfer has to be
+            restarted, or None if it is finished
+        :rtype: float
+        """
+        m.remove_handle(c)
+        c.file.close()
+        downloader = c.downloader
+        if downloader.error_page:
+            return None
+        if errmsg and check_curl_http2_refused(
+            downloader.file_location,
+            downloader.http_version,
+            errnum,
+            responded=bool(downloader.status_code),
+        ):
+            return 0
+        if errnum == pycurl.E_RANGE_ERROR and downloader.mode == "ab":
+            # the server does not honour the byte range, start from scratch
+            downloader.mode = "wb"
+            downloader.file_size_offline = 0
+            return 0
+        if is_permanent_error_status(downloader.status_code):
+            errmsg = "server responded with status {}".format(downloader.status_code)
+        error = downloader.get_retryable_error(errnum, errmsg)
+        if error is not None and downloader.retries < get_retry_limit():
+            return self.retry_transfer(downloader, error)
+        if not errmsg and error is None:
+            get_circuit_breaker(downloader.file_location).record_success()
+            return None
+        display_message(
+            msg_type="error",
+            msg="Download error occured for {}: {}".format(
+                downloader.file_name, errmsg or error
+            ),
+        )
+        self.failed.append(downloader)
+        return None
+
+    def retry_transfer(self, downloader, error):
+        """Prepare a failed transfer to resume from the bytes already written.
+
+        :return: Delay in seconds after which the transfer has to be restarted
+        :rtype: float
+        """
+        breaker = get_circuit_breaker(downloader.file_location)
+        breaker.record_failure()
+        delay = max(
+            get_retry_delay(downloader.retries, error.retry_after), breaker.get_pause()
+        )
+        downloader.retries += 1
+        display_message(
+            msg_type="note",
+            msg="{}: {}. Retrying {}/{} in {:.1f} seconds".format(
+                downloader.file_name,
+                error,
+                downloader.retries,
+                get_retry_limit(),
+                delay,
+            ),
+        )
+        if os.path.isfile(downloader.file_dest):
+            downloader.mode = "ab"
+            downloader.file_size_offline = os.path.getsize(downloader.file_dest)
+        return delay
+
+    def files_downloader(self):
+        """Download files concurrently through a single pycurl multi handle.
+
+        Failed transfers are restarted after their retry delay, without
+        holding up the other transfers.
+
+        :return: Pycurl downloaders of the files that failed to download
+        :rtype: list
+        """
+        m = self.setup_multi()
+        self.busy = []
+        pending = list(reversed(self.downloaders))
+        for downloader in self.downloaders:
+            downloader.retries = 0
+        transfers = self.max_transfers
+        if self.http2:
+            transfers *= DOWNLOAD_HTTP2_STREAMS
+        idle = [pycurl.Curl() for _ in range(min(transfers, len(pending)))]
+        self.failed = []
+        delayed = []
+        active = 0
+        files_done = 0
+        while pending or active or delayed:
+            now = time.monotonic()
+            pending.extend(d for retry_time, d in delayed if retry_time <= now)
+            delayed = [(t, d) for t, d in delayed if t > now]
+            while pending and idle:
+                c = idle.pop()
+                if self.start_transfer(m, c, pending.pop()):
+                    active += 1
+                else:
+                    idle.append(c)
+            while m.perform()[0] == pycurl.E_CALL_MULTI_PERFORM:
+                pass
+            while True:
+                queued, succeeded, errored = m.info_read()
+                finished = [(c, 0, None) for c in succeeded] + errored
+                for c, errnum, errmsg in finished:
+                    delay = self.finish_transfer(m, c, errnum, errmsg)
+                    if delay is None:
+                        files_done += 1
+                    else:
+                        delayed.append((time.monotonic() + delay, c.downloader))
+                    idle.append(c)
+                    active -= 1
+                if not queued:
+                    break
+            self.show_download_progress(files_done=files_done)
+            if active:
+                m.select(1.0)
+            elif delayed and not pending:
+                time.sleep(max(min(t for t, _d in delayed) - time.monotonic(), 0))
+        for c in idle:
+            c.close()
+        m.close()
+        return self.failed
 
 
 class DownloaderXrootd:
     """Downloader class for managing download related utilities with xrootd downloader engine."""
 
-    def __init__(self, path, file_location, mode):
+    def __init__(self, path, file_location, mode, progress=True):
         """Initialise class instance."""
         self.path = path
         self.mode = mode
+        self.progress = progress
         self.file_location = file_location
         self.file_name = self.file_location.split("/")[-1]
-        self.file_dest = self.path + "/" + self.file_name
+        self.file_dest = get_part_path(self.path + "/" + self.file_name)
         self.file_src = self.file_location.split("root://eospublic.cern.ch/")[-1]
 
-    def show_download_progress(self):
-        """Show download progress of a file."""
-        return
-
     def file_downloader(self):
         """Download single file with XRootD."""
-        try:
+        if DownloaderXrootdBatch([self], progress=self.progress).files_downloader():
+            raise DownloadError("Download of {} failed.".format(self.file_name))
+
+
+class DownloaderXrootdBatch:
+    """Downloader class for managing batched downloads with xrootd downloader engine.
+
+    All files are added as jobs of a single XRootD copy process, which runs
+    several of them in parallel, each one over several streams, and reports
+    their progress back to the instance through its progress handler methods.
+    """
+
+    def __init__(self, downloaders, parallel=1, streams=1, progress=True):
+        """Initialise class instance.
+
+        :param downloaders: XRootD downloaders of the files to download
+        :param parallel: Number of files to download in parallel
+        :param streams: Number of streams to download each file over
+        :param progress: Show download progress of the files?
+        :type downloaders: list
+        :type parallel: int
+        :type streams: int
+        :type progress: bool
+        """
+        self.kb = 1024
+        self.downloaders = downloaders
+        self.parallel = parallel
+        self.streams = streams
+        self.progress = progress
+        self.progress_time = 0
+        self.start_time = time.monotonic()
+        self.processed = [0] * len(downloaders)
+        self.totals = [0] * len(downloaders)
+        self.rate_limiter = get_rate_limiter(per_transfer=False)
+
+    def begin(self, jobId, total, source, target):
+        """Notify the start of a copy job."""
+        downloader = self.downloaders[jobId - 1]
+        display_message(
+            msg_type="note",
+            msg="File: ./{}/{}".format(downloader.path, downloader.file_name),
+        )
+
+    def update(self, jobId, processed, total):
+        """Notify the progress of a copy job.
+
+        Waiting here holds back the copy job, which enforces the process-wide
+        bandwidth limit at the granularity of the progress notifications.
+        """
+        self.rate_limiter.consume(max(processed - self.processed[jobId - 1], 0))
+        self.processed[jobId - 1] = processed
+        self.totals[jobId - 1] = total
+        self.show_download_progress()
+
+    def end(self, jobId, results):
+        """Notify the end of a copy job."""
+        status = (results or {}).get("status")
+        if status is not None and not status.ok:
             display_message(
-                msg_type="note",
-                msg="File: ./{}/{}".format(
-                    self.path,
-                    self.file_name,
+                msg_type="error",
+                msg="Download error occured for {}: {}".format(
+                    self.downloaders[jobId - 1].file_location, status.message
                 ),
             )
-            process = xrootdclient.CopyProcess()
+
+    def should_cancel(self, jobId):
+        """Return True if the copy job should be cancelled."""
+        return False
+
+    def show_download_progress(self):
+        """Show download progress and throughput of all files."""
+        download_t = sum(self.totals)
+        download_d = sum(self.processed)
+        if not self.progress or not progress_due(self, download_t, download_d):
+            return
+        elapsed = max(time.monotonic() - self.start_time, 1e-6)
+        display_message(
+            msg_type="progress",
+            msg="Progress: {}/{} KiB ({}%), {:.1f} MiB/s\r".format(
+                int(download_d / self.kb),
+                int(download_t / self.kb),
+                int(download_d / max(download_t, 1) * 100),
+                download_d / elapsed / self.kb / self.kb,
+            ),
+        )
+        sys.stdout.flush()
+
+    def files_downloader(self):
+        """Download all files with XRootD.
+
+        :return: Downloaders of the files which failed to download
+        :rtype: list
+        """
+        if self.streams > 1:
+            xrootdclient.EnvPutInt("SubStreamsPerChannel", self.streams)
+        process = xrootdclient.CopyProcess()
+        for downloader in self.downloaders:
             process.add_job(
-                SERVER_ROOT_URI + self.file_src, os.getcwd() + os.sep + self.file_dest
+                SERVER_ROOT_URI + downloader.file_src,
+                os.getcwd() + os.sep + downloader.file_dest,
+                force=True,
+                xrate=get_rate_limit()[1] or 0,
             )
-            process.prepare()
-            process.run()
+        process.parallel(self.parallel)
+        results = []
+        try:
+            status = process.prepare()
+            if status.ok:
+                self.start_time = time.monotonic()
+                status, results = process.run(self)
         except Exception:
             display_message(
                 msg_type="error", msg="Download error occured. Please try again."
             )
+            return list(self.downloaders)
+        if not status.ok and not results:
+            display_message(
+                msg_type="error",
+                msg="Download error occured: {}".format(status.message),
+            )
+            return list(self.downloaders)
+        results = list(results) + [{}] * (len(self.downloaders) - len(results))
+        if self.progress:
+            print()
+        return [
+            downloader
+            for downloader, result in zip(self.downloaders, results)
+            if not (result.get("status") and result["status"].ok)
+        ]
+
+
+class DownloaderRace:
+    """Downloader class racing HTTP against XRootD and keeping the fastest.
+
+    The first DOWNLOAD_RACE_PROBE_SIZE bytes of the file are fetched over both
+    protocols at the same time and the rest of the file over the one with the
+    higher throughput. If that one stalls or fails, the download fails over
+    to the other protocol and continues from the current offset. Every read
+    opens its own HTTP response or XRootD file and closes it when it ends.
+    """
+
+    def __init__(
+        self,
+        path,
+        file_location,
+        xrootd_location,
+        mode,
+        file_size_offline,
+        file_size=None,
+        progress=True,
+    ):
+        """Initialise class instance."""
+        self.kb = 1024
+        self.path = path
+        self.mode = mode
+        self.progress = progress
+        self.file_location = file_location
+        self.xrootd_location = xrootd_location
+        self.file_name = self.file_location.split("/")[-1]
+        self.file_dest = get_part_path(self.path + "/" + self.file_name)
+        self.file_size_offline = file_size_offline if file_size_offline else 0
+        self.file_size = file_size
+        self.downloaded = 0
+        self.adler32 = 1
+        self.progress_time = 0
+        self.error_page = False
+        self.rate_limiter = get_rate_limiter()
+        self.protocol = None
+
+    def show_download_progress(self):
+        """Show download progress of a file."""
+        download_t = self.file_size or 0
+        if not self.progress or not progress_due(self, download_t, self.downloaded):
+            return
+        display_message(
+            msg_type="progress",
+            msg="Progress: {}/{} KiB ({}%) over {}\r".format(
+                int(self.downloaded / self.kb),
+                int(download_t / self.kb),
+                int(self.downloaded / download_t * 100) if download_t > 0 else 0,
+                self.protocol,
+            ),
+        )
+        sys.stdout.flush()
+
+    def read_http(self, offset, size=None):
+        """Yield the file contents over HTTP from an offset.
+
+        :param offset: Offset to start reading from
+        :param size: Maximum number of bytes to read, None for all
+        :type offset: int
+        :type size: int
+        """
+        headers = {"Accept-Encoding": "identity"}
+        if offset or size:
+            end = offset + size - 1 if size else ""
+            headers["Range"] = "bytes={}-{}".format(offset, end)
+        response = get_session().get(
+            self.file_location,
+            headers=headers,
+            stream=True,
+            timeout=DOWNLOAD_RACE_STALL_TIMEOUT,
+        )
+        with response:
+            check_download_status(self.file_location, response.status_code)
+            chunks = iter_response(response)
+            first_chunk = next(chunks, b"")
+            if (offset and response.status_code != 206) or is_download_error_page(
+                self.file_location,
+                response.status_code,
+                {name.lower(): value for name, value in response.headers.items()},
+                first_chunk[:64],
+            ):
+                raise IOError("HTTP server sent an error response")
+            # servers not honouring the byte range send the whole file
+            remaining = size
+            for data in itertools.chain([first_chunk], chunks):
+                if remaining is not None:
+                    data = data[:remaining]
+                    remaining -= len(data)
+                yield data
+                if remaining == 0:
+                    return
+
+    def read_xrootd(self, offset, size=None):
+        """Yield the file contents over XRootD from an offset.
+
+        :param offset: Offset to start reading from
+        :param size: Maximum number of bytes to read, None for all
+        :type offset: int
+        :type size: int
+        """
+        xrootd_file = xrootdclient.File()
+        status, _ = xrootd_file.open(
+            self.xrootd_location, timeout=DOWNLOAD_RACE_STALL_TIMEOUT
+        )
+        if not status.ok:
+            raise IOError(status.message)
+        try:
+            end = offset + size if size else None
+            while end is None or offset < end:
+                chunk_size = DOWNLOAD_CHUNK_SIZE_MAX
+                if end is not None:
+                    chunk_size = min(chunk_size, end - offset)
+                status, data = xrootd_file.read(
+                    offset, chunk_size, timeout=DOWNLOAD_RACE_STALL_TIMEOUT
+                )
+                if not status.ok:
+                    raise IOError(status.message)
+                if not data:
+                    return
+                offset += len(data)
+                yield data
+        finally:
+            xrootd_file.close()
+
+    def probe(self, protocol, offset, cancelled):
+        """Return the first bytes of the file over a protocol and its throughput.
+
+        The probe stops reading, closing its connection, as soon as the race
+        is decided without it.
+
+        :param protocol: Protocol to read the file over
+        :param offset: Offset to start reading from
+        :param cancelled: Event set once the race is decided
+        :type protocol: str
+        :type offset: int
+        :type cancelled: threading.Event
+
+        :return: Tuple of the data read and the throughput in bytes per second
+        :rtype: tuple
+        """
+        start = time.monotonic()
+        data = []
+        with contextlib.closing(
+            self.read(protocol, offset, DOWNLOAD_RACE_PROBE_SIZE)
+        ) as chunks:
+            for chunk in chunks:
+                if cancelled.is_set():
+                    raise IOError("Probe cancelled")
+                data.append(bytes(chunk))
+        data = b"".join(data)
+        return data, len(data) / max(time.monotonic() - start, 1e-6)
+
+    def read(self, protocol, offset, size=None):
+        """Yield the file contents over a protocol from an offset."""
+        if protocol == "xrootd":
+            return self.read_xrootd(offset, size)
+        return self.read_http(offset, size)
+
+    def race(self, offset):
+        """Probe both protocols and return them from the fastest to the slowest.
+
+        Once a probe succeeds, the other one is given as much time again to
+        finish; if it does not, its protocol is considered the slower one.
+        If all probes fail, the download fails: for good if the server
+        refused the file, to be retried otherwise.
+
+        :return: List of the protocols in the order to try them and the data
+            read by the probe of the fastest one
+        :rtype: tuple
+        """
+        protocols = ["http", "xrootd"] if self.xrootd_location else ["http"]
+        executor = ThreadPoolExecutor(max_workers=len(protocols))
+        cancelled = threading.Event()
+        start = time.monotonic()
+        futures = {
+            executor.submit(self.probe, p, offset, cancelled): p for p in protocols
+        }
+        done, pending = set(), set(futures)
+        while pending and all(future.exception() for future in done):
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            done |= finished
+        if pending:
+            done |= wait(pending, timeout=time.monotonic() - start)[0]
+        # the losing probe stops at its next chunk and closes its connection
+        cancelled.set()
+        executor.shutdown(wait=False)
+        results = {}
+        errors = []
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as error:
+                errors.append(error)
+                display_message(
+                    msg_type="note",
+                    msg="Probing {} failed: {}".format(futures[future], error),
+                )
+        if not results:
+            for error in errors:
+                if isinstance(error, DownloadError):
+                    raise error
+            raise RetryableError(
+                "Download of {} failed over all protocols".format(self.file_name)
+            )
+        protocols.sort(key=lambda p: results[p][1] if p in results else -1)
+        protocols.reverse()
+        return protocols, results[protocols[0]][0]
+
+    def write(self, f, data):
+        """Write downloaded data to the file and account for it."""
+        self.rate_limiter.consume(len(data))
+        f.write(data)
+        self.downloaded += len(data)
+        self.adler32 = zlib.adler32(data, self.adler32)
+        self.show_download_progress()
+
+    def start_checksum(self):
+        """Start the running checksum, accounting for already downloaded data."""
+        self.downloaded = self.file_size_offline
+        self.adler32 = 1
+        if self.file_size_offline:
+            self.adler32 = get_file_adler32(self.file_dest)
+
+    def file_downloader(self):
+        """Download single file over the fastest protocol."""
+        self.start_checksum()
+        protocols, probe_data = self.race(self.file_size_offline)
+        with open(self.file_dest, self.mode) as f:
+            display_message(
+                msg_type="note",
+                msg="File: ./{}/{} (over {})".format(
+                    self.path, self.file_name, protocols[0]
+                ),
+            )
+            self.protocol = protocols[0]
+            self.write(f, probe_data)
+            complete = len(probe_data) < DOWNLOAD_RACE_PROBE_SIZE
+            for index, protocol in enumerate(protocols):
+                if complete:
+                    break
+                self.protocol = protocol
+                try:
+                    for data in self.read(protocol, self.downloaded):
+                        self.write(f, data)
+                    complete = True
+                except DownloadError:
+                    raise
+                except Exception as error:
+                    display_message(
+                        msg_type="note",
+                        msg="Download over {} stalled ({}).{}".format(
+                            protocol,
+                            error,
+                            (
+                                " Failing over to {}.".format(protocols[index + 1])
+                                if index + 1 < len(protocols)
+                                else ""
+                            ),
+                        ),
+                    )
+        if not complete:
+            raise RetryableError(
+                "Download of {} failed over all protocols".format(self.file_name)
+            )
+
+
+class DownloaderStream:
+    """Downloader class streaming files one after the other into an output stream.
+
+    Files are written to the output as they arrive, without touching the
+    disk. Error pages are detected before the first byte of a file is
+    written and the file is downloaded again. A broken transfer is resumed
+    from the last written byte, so that no byte is written twice.
+    """
+
+    def __init__(self, output, retry_limit=0, retry_sleep=0):
+        """Initialise class instance.
+
+        :param output: Binary output stream the files are written to
+        :param retry_limit: Number of retries to be made for downloading a file
+        :param retry_sleep: Time of sleep before every retry
+        :type output: file
+        :type retry_limit: int
+        :type retry_sleep: int
+        """
+        self.output = output
+        self.retry_limit = retry_limit
+        self.retry_sleep = retry_sleep
+
+    def file_streamer(self, file_location, file_size=None):
+        """Stream a file into the output, retrying failed transfers.
+
+        :param file_location: Remote location of the file
+        :param file_size: Size of the remote file in bytes, if known
+        :type file_location: str
+        :type file_size: int
+
+        :return: Dictionary containing (checksum, name, size) of the streamed
+            file
+        :rtype: dict
+        """
+        self.file_location = file_location
+        self.file_size = file_size
+        self.downloaded = 0
+        self.adler32 = 1
+        self.rate_limiter = get_rate_limiter()
+
+        def attempt_stream(_attempt):
+            if not self.stream_response():
+                raise RetryableError("Received the error page of the server")
+
+        try:
+            call_with_retry(
+                attempt_stream,
+                file_location,
+                limit=self.retry_limit,
+                sleep=self.retry_sleep,
+            )
+        except RETRYABLE_ERRORS as e:
+            display_message(
+                msg_type="error",
+                msg="{}. Number of retries exceeded.".format(e),
+            )
+            sys.exit(1)
+        except DownloadError as e:
+            display_message(msg_type="error", msg=str(e))
+            sys.exit(1)
+        self.output.flush()
+        return {
+            "name": file_location.split("/")[-1],
+            "size": self.downloaded,
+            "checksum": format_adler32_checksum(self.adler32),
+        }
+
+    def files_streamer(
+        self, file_locations, file_sizes=None, file_checksums=None, verify=False
+    ):
+        """Stream files into the output in order, optionally verifying them.
+
+        :param file_locations: Remote locations of the files, in output order
+        :param file_sizes: Sizes of the remote files in bytes by location
+        :param file_checksums: Checksums of the remote files by location
+        :param verify: Verify size and checksum of every streamed file?
+        :type file_locations: list
+        :type file_sizes: dict
+        :type file_checksums: dict
+        :type verify: bool
+        """
+        total_files = len(file_locations)
+        for index, file_location in enumerate(file_locations):
+            display_message(
+                msg_type="info",
+                msg="Streaming file {} of {}".format(index + 1, total_files),
+            )
+            display_message(
+                msg_type="note", msg="File: {}".format(file_location.split("/")[-1])
+            )
+            file_size = (file_sizes or {}).get(file_location)
+            streamed_file = self.file_streamer(file_location, file_size)
+            file_checksum = (file_checksums or {}).get(file_location)
+            if verify and file_checksum:
+                verify_file_info(
+                    [streamed_file],
+                    [
+                        {
+                            "name": streamed_file["name"],
+                            "size": file_size,
+                            "checksum": file_checksum,
+                        }
+                    ],
+                )
+
+    def stream_response(self):
+        """Write the rest of the file into the output.
+
+        Servers not honouring the byte range of a resumed transfer send the
+        file from its start, and the already written bytes are skipped.
+
+        :return: False if the server sent its error page instead of the file
+        :rtype: bool
+        """
+        headers = {"Accept-Encoding": "identity"}
+        if self.downloaded:
+            headers["Range"] = "bytes={}-".format(self.downloaded)
+        response = get_session().get(self.file_location, headers=headers, stream=True)
+        check_retry_status(response)
+        if is_permanent_error_status(response.status_code):
+            response.close()
+            check_download_status(self.file_location, response.status_code)
+        with response:
+            skip = self.downloaded if response.status_code == 200 else 0
+            chunks = iter_response(response)
+            first_chunk = next(chunks, b"")
+            if response.status_code != 206 and is_download_error_page(
+                self.file_location,
+                response.status_code,
+                {name.lower(): value for name, value in response.headers.items()},
+                first_chunk[:64],
+            ):
+                return False
+            for data in itertools.chain([first_chunk], chunks):
+                if skip:
+                    skipped = min(skip, len(data))
+                    data, skip = data[skipped:], skip - skipped
+                self.rate_limiter.consume(len(data))
+                self.output.write(data)
+                self.downloaded += len(data)
+                self.adler32 = zlib.adler32(data, self.adler32)
+        if self.file_size is not None and self.downloaded < self.file_size:
+            raise RetryableError(
+                "Connection closed after {} of {} bytes".format(
+                    self.downloaded, self.file_size
+                )
+            )
+        return True
+
+
+def get_part_path(file_dest):
+    """Return the path of the file a download is written to until it is complete.
+
+    :param file_dest: Local destination path of the file
+    :type file_dest: str
+
+    :return: Path of the part file
+    :rtype: str
+    """
+    return file_dest + DOWNLOAD_PART_SUFFIX
+
+
+def open_part_file(part_path, blocking=True):
+    """Open a part file holding its advisory lock.
+
+    The lock keeps processes downloading the same file from writing to its
+    part file at the same time. It is taken on the part file itself, which
+    is renamed when the download is complete, so the lock is taken again if
+    the part file was renamed while waiting for it.
+
+    :param part_path: Path of the part file, created if it does not exist
+    :param blocking: Wait for another process holding the lock?
+    :type part_path: str
+    :type blocking: bool
+
+    :return: Part file opened for appending, or None if another process holds
+        its lock and blocking is False
+    :rtype: file
+    """
+    while True:
+        part_file = open(part_path, "ab")
+        if not fcntl_available:
+            return part_file
+        try:
+            fcntl.flock(part_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if not blocking:
+                part_file.close()
+                return None
+            display_message(
+                msg_type="note",
+                msg="Waiting for another process downloading {}.".format(
+                    os.path.basename(part_path)[: -len(DOWNLOAD_PART_SUFFIX)]
+                ),
+            )
+            fcntl.flock(part_file.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.path.samestat(os.fstat(part_file.fileno()), os.stat(part_path)):
+                return part_file
+        except FileNotFoundError:
+            pass
+        part_file.close()
+
+
+def adopt_incomplete_file(part_file, part_path, file_size=None):
+    """Make an incomplete file written in place by an earlier version the part file.
+
+    The file is only adopted if the locked part file is empty and the file is
+    smaller than the known size of the remote file. The file is locked before
+    it is renamed to the part file, so that the lock of the part file is
+    held throughout.
+
+    :param part_file: Part file opened holding its advisory lock
+    :param part_path: Path of the part file
+    :param file_size: Size of the remote file in bytes, if known
+    :type part_file: file
+    :type part_path: str
+    :type file_size: int
+
+    :return: Part file opened holding its advisory lock, which is the
+        adopted file if it was adopted
+    :rtype: file
+    """
+    file_dest = part_path[: -len(DOWNLOAD_PART_SUFFIX)]
+    if (
+        file_size is None
+        or os.path.getsize(part_path)
+        or not os.path.isfile(file_dest)
+        or os.path.getsize(file_dest) >= file_size
+    ):
+        return part_file
+    adopted_file = open(file_dest, "ab")
+    if fcntl_available:
+        fcntl.flock(adopted_file.fileno(), fcntl.LOCK_EX)
+    os.replace(file_dest, part_path)
+    part_file.close()
+    return adopted_file
+
+
+@contextlib.contextmanager
+def lock_part_file(part_path, file_size=None):
+    """Hold the advisory lock of a part file, removing it if left empty.
+
+    :param part_path: Path of the part file
+    :param file_size: Size of the remote file in bytes, if known, to adopt an
+        incomplete file written in place by an earlier version
+    :type part_path: str
+    :type file_size: int
+    """
+    part_file = open_part_file(part_path)
+    try:
+        part_file = adopt_incomplete_file(part_file, part_path, file_size)
+        yield
+    finally:
+        try:
+            if os.path.samestat(
+                os.fstat(part_file.fileno()), os.stat(part_path)
+            ) and not os.path.getsize(part_path):
+                os.remove(part_path)
+        except FileNotFoundError:
+            pass
+        part_file.close()
+
+
+def finalize_part_file(file_dest, downloaded_file, file_size=None, file_checksum=None):
+    """Validate a downloaded part file and rename it to its destination.
+
+    Part files of the wrong size or checksum are removed, so that they are
+    not resumed from.
+
+    :param file_dest: Local destination path of the file
+    :param downloaded_file: Size and checksum of the downloaded file, with
+        checksum None if the file was not read
+    :param file_size: Size of the remote file in bytes, if known
+    :param file_checksum: Checksum of the remote file, if known
+    :type file_dest: str
+    :type downloaded_file: dict
+    :type file_size: int
+    :type file_checksum: str
+    """
+    part_path = get_part_path(file_dest)
+    if not os.path.isfile(part_path):
+        return
+    part_size = os.path.getsize(part_path)
+    error = None
+    if file_size is not None and part_size != file_size:
+        error = "expected size {}, found {}".format(file_size, part_size)
+    elif file_checksum and downloaded_file["checksum"] not in (None, file_checksum):
+        error = "expected checksum {}, found {}".format(
+            file_checksum, downloaded_file["checksum"]
+        )
+    remove_checkpoint(part_path)
+    if error:
+        os.remove(part_path)
+        raise DownloadError(
+            "Downloaded file {} is corrupted: {}.".format(
+                downloaded_file["name"], error
+            )
+        )
+    os.replace(part_path, file_dest)
+
+
+def verify_downloaded_file(file_path, downloaded_file, file_size, file_checksum):
+    """Verify the size and checksum of a downloaded file, fail if they do not match.
+
+    A part file failing the verification is removed, so that it is not
+    resumed from.
+
+    :param file_path: Local path of the downloaded file or of its part file
+    :param downloaded_file: Size and checksum of the downloaded file, with
+        checksum None if the file was not read
+    :param file_size: Size of the remote file in bytes
+    :param file_checksum: Checksum of the remote file
+    :type file_path: str
+    :type downloaded_file: dict
+    :type file_size: int
+    :type file_checksum: str
+
+    :return: Dictionary containing (checksum, name, size) of the file
+    :rtype: dict
+    """
+    if downloaded_file["checksum"] is None:
+        downloaded_file = dict(get_file_info(file_path), name=downloaded_file["name"])
+    file_info_remote = [
+        {
+            "name": downloaded_file["name"],
+            "size": file_size,
+            "checksum": file_checksum,
+        }
+    ]
+    try:
+        verify_file_info([downloaded_file], file_info_remote)
+    except SystemExit:
+        if file_path.endswith(DOWNLOAD_PART_SUFFIX):
+            os.remove(file_path)
+            remove_checkpoint(file_path)
+        raise DownloadError(
+            "Verification of {} failed.".format(downloaded_file["name"])
+        )
+    return downloaded_file
+
+
+def get_xrootd_file_location(file_location):
+    """Return the XRootD location of a file served over HTTP.
+
+    :param file_location: HTTP location of a file
+    :type file_location: str
+
+    :return: XRootD location of the file, or None if the file is not on EOS
+    :rtype: str
+    """
+    path = "/" + file_location.split("://", 1)[-1].split("/", 1)[-1]
+    if not path.startswith("/eos/"):
+        return None
+    return SERVER_ROOT_URI + path
+
+
+def get_downloader_file_info(downloader):
+    """Return the information of a file computed while downloading it over HTTP.
+
+    :param downloader: HTTP downloader engine instance of the file
+    :type downloader: DownloaderHttpRequests or DownloaderHttpPycurl
+
+    :return: Dictionary containing (checksum, name, size) of the downloaded
+        file, flagged with error_page if the server sent its error page
+    :rtype: dict
+    """
+    if downloader.error_page:
+        return {
+            "name": downloader.file_name,
+            "size": 0,
+            "checksum": None,
+            "error_page": True,
+        }
+    return {
+        "name": downloader.file_name,
+        "size": downloader.downloaded,
+        "checksum": format_adler32_checksum(downloader.adler32),
+    }
+
+
+def get_downloaded_file_info(file_dest):
+    """Return the information of a downloaded file without reading it if possible.
+
+    The file is checksummed only if it has the size of the error page of the
+    server, to tell both apart.
+
+    :param file_dest: Local path of the downloaded file
+    :type file_dest: str
+
+    :return: Dictionary containing (checksum, name, size) of the file, with
+        checksum None if the file was not read
+    :rtype: dict
+    """
+    file_size = os.path.getsize(file_dest)
+    if file_size == DOWNLOAD_ERROR_PAGE["size"]:
+        return get_file_info(file_dest)
+    return {"name": os.path.basename(file_dest), "size": file_size, "checksum": None}
+
+
+def get_file_segments(file_size, segments, min_segment_size=None):
+    """Return the byte ranges splitting a file into segments.
+
+    :param file_size: Size of the file in bytes
+    :param segments: Requested number of segments
+    :param min_segment_size: Minimum size of a segment in bytes
+    :type file_size: int
+    :type segments: int
+    :type min_segment_size: int
+
+    :return: List of inclusive (start, end) byte offsets
+    :rtype: list
+    """
+    if min_segment_size is None:
+        min_segment_size = DOWNLOAD_SEGMENT_MIN_SIZE
+    segments = max(1, min(segments, file_size // max(min_segment_size, 1)))
+    segment_size = -(-file_size // segments)
+    return [
+        (start, min(start + segment_size, file_size) - 1)
+        for start in range(0, file_size, segment_size or 1)
+    ]
+
+
+def get_download_segments(file_location, part_path, segments, file_size=None):
+    """Return the byte ranges to download a file in, resuming a checkpointed download.
+
+    :param file_location: Remote location of a file
+    :param part_path: Path of the part file
+    :param segments: Requested number of segments
+    :param file_size: Size of the remote file in bytes, if known
+    :type file_location: str
+    :type part_path: str
+    :type segments: int
+    :type file_size: int
+
+    :return: Tuple of the size of the remote file, if known, and the list of
+        inclusive (start, end) byte offsets, empty if the file is downloaded
+        sequentially
+    :rtype: tuple
+    """
+    checkpointed = os.path.isfile(get_checkpoint_path(part_path))
+    if segments <= 1 and not checkpointed:
+        return file_size, []
+    if file_size is None:
+        file_size = get_file_size_online(file_location)
+    file_segments = get_checkpoint_segments(part_path, file_size)
+    if not file_segments and segments > 1:
+        file_segments = get_file_segments(file_size, segments)
+    return file_size, file_segments
+
+
+def download_file_segments(downloader, file_size, file_segments):
+    """Download byte ranges of a file concurrently into a pre-allocated file.
+
+    The bytes written by every byte range are checkpointed next to the part
+    file, so that an interrupted download fetches only the missing bytes.
+
+    :param downloader: HTTP downloader engine instance of the file
+    :param file_size: Size of the file in bytes
+    :param file_segments: List of inclusive (start, end) byte offsets
+    :type downloader: DownloaderHttpRequests or DownloaderHttpPycurl
+    :type file_size: int
+    :type file_segments: list
+
+    :return: False if the server does not honour byte ranges
+    :rtype: bool
+    """
+    checkpoint = SegmentCheckpoint(downloader.file_dest, file_size, file_segments)
+    if checkpoint.resumed:
+        display_message(
+            msg_type="note",
+            msg="Resuming download of {} from {} of {} bytes written.".format(
+                downloader.file_name, checkpoint.get_written(), file_size
+            ),
+        )
+    else:
+        with open(downloader.file_dest, "wb") as f:
+            try:
+                os.posix_fallocate(f.fileno(), 0, file_size)
+            except (AttributeError, OSError):
+                f.truncate(file_size)
+        checkpoint.save()
+    display_message(
+        msg_type="note",
+        msg="File: ./{}/{} ({} segments)".format(
+            downloader.path, downloader.file_name, len(file_segments)
+        ),
+    )
+    downloader.file_size = file_size
+    downloader.downloaded = checkpoint.get_written()
+    downloader.checkpoint = checkpoint
+    downloader.segments_adler32 = {}
+    downloader.segments_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=len(file_segments)) as executor:
+        futures = [
+            executor.submit(downloader.segment_downloader, start, end)
+            for start, end in file_segments
+        ]
+        if not all([future.result() for future in futures]):
+            remove_checkpoint(downloader.file_dest)
+            return False
+    downloader.adler32 = 1
+    for start, end in file_segments:
+        downloader.adler32 = combine_adler32(
+            downloader.adler32, downloader.segments_adler32[start], end - start + 1
+        )
+    return True
+
+
+def transfer_file(downloader, file_size, file_segments, attempt=0):
+    """Run an attempt of an HTTP download, resuming from the bytes already written.
+
+    :param downloader: HTTP downloader engine instance of the file
+    :param file_size: Size of the remote file in bytes, if known
+    :param file_segments: List of inclusive (start, end) byte offsets to
+        download concurrently, emptied if the server does not support them
+    :param attempt: Number of the attempt, starting from 0
+    :type downloader: DownloaderHttpRequests or DownloaderHttpPycurl
+    :type file_size: int
+    :type file_segments: list
+    :type attempt: int
+    """
+    if attempt and len(file_segments) <= 1 and os.path.isfile(downloader.file_dest):
+        downloader.mode = "ab"
+        downloader.file_size_offline = os.path.getsize(downloader.file_dest)
+        display_message(
+            msg_type="note",
+            msg="Resuming download of {} from byte {}.".format(
+                downloader.file_name, downloader.file_size_offline
+            ),
+        )
+    if len(file_segments) > 1:
+        if download_file_segments(downloader, file_size, file_segments):
+            return
+        display_message(
+            msg_type="note",
+            msg="Server does not support byte ranges. Downloading file sequentially.",
+        )
+        del file_segments[:]
+    downloader.file_downloader()
 
 
 def check_error(
-    path=None, file_location=None, protocol=None, retry_limit=None, retry_sleep=None
+    path=None,
+    file_location=None,
+    protocol=None,
+    retry_limit=None,
+    retry_sleep=None,
+    download_engine=None,
+    progress=True,
+    downloaded_file=None,
+    file_size=None,
 ):
-    """Return True if the file size and checksum does not matches with download error page.
+    """Return the downloaded file information after retrying error page downloads.
 
     :param path: Directory where file is downloaded
     :param file_location: Remote location of a file
     :param protocol: Protocol to be used for downloading a file
     :param retry_limit: Number of retries to be made for downloading a file.
     :param retry_sleep: Time of sleep before every retry.
+    :param download_engine: Library to be used in downloading files
+    :param progress: Show download progress of the retried file?
+    :param downloaded_file: Size and checksum of the downloaded file, if
+        computed while downloading
+    :param file_size: Size of the remote file in bytes, if known
     :type path: str
     :type file_location: str
     :type protocol: str
     :type retry_limit: int
     :type retry_sleep: int
+    :type download_engine: str
+    :type progress: bool
+    :type downloaded_file: dict
+    :type file_size: int
+
+    :return: Dictionary containing (checksum, name, size) of the downloaded
+        file which does not match with download error page.
+    :rtype: dict
+    """
+    file_name = file_location.split("/")[-1]
+    part_path = get_part_path(path + "/" + file_name)
+    if retry_limit is None:
+        retry_limit = get_retry_limit()
+    if downloaded_file is None:
+        downloaded_file = dict(get_downloaded_file_info(part_path), name=file_name)
+    if is_error_page_downloaded(downloaded_file):
+        for _retry in range(0, retry_limit + 1):
+            if not downloaded_file.get("error_page") and os.path.isfile(part_path):
+                os.remove(part_path)
+            if _retry == retry_limit:
+                raise DownloadError(
+                    "Download of {} failed. Number of retries exceeded.".format(
+                        file_name
+                    )
+                )
+            display_message(
+                msg_type="note", msg="Retrying {}/{}".format(_retry + 1, retry_limit)
+            )
+            get_circuit_breaker(file_location).record_failure()
+            time.sleep(get_retry_delay(_retry, sleep=retry_sleep))
+            downloaded_file = download_single_file(
+                path=path,
+                file_location=file_location,
+                protocol=protocol,
+                download_engine=download_engine,
+                progress=progress,
+                file_size=file_size,
+            )
+            if downloaded_file is None:
+                downloaded_file = dict(
+                    get_downloaded_file_info(part_path), name=file_name
+                )
+            if not is_error_page_downloaded(downloaded_file):
+                return downloaded_file
+    return downloaded_file
+
+
+def is_error_page_downloaded(downloaded_file):
+    """Return True if the server sent its error page instead of the file.
+
+    :param downloaded_file: Size and checksum of the downloaded file
+    :type downloaded_file: dict
+
+    :return: True if the downloaded file is the error page
+    :rtype: bool
+    """
+    return bool(downloaded_file.get("error_page")) or (
+        DOWNLOAD_ERROR_PAGE["size"] == downloaded_file["size"]
+        and DOWNLOAD_ERROR_PAGE["checksum"] == downloaded_file["checksum"]
+    )
+
+
+def get_file_size_online(file_location):
+    """Return the size of a remote file as announced by the server.
+
+    :param file_location: Remote location of a file
+    :type file_location: str
+
+    :return: Size of the remote file in bytes
+    :rtype: int
+    """
+    try:
+        response = request_with_retry("HEAD", file_location)
+        return int(response.headers.get("content-length", 0))
+    except Exception:
+        display_message(
+            msg_type="error",
+            msg="Download error occured. Please try again.",
+        )
+    return 0
+
+
+def downloader_file_checker(file_location, file_dest, file_size=None):
+    """Return False if file is not present in the directory else True.
+
+    The size of the local file is compared to the size of the remote file
+    from the record metadata; the server is only asked for it if unknown.
+
+    :param file_location: Remote location of a file
+    :param file_dest: Expected local destination path of a file
+    :param file_size: Size of the remote file in bytes, if known
+    :type file_location: str
+    :type file_dest: str
+    :type file_size: int
+
+    :return: False if file is not present in the directory else True
+    :rtype: Boolean
+    """
+    if os.path.isfile(file_dest):
+        file_size_offline = os.path.getsize(file_dest)
+        if file_size is None:
+            file_size = get_file_size_online(file_location)
+        return file_size != file_size_offline
+    return False
+
+
+def get_complete_file_info(file_location, file_dest, file_size=None, journal=None):
+    """Return the information of a file if it is already downloaded completely.
+
+    A file is complete if the journal shows it was downloaded and the local
+    file still has the recorded size, or if the local file has the size of
+    the remote file from the record metadata.
+
+    :param file_location: Remote location of a file
+    :param file_dest: Local destination path of the file
+    :param file_size: Size of the remote file in bytes, if known
+    :param journal: Download journal recording the state of the file
+    :type file_location: str
+    :type file_dest: str
+    :type file_size: int
+    :type journal: DownloadJournal
+
+    :return: Dictionary containing (checksum, name, size) of the file, with
+        checksum None if not cached in the journal, or None if the file has
+        to be downloaded
+    :rtype: dict
+    """
+    if journal is not None:
+        journal_file = journal.get_downloaded_file(file_location, file_dest)
+        if journal_file is not None:
+            return journal_file
+    if file_size is None or not os.path.isfile(file_dest):
+        return None
+    if os.path.getsize(file_dest) != file_size:
+        return None
+    return {"name": os.path.basename(file_dest), "size": file_size, "checksum": None}
+
 
-    :return: True if the file size and checksum does not matches with download error page.
-    :rtype: Boolean
+def get_complete_part_info(file_dest, file_size=None):
+    """Return the information of a part file left complete by an interrupted run.
+
+    A part file is complete if it has the size of the remote file from the
+    record metadata and no byte ranges of it are missing.
+
+    :param file_dest: Local destination path of the file
+    :param file_size: Size of the remote file in bytes, if known
+    :type file_dest: str
+    :type file_size: int
+
+    :return: Dictionary containing (checksum, name, size) of the part file,
+        with checksum None, or None if the part file is not complete
+    :rtype: dict
     """
-    file_name = file_location.split("/")[-1]
-    file_dest = path + "/" + file_name
-    downloaded_file = {
-        "size": os.path.getsize(file_dest),
-        "checksum": get_file_checksum(file_dest),
-    }
-    if (
-        DOWNLOAD_ERROR_PAGE["size"] == downloaded_file["size"]
-        and DOWNLOAD_ERROR_PAGE["checksum"] == downloaded_file["checksum"]
-    ):
-        for _retry in range(0, retry_limit + 1):
-            if _retry == retry_limit:
-                display_message(msg_type="error", msg="Number of retries exceeded.")
-                sys.exit(1)
-            display_message(
-                msg_type="note", msg="Retrying {}/{}".format(_retry + 1, retry_limit)
-            )
-            time.sleep(retry_sleep)
-            download_single_file(
-                path=path, file_location=file_location, protocol=protocol
-            )
-            downloaded_file = {
-                "size": os.path.getsize(file_dest),
-                "checksum": get_file_checksum(file_dest),
-            }
-            error = (
-                DOWNLOAD_ERROR_PAGE["size"] == downloaded_file["size"]
-                and DOWNLOAD_ERROR_PAGE["checksum"] == downloaded_file["checksum"]
-            )
-            if not error:
-                return True
+    part_path = get_part_path(file_dest)
+    if file_size is None or os.path.isfile(get_checkpoint_path(part_path)):
+        return None
+    if not os.path.isfile(part_path) or os.path.getsize(part_path) != file_size:
+        return None
+    return {"name": os.path.basename(file_dest), "size": file_size, "checksum": None}
 
 
-def downloader_file_checker(file_location, file_dest):
-    """Return False if file is not present in the directory else True.
+def get_download_mode(file_location, file_dest, file_size=None):
+    """Return the mode to open the part file with and its already downloaded size.
 
     :param file_location: Remote location of a file
     :param file_dest: Expected local destination path of a file
+    :param file_size: Size of the remote file in bytes, if known
     :type file_location: str
     :type file_dest: str
+    :type file_size: int
 
-    :return: False if file is not present in the directory else True
-    :rtype: Boolean
+    :return: Tuple of file mode ("wb" or "ab") to open the part file with and
+        size of the part file to resume from (None when downloading from
+        scratch)
+    :rtype: tuple
     """
-    try:
-        response = requests.head(file_location)
-        file_size_online = int(response.headers.get("content-length", 0))
-    except Exception:
+    part_path = get_part_path(file_dest)
+    part_size = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    if part_size and downloader_file_checker(file_location, part_path, file_size):
         display_message(
-            msg_type="error",
-            msg="Download error occured. Please try again.",
+            msg_type="note",
+            msg="File {} is incomplete. Resuming download.".format(
+                file_location.split("/")[-1],
+            ),
         )
-    if os.path.isfile(file_dest):
-        file_size_offline = os.path.getsize(file_dest)
-        return file_size_online != file_size_offline
-    return False
+        return "ab", part_size
+    return "wb", None
 
 
-def download_single_file(
-    path=None, file_location=None, protocol=None, download_engine=None
-):
-    """Download a single file.
+def check_download_engine(protocol, download_engine):
+    """Exit if the download engine is not installed or not compatible with the protocol.
 
-    :param path: Directory where file is downloaded
-    :param file_location: Remote location of a file
-    :param protocol: Protocol to be used for downloading a file
+    :param protocol: Protocol to be used for downloading files
     :param download_engine: Library to be used in downloading files
-    :type path: str
-    :type file_location: str
     :type protocol: str
     :type download_engine: str
-
-    :return: None
-    :rtype: None
     """
-    file_name = file_location.split("/")[-1]
-    file_dest = path + "/" + file_name
     download_engine_map = {
         "requests": requests_available,
         "pycurl": pycurl_available,
+        "pycurl-multi": pycurl_available,
+        "race": requests_available and xrootd_available,
         "xrootd": xrootd_available,
     }
     if download_engine:
@@ -314,36 +2049,12 @@ def download_single_file(
         if download_engine not in DOWNLOAD_ENGINE_PROTOCOL_HTTP_MAP:
             display_message(
                 msg_type="error",
-                msg="{} is not compatible with {} protocol. Please use requests or pycurl download engine.".format(
+                msg="{} is not compatible with {} protocol. Please use requests, pycurl, pycurl-multi or race download engine.".format(
                     download_engine,
                     protocol,
                 ),
             )
             sys.exit(1)
-        file_download_incomplete = downloader_file_checker(file_location, file_dest)
-        if file_download_incomplete:
-            file_size_offline = os.path.getsize(file_dest)
-            mode = "ab"
-            display_message(
-                msg_type="note",
-                msg="File {} is incomplete. Resuming download.".format(
-                    file_name,
-                ),
-            )
-        else:
-            file_size_offline = None
-            mode = "wb"
-        if download_engine == "requests":
-            downloader = DownloaderHttpRequests(
-                path, file_location, mode, file_size_offline
-            )
-            downloader.file_downloader()
-        elif download_engine == "pycurl":
-            downloader = DownloaderHttpPycurl(
-                path, file_location, mode, file_size_offline
-            )
-            downloader.file_downloader()
-        print()
     elif protocol == "xrootd":
         if download_engine not in DOWNLOAD_ENGINE_PROTOCOL_XROOTD_MAP:
             display_message(
@@ -354,10 +2065,650 @@ def download_single_file(
                 ),
             )
             sys.exit(1)
+
+
+def download_single_file(
+    path=None,
+    file_location=None,
+    protocol=None,
+    download_engine=None,
+    progress=True,
+    segments=1,
+    file_size=None,
+):
+    """Download a single file.
+
+    :param path: Directory where file is downloaded
+    :param file_location: Remote location of a file
+    :param protocol: Protocol to be used for downloading a file
+    :param download_engine: Library to be used in downloading files
+    :param progress: Show download progress of the file?
+    :param segments: Number of byte ranges to download concurrently
+    :param file_size: Size of the remote file in bytes, if known
+    :type path: str
+    :type file_location: str
+    :type protocol: str
+    :type download_engine: str
+    :type progress: bool
+    :type segments: int
+    :type file_size: int
+
+    :return: Dictionary containing (checksum, name, size) of the downloaded
+        file computed while downloading, or None if the download engine does
+        not stream the file contents
+    :rtype: dict
+    """
+    file_name = file_location.split("/")[-1]
+    file_dest = path + "/" + file_name
+    check_download_engine(protocol, download_engine)
+    if protocol in ["http", "https"]:
+        mode, file_size_offline = get_download_mode(file_location, file_dest, file_size)
+        if download_engine == "requests":
+            downloader = DownloaderHttpRequests(
+                path, file_location, mode, file_size_offline, progress=progress
+            )
+        elif download_engine in ("pycurl", "pycurl-multi"):
+            downloader = DownloaderHttpPycurl(
+                path, file_location, mode, file_size_offline, progress=progress
+            )
+        elif download_engine == "race":
+            downloader = DownloaderRace(
+                path,
+                file_location,
+                get_xrootd_file_location(file_location),
+                mode,
+                file_size_offline,
+                file_size=file_size,
+                progress=progress,
+            )
+        file_segments = []
+        if mode == "wb" and download_engine != "race":
+            file_size, file_segments = get_download_segments(
+                file_location, downloader.file_dest, segments, file_size
+            )
+        try:
+            call_with_retry(
+                lambda attempt: transfer_file(
+                    downloader, file_size, file_segments, attempt
+                ),
+                file_location,
+            )
+        except RETRYABLE_ERRORS as e:
+            raise DownloadError("{}. Number of retries exceeded.".format(e))
+        if progress:
+            print()
+        return get_downloader_file_info(downloader)
+    elif protocol == "xrootd":
         mode = "wb"
-        downloader = DownloaderXrootd(path, file_location, mode)
+        downloader = DownloaderXrootd(path, file_location, mode, progress=progress)
         downloader.file_downloader()
-    return
+    return None
+
+
+def download_files_with_curl_multi(
+    file_downloads, max_transfers=1, progress=True, file_sizes=None
+):
+    """Download several files concurrently with the pycurl-multi download engine.
+
+    The files are left in their part files, to be validated and renamed by
+    download_file.
+
+    :param file_downloads: List of (path, file_location) tuples of the files
+    :param max_transfers: Maximum number of concurrent transfers
+    :param progress: Show download progress of the files?
+    :param file_sizes: Sizes of the remote files in bytes by location, if known
+    :type file_downloads: list
+    :type max_transfers: int
+    :type progress: bool
+    :type file_sizes: dict
+
+    :return: Dictionary mapping the location of every successfully
+        downloaded file to its (checksum, name, size) computed while
+        downloading, and of every file being downloaded by another process
+        to None
+    :rtype: dict
+    """
+    if not pycurl_available:
+        display_message(
+            msg_type="error",
+            msg="pycurl is not installed on system. Please install it.",
+        )
+        sys.exit(1)
+    downloaders = [
+        DownloaderHttpPycurl(path, file_location, None, None, progress=False)
+        for path, file_location in file_downloads
+    ]
+    multi = DownloaderHttpPycurlMulti(
+        downloaders,
+        max_transfers=max_transfers,
+        progress=progress,
+        file_sizes=file_sizes,
+    )
+    failed = multi.files_downloader()
+    if progress:
+        print()
+    downloaded_files = {
+        downloader.file_location: get_downloader_file_info(downloader)
+        for downloader in downloaders
+        if downloader not in failed and downloader not in multi.busy
+    }
+    downloaded_files.update(
+        {downloader.file_location: None for downloader in multi.busy}
+    )
+    return downloaded_files
+
+
+def download_files_with_xrootd(file_downloads, parallel=1, streams=1, progress=True):
+    """Download several files in one batch with the xrootd download engine.
+
+    The files are left in their part files, to be validated and renamed by
+    download_file.
+
+    :param file_downloads: List of (path, file_location) tuples of the files
+    :param parallel: Number of files to download in parallel
+    :param streams: Number of streams to download each file over
+    :param progress: Show download progress of the files?
+    :type file_downloads: list
+    :type parallel: int
+    :type streams: int
+    :type progress: bool
+
+    :return: Dictionary mapping the location of every successfully
+        downloaded file to its (checksum, name, size), with checksum None if
+        the file was not read, and of every file being downloaded by another
+        process to None
+    :rtype: dict
+    """
+    downloaders = []
+    busy = []
+    part_files = []
+    for path, file_location in file_downloads:
+        downloader = DownloaderXrootd(path, file_location, "wb", progress=False)
+        part_file = open_part_file(downloader.file_dest, blocking=False)
+        if part_file is None:
+            display_message(
+                msg_type="note",
+                msg="File {} is being downloaded by another process.".format(
+                    downloader.file_name
+                ),
+            )
+            busy.append(downloader)
+            continue
+        part_files.append(part_file)
+        downloaders.append(downloader)
+    try:
+        failed = (
+            DownloaderXrootdBatch(
+                downloaders, parallel=parallel, streams=streams, progress=progress
+            ).files_downloader()
+            if downloaders
+            else []
+        )
+    finally:
+        for part_file in part_files:
+            part_file.close()
+    downloaded_files = {
+        downloader.file_location: dict(
+            get_downloaded_file_info(downloader.file_dest), name=downloader.file_name
+        )
+        for downloader in downloaders
+        if downloader not in failed
+    }
+    downloaded_files.update({downloader.file_location: None for downloader in busy})
+    return downloaded_files
+
+
+def stream_files(
+    file_locations,
+    output,
+    retry_limit=0,
+    retry_sleep=0,
+    file_sizes=None,
+    file_checksums=None,
+    verify=False,
+):
+    """Stream files one after the other to the standard output or a named pipe.
+
+    :param file_locations: Remote locations of the files, in output order
+    :param output: '-' for the standard output, or path of a named pipe
+    :param retry_limit: Number of retries to be made for downloading a file
+    :param retry_sleep: Time of sleep before every retry
+    :param file_sizes: Sizes of the remote files in bytes by location, if known
+    :param file_checksums: Checksums of the remote files by location, if known
+    :param verify: Verify size and checksum of every streamed file?
+    :type file_locations: list
+    :type output: str
+    :type retry_limit: int
+    :type retry_sleep: int
+    :type file_sizes: dict
+    :type file_checksums: dict
+    :type verify: bool
+    """
+    if output == "-":
+        streamer = DownloaderStream(sys.stdout.buffer, retry_limit, retry_sleep)
+        streamer.files_streamer(file_locations, file_sizes, file_checksums, verify)
+        return
+    with open(output, "wb") as pipe:
+        streamer = DownloaderStream(pipe, retry_limit, retry_sleep)
+        streamer.files_streamer(file_locations, file_sizes, file_checksums, verify)
+
+
+def download_files_in_batch(
+    protocol,
+    download_engine,
+    file_downloads,
+    jobs=1,
+    segments=1,
+    progress=True,
+    journal=None,
+    file_sizes=None,
+    incremental=False,
+    queue=None,
+):
+    """Download several files in one batch if the download engine supports it.
+
+    :param protocol: Protocol to be used for downloading files
+    :param download_engine: Library to be used in downloading files
+    :param file_downloads: List of (path, file_location) tuples of the files
+    :param jobs: Number of files to download concurrently
+    :param segments: Number of streams to download each file over
+    :param progress: Show download progress of the files?
+    :param journal: Download journal recording the state of the files
+    :param file_sizes: Sizes of the remote files in bytes by location, if known
+    :param incremental: Skip the files already downloaded completely?
+    :param queue: Work queue the files are claimed from one by one, in
+        which case they are not downloaded in one batch
+    :type protocol: str
+    :type download_engine: str
+    :type file_downloads: list
+    :type jobs: int
+    :type segments: int
+    :type progress: bool
+    :type journal: DownloadJournal
+    :type file_sizes: dict
+    :type incremental: bool
+    :type queue: WorkQueue
+
+    :return: Dictionary mapping the location of every successfully
+        downloaded file to its (checksum, name, size), and of every file
+        being downloaded by another process, resumed from its segment
+        checkpoint or left complete in its part file to None, or None if the
+        download engine downloads files one by one
+    :rtype: dict
+    """
+    if download_engine not in ("pycurl-multi", "xrootd") or queue is not None:
+        return None
+    check_download_engine(protocol, download_engine)
+    downloaded_files = {}
+    if incremental:
+        for path, file_location in file_downloads:
+            complete_file = get_complete_file_info(
+                file_location,
+                path + "/" + file_location.split("/")[-1],
+                (file_sizes or {}).get(file_location),
+                journal,
+            )
+            if complete_file is not None:
+                complete_file["skipped"] = True
+                downloaded_files[file_location] = complete_file
+            elif get_complete_part_info(
+                path + "/" + file_location.split("/")[-1],
+                (file_sizes or {}).get(file_location),
+            ):
+                # complete part files are validated one by one
+                downloaded_files[file_location] = None
+        file_downloads = [
+            file_download
+            for file_download in file_downloads
+            if file_download[1] not in downloaded_files
+        ]
+    if download_engine == "pycurl-multi":
+        # checkpointed segmented downloads are resumed one by one
+        for path, file_location in file_downloads:
+            part_path = get_part_path(path + "/" + file_location.split("/")[-1])
+            if os.path.isfile(get_checkpoint_path(part_path)):
+                downloaded_files[file_location] = None
+        file_downloads = [
+            file_download
+            for file_download in file_downloads
+            if file_download[1] not in downloaded_files
+        ]
+    if journal is not None:
+        for _path, file_location in file_downloads:
+            journal.update(file_location, "in-progress")
+    if not file_downloads:
+        return downloaded_files
+    display_message(
+        msg_type="info",
+        msg="Downloading {} files with up to {} concurrent transfers".format(
+            len(file_downloads), jobs
+        ),
+    )
+    if download_engine == "xrootd":
+        downloaded_files.update(
+            download_files_with_xrootd(
+                file_downloads, parallel=jobs, streams=segments, progress=progress
+            )
+        )
+    else:
+        downloaded_files.update(
+            download_files_with_curl_multi(
+                file_downloads,
+                max_transfers=jobs,
+                progress=progress,
+                file_sizes=file_sizes,
+            )
+        )
+    return downloaded_files
+
+
+def download_file(
+    path=None,
+    file_location=None,
+    protocol=None,
+    download_engine=None,
+    retry_limit=None,
+    retry_sleep=None,
+    progress=True,
+    segments=1,
+    file_size=None,
+    file_checksum=None,
+    verify=False,
+    downloaded_file=None,
+    journal=None,
+    incremental=False,
+    cache=None,
+):
+    """Download a file, retry when getting the error page and optionally verify it.
+
+    :param path: Directory where file is downloaded
+    :param file_location: Remote location of a file
+    :param protocol: Protocol to be used for downloading a file
+    :param download_engine: Library to be used in downloading files
+    :param retry_limit: Number of retries to be made for downloading a file.
+    :param retry_sleep: Time of sleep before every retry.
+    :param progress: Show download progress of the file?
+    :param segments: Number of byte ranges to download concurrently
+    :param file_size: Size of the remote file in bytes, if known
+    :param file_checksum: Checksum of the remote file, if known
+    :param verify: Verify size and checksum of the downloaded file?
+    :param downloaded_file: Size and checksum of the file if it was already
+        downloaded, or skipped as complete, by a batch download engine
+    :param journal: Download journal recording the state of the file
+    :param incremental: Skip the file if it is already downloaded completely?
+    :param cache: Download cache to add the downloaded file to
+    :type path: str
+    :type file_location: str
+    :type protocol: str
+    :type download_engine: str
+    :type retry_limit: int
+    :type retry_sleep: int
+    :type progress: bool
+    :type segments: int
+    :type file_size: int
+    :type file_checksum: str
+    :type verify: bool
+    :type downloaded_file: dict
+    :type journal: DownloadJournal
+    :type incremental: bool
+    :type cache: DownloadCache
+
+    :return: Dictionary containing (checksum, name, size) of the downloaded
+        file, flagged with skipped if it was already downloaded
+    :rtype: dict
+    """
+    file_dest = path + "/" + file_location.split("/")[-1]
+    cached = downloaded_file is not None and downloaded_file.get("cached")
+    with lock_part_file(get_part_path(file_dest), file_size):
+        complete_file = None
+        if downloaded_file is not None and downloaded_file.get("skipped"):
+            complete_file = downloaded_file
+        elif downloaded_file is None and incremental:
+            complete_file = get_complete_file_info(
+                file_location, file_dest, file_size, journal
+            )
+            if complete_file is None:
+                downloaded_file = get_complete_part_info(file_dest, file_size)
+                if downloaded_file is not None:
+                    display_message(
+                        msg_type="note",
+                        msg="File {} was downloaded completely. Validating it.".format(
+                            downloaded_file["name"]
+                        ),
+                    )
+        if complete_file is not None:
+            display_message(
+                msg_type="note",
+                msg="File {} is already downloaded. Skipping.".format(
+                    complete_file["name"]
+                ),
+            )
+            downloaded_file = complete_file
+        else:
+            if downloaded_file is None:
+                if journal is not None:
+                    journal.update(file_location, "in-progress")
+                downloaded_file = download_single_file(
+                    path=path,
+                    file_location=file_location,
+                    protocol=protocol,
+                    download_engine=download_engine,
+                    progress=progress,
+                    segments=segments,
+                    file_size=file_size,
+                )
+            downloaded_file = check_error(
+                path=path,
+                file_location=file_location,
+                protocol=protocol,
+                retry_limit=retry_limit,
+                retry_sleep=retry_sleep,
+                download_engine=download_engine,
+                progress=progress,
+                downloaded_file=downloaded_file,
+                file_size=file_size,
+            )
+            if not cached:
+                if verify and file_checksum:
+                    downloaded_file = verify_downloaded_file(
+                        get_part_path(file_dest),
+                        downloaded_file,
+                        file_size,
+                        file_checksum,
+                    )
+                finalize_part_file(file_dest, downloaded_file, file_size, file_checksum)
+    if verify and file_checksum and (cached or complete_file is not None):
+        downloaded_file = verify_downloaded_file(
+            file_dest, downloaded_file, file_size, file_checksum
+        )
+    if journal is not None:
+        verified = (downloaded_file["size"], downloaded_file["checksum"]) == (
+            file_size,
+            file_checksum,
+        )
+        journal.update(
+            file_location,
+            "verified" if verified else "downloaded",
+            size=downloaded_file["size"],
+            checksum=downloaded_file["checksum"],
+        )
+    if cache is not None and not cached and file_checksum:
+        if (downloaded_file["size"], downloaded_file["checksum"]) == (
+            file_size,
+            file_checksum,
+        ):
+            cache.store(path + "/" + downloaded_file["name"], file_checksum, file_size)
+    downloaded_file["skipped"] = complete_file is not None
+    return downloaded_file
+
+
+def fetch_cached_files(cache, file_downloads, file_sizes, file_checksums):
+    """Materialise the files found in the download cache at their destination.
+
+    :param cache: Download cache, or None if no cache is used
+    :param file_downloads: List of (path, file_location) tuples of the files
+    :param file_sizes: Sizes of the remote files in bytes by location
+    :param file_checksums: Checksums of the remote files by location
+    :type cache: DownloadCache
+    :type file_downloads: list
+    :type file_sizes: dict
+    :type file_checksums: dict
+
+    :return: Dictionary mapping the location of every file found in the
+        cache to its (checksum, name, size), flagged as cached
+    :rtype: dict
+    """
+    cached_files = {}
+    if cache is None:
+        return cached_files
+    for path, file_location in file_downloads:
+        file_name = file_location.split("/")[-1]
+        file_size = file_sizes.get(file_location)
+        file_checksum = file_checksums.get(file_location)
+        try:
+            method = cache.fetch(file_checksum, file_size, path + "/" + file_name)
+        except OSError:
+            method = None
+        if method is None:
+            continue
+        display_message(
+            msg_type="note",
+            msg="File {} found in the download cache ({}).".format(file_name, method),
+        )
+        cached_files[file_location] = {
+            "name": file_name,
+            "size": file_size,
+            "checksum": file_checksum,
+            "cached": True,
+        }
+    return cached_files
+
+
+def get_default_download_engine(protocol=None, host=None, history=None, jobs=1):
+    """Return the download engine to use when none was requested.
+
+    :param protocol: Protocol to be used for downloading files
+    :param host: Host the files are downloaded from
+    :param history: Throughput history of the download engines used to
+        select the historically fastest available engine
+    :param jobs: Number of concurrent transfers
+    :type protocol: str
+    :type host: str
+    :type history: ThroughputHistory
+    :type jobs: int
+
+    :return: Name of the download engine
+    :rtype: str
+    """
+    if protocol.startswith("http"):
+        engines = [
+            engine
+            for engine, available in (
+                ("requests", requests_available),
+                ("pycurl", pycurl_available),
+                ("pycurl-multi", pycurl_available),
+            )
+            if available
+        ]
+        if history is None or len(engines) < 2:
+            return engines[0] if engines else "requests"
+        download_engine = history.select(engines, host, jobs)
+        display_message(
+            msg_type="info",
+            msg="Using {} download engine".format(download_engine),
+        )
+        return download_engine
+    elif protocol == "xrootd":
+        return "xrootd"
+
+
+def get_file_host(file_location):
+    """Return the host serving a file.
+
+    :param file_location: Remote location of a file
+    :type file_location: str
+
+    :return: Host name and port of the server of the file
+    :rtype: str
+    """
+    return urlparse(file_location).netloc
+
+
+def get_transfer_order(file_locations, file_sizes=None, order="metadata"):
+    """Return the order in which files should be transferred.
+
+    Transferring the largest files first (longest processing time first)
+    keeps all concurrent transfers busy until the end of the run, instead of
+    leaving a large file transferring alone. Transferring the smallest files
+    first gives quick partial results. Files of unknown size come last.
+
+    :param file_locations: List of remote file locations, in metadata order
+    :param file_sizes: Sizes of the remote files in bytes by location, if known
+    :param order: Transfer order policy, one of 'metadata', 'largest-first'
+        or 'smallest-first'
+    :type file_locations: list
+    :type file_sizes: dict
+    :type order: str
+
+    :return: Indexes of the file locations in transfer order
+    :rtype: list
+    """
+    indexes = list(range(len(file_locations)))
+    if order == "metadata":
+        return indexes
+    sign = -1 if order == "largest-first" else 1
+    sizes = [(file_sizes or {}).get(location) for location in file_locations]
+    return sorted(
+        indexes,
+        key=lambda index: (sizes[index] is None, sign * (sizes[index] or 0)),
+    )
+
+
+def download_files_in_parallel(download_file, file_locations, jobs=1, order=None):
+    """Run the download of every file location with a bounded worker pool.
+
+    With a single job the files are downloaded one after another in the
+    calling thread, so that any error stops the run immediately.  With
+    several jobs up to ``jobs`` files are transferred concurrently and the
+    failures are collected so that every file gets its chance.
+
+    :param download_file: Callable downloading one file, called with the
+        file index (starting from 0) and the remote file location
+    :param file_locations: List of remote file locations
+    :param jobs: Maximum number of concurrent downloads
+    :param order: Indexes of the file locations in transfer order, the
+        file locations order if not given
+    :type download_file: callable
+    :type file_locations: list
+    :type jobs: int
+    :type order: list
+
+    :return: List of file locations that failed to download, in input order
+    :rtype: list
+    """
+    if order is None:
+        order = range(len(file_locations))
+    if jobs <= 1:
+        for index in order:
+            download_file(index, file_locations[index])
+        return []
+    failed_indexes = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            (index, executor.submit(download_file, index, file_locations[index]))
+            for index in order
+        ]
+        try:
+            for index, future in futures:
+                try:
+                    future.result()
+                except (Exception, SystemExit):
+                    failed_indexes.append(index)
+        except KeyboardInterrupt:
+            for _index, future in futures:
+                future.cancel()
+            raise
+    return [file_locations[index] for index in sorted(failed_indexes)]
 
 
 def get_file_subdirectories(file_locations):
@@ -489,3 +2840,118 @@ def get_download_files_by_range(ranges=None, file_locations=None, filtered_files
         for file in _range_file_locations:
             download_file_locations.append(file)
     return download_file_locations
+
+
+def get_download_files_by_shard(shard=None, file_locations=None, file_sizes=None):
+    """Return the files of one of several shards of near-equal total size.
+
+    Files are assigned, largest first, to the shard holding the fewest bytes
+    so far, ties going to the shard with the fewest files and then to the
+    first one. The assignment depends only on the file locations and sizes,
+    so that independent jobs given different shards of the same files
+    download disjoint parts covering all of them without any coordination.
+
+    :param shard: Shard to return, as index and count of shards (i/N)
+    :param file_locations: List of remote file locations
+    :param file_sizes: Sizes of the remote files in bytes by location, files
+        of unknown size counting as empty
+    :type shard: str
+    :type file_locations: list
+    :type file_sizes: dict
+
+    :return: List of file locations of the shard, in input order
+    :rtype: list
+    """
+    validate_shard(shard=shard)
+    shard_index, shard_count = [int(value) for value in shard.split("/")]
+    sizes = [(file_sizes or {}).get(location) or 0 for location in file_locations]
+    shard_bytes = [0] * shard_count
+    shard_files = [0] * shard_count
+    file_shards = [0] * len(file_locations)
+    for index in sorted(
+        range(len(file_locations)),
+        key=lambda index: (-sizes[index], file_locations[index], index),
+    ):
+        target = min(
+            range(shard_count),
+            key=lambda shard_: (shard_bytes[shard_], shard_files[shard_], shard_),
+        )
+        file_shards[index] = target
+        shard_bytes[target] += sizes[index]
+        shard_files[target] += 1
+    return [
+        location
+        for location, file_shard in zip(file_locations, file_shards)
+        if file_shard == shard_index - 1
+    ]
+
+
+def get_download_files_by_filters(
+    names=None,
+    regexp=None,
+    ranges=None,
+    file_locations=None,
+    shard=None,
+    file_sizes=None,
+):
+    """Return the list of files selected by all given filters, exit if none.
+
+    The selected files are split into shards last, so that an empty shard
+    is not an error.
+
+    :param names: Tuple of file names filters input
+    :param regexp: Regexp string for filtering of file locations
+    :param ranges: Tuple of ranges filters input
+    :param file_locations: List of remote file locations
+    :param shard: Shard of the selected files to return (i/N)
+    :param file_sizes: Sizes of the remote files in bytes by location
+    :type names: tuple
+    :type regexp: str
+    :type ranges: tuple
+    :type file_locations: list
+    :type shard: str
+    :type file_sizes: dict
+
+    :return: List of file locations to be downloaded
+    :rtype: list
+    """
+    download_file_locations = []
+    if names:
+        parsed_name_filters = parse_parameters(names)
+        download_file_locations = get_download_files_by_name(
+            names=parsed_name_filters, file_locations=file_locations
+        )
+    if regexp:
+        download_file_locations = get_download_files_by_regexp(
+            regexp=regexp,
+            file_locations=file_locations,
+            filtered_files=download_file_locations if names else None,
+        )
+    if ranges:
+        parsed_range_filters = parse_parameters(ranges)
+        download_file_locations = get_download_files_by_range(
+            ranges=parsed_range_filters,
+            file_locations=file_locations,
+            filtered_files=download_file_locations if names or regexp else None,
+        )
+    if not (names or regexp or ranges):
+        download_file_locations = file_locations
+    elif not download_file_locations:
+        display_message(
+            msg_type="error",
+            msg="No files matching the filters",
+        )
+        sys.exit(1)
+    if shard:
+        download_file_locations = get_download_files_by_shard(
+            shard=shard,
+            file_locations=download_file_locations,
+            file_sizes=file_sizes,
+        )
+        if not download_file_locations:
+            display_message(
+                msg_type="info",
+                msg="No files in shard {}".format(shard),
+            )
+            sys.exit(0)
+    return download_file_locations
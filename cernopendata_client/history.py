@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download throughput history."""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from .config import (
+    DOWNLOAD_HISTORY_EXPLORATION_RATE,
+    DOWNLOAD_HISTORY_MAX_AGE,
+    DOWNLOAD_HISTORY_SMOOTHING,
+)
+
+
+def get_history_path():
+    """Return the path of the throughput history file of the user.
+
+    :return: Path of the history file in the user cache directory
+    :rtype: str
+    """
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_dir, "cernopendata-client", "throughput.json")
+
+
+def get_history_key(engine, jobs=1):
+    """Return the key of the throughput of an engine run with a number of jobs.
+
+    :param engine: Download engine
+    :param jobs: Number of concurrent transfers
+    :type engine: str
+    :type jobs: int
+
+    :return: Key of the throughput in the history of a host
+    :rtype: str
+    """
+    return "{} --jobs {}".format(engine, jobs)
+
+
+class ThroughputHistory:
+    """Persisted throughput of the download engines for every host.
+
+    The throughput of an engine is an exponentially weighted moving average
+    of the throughput of its runs, so that it follows changes of the network.
+    Every run records the bytes it transferred over its wall time, and only
+    runs with the same number of concurrent transfers are compared.
+    Transfers are recorded in memory and merged into the history file when
+    saved, so that concurrent runs do not lose each other's data.
+    """
+
+    def __init__(self, path=None):
+        """Initialise class instance.
+
+        :param path: Path of the history file
+        :type path: str
+        """
+        self.path = path or get_history_path()
+        self.lock = threading.Lock()
+        self.samples = []
+        self.history = self.load()
+
+    def load(self):
+        """Return the history stored in the history file.
+
+        :return: Dictionary mapping hosts to the throughput, number of
+            transfers and time of last update of each engine
+        :rtype: dict
+        """
+        try:
+            with open(self.path) as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return history if isinstance(history, dict) else {}
+
+    def record(self, engine, host, size, seconds, jobs=1):
+        """Record the throughput of a download run.
+
+        :param engine: Download engine of the run
+        :param host: Host the files were downloaded from
+        :param size: Number of bytes transferred
+        :param seconds: Wall time of the run in seconds
+        :param jobs: Number of concurrent transfers of the run
+        :type engine: str
+        :type host: str
+        :type size: int
+        :type seconds: float
+        :type jobs: int
+        """
+        if size <= 0 or seconds <= 0:
+            return
+        sample = (get_history_key(engine, jobs), host, size / seconds, time.time())
+        with self.lock:
+            self.samples.append(sample)
+            self.update(self.history, sample)
+
+    @staticmethod
+    def update(history, sample):
+        """Update the throughput of an engine with a run sample."""
+        key, host, throughput, timestamp = sample
+        entry = history.setdefault(host, {}).get(key)
+        if entry is None:
+            entry = {"throughput": throughput, "transfers": 0}
+        else:
+            entry["throughput"] += DOWNLOAD_HISTORY_SMOOTHING * (
+                throughput - entry["throughput"]
+            )
+        entry["transfers"] += 1
+        entry["time"] = timestamp
+        history[host][key] = entry
+
+    def save(self):
+        """Merge the recorded transfers into the history file."""
+        with self.lock:
+            samples, self.samples = self.samples, []
+        if not samples:
+            return
+        history = self.load()
+        for sample in samples:
+            self.update(history, sample)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, "w") as f:
+                json.dump(history, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def select(self, engines, host, jobs=1):
+        """Return the engine to use for downloading files from a host.
+
+        Engines never used, or not used for DOWNLOAD_HISTORY_MAX_AGE seconds,
+        are explored first. Otherwise the historically fastest engine is
+        selected, except for a DOWNLOAD_HISTORY_EXPLORATION_RATE fraction of
+        the runs which pick a random engine to keep the history up to date.
+
+        :param engines: Available download engines in order of preference
+        :param host: Host the files are downloaded from
+        :param jobs: Number of concurrent transfers of the run
+        :type engines: list
+        :type host: str
+        :type jobs: int
+
+        :return: Selected download engine
+        :rtype: str
+        """
+        with self.lock:
+            entries = {
+                engine: self.history.get(host, {}).get(get_history_key(engine, jobs))
+                for engine in engines
+            }
+        now = time.time()
+        for engine in engines:
+            entry = entries[engine]
+            if entry is None or now - entry.get("time", 0) > DOWNLOAD_HISTORY_MAX_AGE:
+                return engine
+        if random.random() < DOWNLOAD_HISTORY_EXPLORATION_RATE:
+            return random.choice(engines)
+        return max(engines, key=lambda engine: entries[engine]["throughput"])
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download journal."""
+
+import os
+import sqlite3
+import threading
+
+from .config import DOWNLOAD_JOURNAL_SUFFIX
+
+JOURNAL_STATES = ("planned", "in-progress", "downloaded", "verified")
+"""States of a file in the download journal, in order."""
+
+
+def get_journal_path(base_path):
+    """Return the path of the download journal stored next to a record directory.
+
+    :param base_path: Download directory of the record
+    :type base_path: str
+
+    :return: Path of the download journal
+    :rtype: str
+    """
+    return os.path.normpath(str(base_path)) + DOWNLOAD_JOURNAL_SUFFIX
+
+
+class DownloadJournal:
+    """Crash-safe journal of the state of the files of a download.
+
+    The journal is a SQLite database in write-ahead logging mode, so that
+    every state change is durable as soon as it is recorded and a killed
+    download can be resumed without asking the server about finished files.
+    The bytes of files still in progress are not journalled: their download
+    resumes from the size of the part file and its segment checkpoint, which
+    always match what was written to disk.
+    """
+
+    def __init__(self, path):
+        """Initialise class instance.
+
+        :param path: Path of the journal database
+        :type path: str
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "location TEXT PRIMARY KEY, "
+                "path TEXT, "
+                "state TEXT NOT NULL, "
+                "size INTEGER, "
+                "bytes INTEGER NOT NULL DEFAULT 0, "
+                "checksum TEXT)"
+            )
+
+    def close(self):
+        """Close the journal database."""
+        with self.lock:
+            self.connection.close()
+
+    def plan(self, files):
+        """Record the files to download, keeping the state of known files.
+
+        :param files: List of (file_location, file_dest, size) tuples
+        :type files: list
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO files (location, path, state, size) "
+                "VALUES (?, ?, 'planned', ?)",
+                files,
+            )
+
+    def update(self, file_location, state, size=None, checksum=None):
+        """Record the new state of a file.
+
+        :param file_location: Remote location of the file
+        :param state: New state of the file
+        :param size: Size of the downloaded file in bytes
+        :param checksum: Checksum of the downloaded file
+        :type file_location: str
+        :type state: str
+        :type size: int
+        :type checksum: str
+        """
+        if state not in JOURNAL_STATES:
+            raise ValueError("Unknown journal state {}".format(state))
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE files SET state = ?, bytes = COALESCE(?, bytes), "
+                "checksum = ? WHERE location = ?",
+                (state, size, checksum, file_location),
+            )
+
+    def get(self, file_location):
+        """Return the journal entry of a file.
+
+        :param file_location: Remote location of the file
+        :type file_location: str
+
+        :return: Dictionary containing (path, state, size, bytes, checksum) of
+            the file, or None if the file is not in the journal
+        :rtype: dict
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT path, state, size, bytes, checksum FROM files "
+                "WHERE location = ?",
+                (file_location,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("path", "state", "size", "bytes", "checksum"), row))
+
+    def get_downloaded_file(self, file_location, file_dest):
+        """Return the information of a file if the journal shows it is complete.
+
+        The file is complete if it was downloaded or verified and the local
+        file still has the recorded size.
+
+        :param file_location: Remote location of the file
+        :param file_dest: Local destination path of the file
+        :type file_location: str
+        :type file_dest: str
+
+        :return: Dictionary containing (checksum, name, size) of the file, or
+            None if the file has to be downloaded
+        :rtype: dict
+        """
+        entry = self.get(file_location)
+        if entry is None or entry["state"] not in ("downloaded", "verified"):
+            return None
+        try:
+            if os.path.getsize(file_dest) != entry["bytes"]:
+                return None
+        except OSError:
+            return None
+        return {
+            "name": os.path.basename(file_dest),
+            "size": entry["bytes"],
+            "checksum": entry["checksum"],
+        }
@@ -8,10 +8,27 @@
 
 """cernopendata-client output print configuration."""
 
+import threading
+
 import click
 
 from .config import PRINTER_COLOUR_ERROR, PRINTER_COLOUR_INFO, PRINTER_COLOUR_NOTE
 
+DISPLAY_LOCK = threading.Lock()
+"""Lock serialising messages written by concurrent download workers."""
+
+display_config = {"err": False}
+
+
+def configure_display(err=False):
+    """Configure the stream messages are displayed on.
+
+    :param err: Display messages on the standard error, keeping the standard
+        output free for streamed file contents?
+    :type err: bool
+    """
+    display_config["err"] = err
+
 
 def display_message(msg_type=None, msg=None):
     """Display message in a similar style as run_command().
@@ -28,23 +45,30 @@ def display_message(msg_type=None, msg=None):
         "error": PRINTER_COLOUR_ERROR,
     }
     msg_color = msg_color_map.get(msg_type, "")
+    err = display_config["err"]
 
-    if msg_type == "info":
-        click.secho("==> ", bold=True, nl=False, fg="{}".format(msg_color))
-        click.secho("{}".format(msg), bold=True, nl=True)
-    elif msg_type == "note":
-        click.secho("  -> ", bold=False, nl=False, fg="{}".format(msg_color))
-        click.secho("{}".format(msg), bold=False, nl=True)
-    elif msg_type == "progress":
-        click.secho("  -> ", bold=False, nl=False, fg="{}".format(msg_color))
-        click.secho("{}".format(msg), bold=False, nl=False)
-    elif msg_type == "error":
-        click.secho(
-            "==> {}: ".format(msg_type.upper()),
-            bold=True,
-            nl=False,
-            fg="{}".format(msg_color),
-        )
-        click.secho("{}".format(msg), bold=False, nl=True)
-    else:
-        click.secho("{}".format(msg), nl=True)
+    with DISPLAY_LOCK:
+        if msg_type == "info":
+            click.secho("==> ", bold=True, nl=False, fg="{}".format(msg_color), err=err)
+            click.secho("{}".format(msg), bold=True, nl=True, err=err)
+        elif msg_type == "note":
+            click.secho(
+                "  -> ", bold=False, nl=False, fg="{}".format(msg_color), err=err
+            )
+            click.secho("{}".format(msg), bold=False, nl=True, err=err)
+        elif msg_type == "progress":
+            click.secho(
+                "  -> ", bold=False, nl=False, fg="{}".format(msg_color), err=err
+            )
+            click.secho("{}".format(msg), bold=False, nl=False, err=err)
+        elif msg_type == "error":
+            click.secho(
+                "==> {}: ".format(msg_type.upper()),
+                bold=True,
+                nl=False,
+                fg="{}".format(msg_color),
+                err=err,
+            )
+            click.secho("{}".format(msg), bold=False, nl=True, err=err)
+        else:
+            click.secho("{}".format(msg), nl=True, err=err)
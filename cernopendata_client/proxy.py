@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client site-local caching proxy."""
+
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+from .cache import evict_files
+from .config import (
+    DOWNLOAD_CHUNK_SIZE_MAX,
+    SERVE_CACHE_EVICT_RATIO,
+    SERVE_CACHE_METADATA_TTL,
+)
+from .downloader import is_download_error_page
+from .printer import display_message
+from .session import get_session
+
+
+def parse_byte_range(byte_range, size):
+    """Return the first and last byte of an HTTP byte range of a file.
+
+    :param byte_range: Value of the Range header, e.g. 'bytes=0-1023'
+    :param size: Size of the file in bytes
+    :type byte_range: str
+    :type size: int
+
+    :return: Tuple of the first and last byte of the range, or None if the
+        range is not satisfiable
+    :rtype: tuple
+    """
+    unit, _, ranges = byte_range.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    start, _, end = ranges.strip().partition("-")
+    try:
+        if not start:
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+class CacheProxyRequestHandler(BaseHTTPRequestHandler):
+    """Serve record metadata and files from the cache of the proxy."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Display the requests served."""
+        display_message(
+            msg_type="note", msg="{} {}".format(self.address_string(), format % args)
+        )
+
+    def do_HEAD(self):
+        """Serve HEAD requests."""
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        """Serve GET requests, files with optional byte ranges."""
+        try:
+            if self.path.startswith("/eos/"):
+                self.send_file(send_body)
+            else:
+                self.send_metadata(send_body)
+        except (requests.exceptions.RequestException, Urllib3HTTPError) as e:
+            self.send_body(502, "text/plain", str(e).encode(), send_body)
+
+    def send_metadata(self, send_body):
+        """Send a metadata response of the upstream server."""
+        status, content_type, body = self.server.get_metadata(self.path)
+        self.send_body(status, content_type, body, send_body)
+
+    def send_file(self, send_body):
+        """Send a file, or a byte range of it, of the upstream server."""
+        if not send_body and not self.server.is_file_cached(self.path):
+            status, headers = self.server.head_file(self.path)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        byte_range = self.headers.get("Range")
+        if byte_range and not self.server.is_file_cached(self.path):
+            self.server.prefetch_file(self.path)
+            return self.send_upstream_range(byte_range, send_body)
+        f, response = self.server.get_file(self.path)
+        if f is None:
+            return self.send_body(*response, send_body=send_body)
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+            if byte_range:
+                requested = parse_byte_range(byte_range, size)
+                if requested is None:
+                    self.send_response(416)
+                    self.send_header("Content-Range", "bytes */{}".format(size))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                start, end = requested
+                self.send_response(206)
+                self.send_header(
+                    "Content-Range", "bytes {}-{}/{}".format(start, end, size)
+                )
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            if send_body and size:
+                self.connection.sendfile(f, start, end - start + 1)
+
+    def send_upstream_range(self, byte_range, send_body):
+        """Pass a byte range of a file not cached yet through from upstream."""
+        with self.server.get_upstream_range(self.path, byte_range) as response:
+            self.send_response(response.status_code)
+            for name in ("Content-Type", "Content-Length", "Content-Range"):
+                if name in response.headers:
+                    self.send_header(name, response.headers[name])
+            if "Content-Length" not in response.headers:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            while send_body:
+                data = response.raw.read(DOWNLOAD_CHUNK_SIZE_MAX)
+                if not data:
+                    break
+                self.wfile.write(data)
+
+    def send_body(self, status, content_type, body, send_body=True):
+        """Send a complete response."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+class CacheProxy(ThreadingHTTPServer):
+    """Caching HTTP proxy of a CERN Open Data server for a site.
+
+    Metadata responses are cached for SERVE_CACHE_METADATA_TTL seconds and
+    files until they are evicted. Every file is fetched once from the
+    upstream server, however many clients request it at the same time, and
+    served with byte ranges from the cache directory. Byte ranges of a file
+    still being fetched are passed through from the upstream server. The
+    size of the cache is tracked as entries are stored, and the least
+    recently used entries are evicted when it grows over its size limit.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, upstream, cache_dir, max_size=None):
+        """Initialise class instance.
+
+        :param server_address: Tuple of the address and port to listen on
+        :param upstream: CERN Open Data server to cache
+        :param cache_dir: Directory of the cache
+        :param max_size: Maximum size of the cache in bytes, None for no limit
+        :type server_address: tuple
+        :type upstream: str
+        :type cache_dir: str
+        :type max_size: int
+        """
+        super().__init__(server_address, CacheProxyRequestHandler)
+        self.upstream = upstream.rstrip("/")
+        self.max_size = max_size
+        self.objects_path = os.path.join(cache_dir, "objects")
+        self.tmp_path = os.path.join(cache_dir, "tmp")
+        os.makedirs(self.objects_path, exist_ok=True)
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.locks_lock = threading.Lock()
+        self.locks = {}
+        self.prefetching = set()
+        self.size_lock = threading.Lock()
+        self.cache_size = evict_files(self.objects_path, max_size)
+
+    def handle_error(self, request, client_address):
+        """Ignore clients closing connections before reading the response."""
+
+    def get_cache_path(self, kind, path):
+        """Return the path of the cache entry of a request path."""
+        key = hashlib.sha256(path.encode()).hexdigest()
+        return os.path.join(self.objects_path, kind, key[:2], key)
+
+    def get_lock(self, cache_path):
+        """Return the lock serialising the fetches of a cache entry."""
+        with self.locks_lock:
+            return self.locks.setdefault(cache_path, threading.Lock())
+
+    def store(self, cache_path, write):
+        """Atomically add an entry to the cache and evict old entries.
+
+        :param cache_path: Path of the cache entry
+        :param write: Callable writing the entry into an open binary file
+        :type cache_path: str
+        :type write: callable
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            size = os.path.getsize(tmp_path)
+            try:
+                size -= os.path.getsize(cache_path)
+            except OSError:
+                pass
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if not self.max_size:
+            return
+        with self.size_lock:
+            self.cache_size += size
+            if self.cache_size > self.max_size:
+                self.cache_size = evict_files(
+                    self.objects_path,
+                    int(self.max_size * SERVE_CACHE_EVICT_RATIO),
+                    keep=cache_path,
+                )
+
+    def get_metadata(self, path):
+        """Return a metadata response, from the cache if it is fresh.
+
+        :param path: Request path, including the query string
+        :type path: str
+
+        :return: Tuple of the status, content type and body of the response
+        :rtype: tuple
+        """
+        cache_path = self.get_cache_path("metadata", path)
+        with self.get_lock(cache_path):
+            try:
+                with open(cache_path) as f:
+                    entry = json.load(f)
+                if time.time() - entry["time"] < SERVE_CACHE_METADATA_TTL:
+                    os.utime(cache_path)
+                    return 200, entry["content_type"], base64.b64decode(entry["body"])
+            except (OSError, ValueError, KeyError):
+                pass
+            response = get_session().get(self.upstream + path)
+            content_type = response.headers.get("Content-Type", "text/plain")
+            if response.status_code == 200:
+                entry = {
+                    "time": time.time(),
+                    "content_type": content_type,
+                    "body": base64.b64encode(response.content).decode(),
+                }
+                self.store(cache_path, lambda f: f.write(json.dumps(entry).encode()))
+            return response.status_code, content_type, response.content
+
+    def is_file_cached(self, path):
+        """Return True if a file is in the cache."""
+        return os.path.isfile(self.get_cache_path("files", path))
+
+    def head_file(self, path):
+        """Return the status and headers of a file of the upstream server.
+
+        :param path: Request path of the file
+        :type path: str
+
+        :return: Tuple of the status and relevant headers of the response
+        :rtype: tuple
+        """
+        response = get_session().head(self.upstream + path, allow_redirects=True)
+        headers = {
+            name: response.headers[name]
+            for name in ("Content-Type", "Content-Length", "Accept-Ranges")
+            if name in response.headers
+        }
+        return response.status_code, headers
+
+    def get_upstream_range(self, path, byte_range):
+        """Return the streamed response of the upstream server to a byte range.
+
+        :param path: Request path of the file
+        :param byte_range: Value of the Range header of the request
+        :type path: str
+        :type byte_range: str
+
+        :return: Response of the upstream server
+        :rtype: requests.Response
+        """
+        return get_session().get(
+            self.upstream + path,
+            headers={"Accept-Encoding": "identity", "Range": byte_range},
+            stream=True,
+        )
+
+    def prefetch_file(self, path):
+        """Fetch a file into the cache in the background, unless already fetching.
+
+        :param path: Request path of the file
+        :type path: str
+        """
+        with self.locks_lock:
+            if path in self.prefetching:
+                return
+            self.prefetching.add(path)
+        threading.Thread(target=self.run_prefetch, args=(path,), daemon=True).start()
+
+    def run_prefetch(self, path):
+        """Fetch a file into the cache, ignoring failures."""
+        try:
+            f, _response = self.get_file(path)
+            if f is not None:
+                f.close()
+        except (requests.exceptions.RequestException, Urllib3HTTPError, OSError):
+            pass
+        finally:
+            with self.locks_lock:
+                self.prefetching.discard(path)
+
+    def get_file(self, path):
+        """Return the cached copy of a file, fetching it if needed.
+
+        The cached copy is returned open, so that it can be served even if it
+        is evicted meanwhile.
+
+        :param path: Request path of the file
+        :type path: str
+
+        :return: Tuple of the cached file open for reading, or None if the
+            file could not be fetched, and of the (status, content type, body)
+            of the upstream response to pass on in that case
+        :rtype: tuple
+        """
+        cache_path = self.get_cache_path("files", path)
+        with self.get_lock(cache_path):
+            try:
+                os.utime(cache_path)
+                return open(cache_path, "rb"), None
+            except OSError:
+                pass
+            response = get_session().get(
+                self.upstream + path,
+                headers={"Accept-Encoding": "identity"},
+                stream=True,
+            )
+            with response:
+                first_chunk = response.raw.read(DOWNLOAD_CHUNK_SIZE_MAX)
+                if is_download_error_page(
+                    path,
+                    response.status_code,
+                    {name.lower(): value for name, value in response.headers.items()},
+                    first_chunk[:64],
+                ):
+                    status = response.status_code
+                    content_type = response.headers.get("Content-Type", "text/plain")
+                    body = first_chunk + response.raw.read()
+                    # never cache the error page of the upstream server
+                    return None, (502 if status == 200 else status, content_type, body)
+
+                def write(f):
+                    f.write(first_chunk)
+                    while True:
+                        data = response.raw.read(DOWNLOAD_CHUNK_SIZE_MAX)
+                        if not data:
+                            break
+                        f.write(data)
+
+                self.store(cache_path, write)
+            return open(cache_path, "rb"), None
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download bandwidth limiting utilities."""
+
+import threading
+import time
+
+from .config import DOWNLOAD_RATE_BURST_TIME
+
+rate_limit_lock = threading.Lock()
+rate_limit_config = {"rate": None, "transfer_rate": None}
+rate_limit_cache = {}
+
+
+class TokenBucket:
+    """Token bucket limiting the rate at which bytes are consumed.
+
+    The bucket holds up to DOWNLOAD_RATE_BURST_TIME seconds worth of tokens.
+    Consuming more tokens than available puts the bucket in debt and blocks
+    the caller until the debt is paid back, so that chunks of any size are
+    throttled correctly and concurrent callers share the rate.
+    """
+
+    def __init__(self, rate):
+        """Initialise class instance.
+
+        :param rate: Maximum rate in bytes per second
+        :type rate: int
+        """
+        self.rate = float(rate)
+        self.capacity = self.rate * DOWNLOAD_RATE_BURST_TIME
+        self.tokens = self.capacity
+        self.time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, size):
+        """Take tokens for a number of bytes, waiting until the rate allows it.
+
+        :param size: Number of bytes transferred
+        :type size: int
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.time) * self.rate
+            )
+            self.time = now
+            self.tokens -= size
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Bandwidth limiter of a transfer, sharing the process-wide limit."""
+
+    def __init__(self, transfer_bucket=None, global_bucket=None):
+        """Initialise class instance.
+
+        :param transfer_bucket: Token bucket of the transfer
+        :param global_bucket: Token bucket shared by all transfers
+        :type transfer_bucket: TokenBucket
+        :type global_bucket: TokenBucket
+        """
+        self.buckets = [b for b in (transfer_bucket, global_bucket) if b is not None]
+
+    def __bool__(self):
+        """Return True if the transfer is rate limited."""
+        return bool(self.buckets)
+
+    def consume(self, size):
+        """Wait until a number of bytes can be transferred.
+
+        :param size: Number of bytes transferred
+        :type size: int
+        """
+        for bucket in self.buckets:
+            bucket.consume(size)
+
+
+def configure_rate_limit(rate=None, transfer_rate=None):
+    """Configure the download bandwidth limits of the process.
+
+    :param rate: Maximum rate in bytes per second of all transfers together,
+        None or 0 for no limit
+    :param transfer_rate: Maximum rate in bytes per second of every single
+        transfer, None or 0 for no limit
+    :type rate: int
+    :type transfer_rate: int
+    """
+    with rate_limit_lock:
+        rate_limit_config["rate"] = rate or None
+        rate_limit_config["transfer_rate"] = transfer_rate or None
+        rate_limit_cache.pop("bucket", None)
+
+
+def get_rate_limit():
+    """Return the configured download bandwidth limits of the process.
+
+    :return: Tuple of the rate of all transfers together and of every single
+        transfer in bytes per second, None meaning no limit
+    :rtype: tuple
+    """
+    with rate_limit_lock:
+        return rate_limit_config["rate"], rate_limit_config["transfer_rate"]
+
+
+def get_rate_limiter(per_transfer=True):
+    """Return a bandwidth limiter for a new transfer.
+
+    :param per_transfer: Apply the per-transfer limit too? Engines limiting
+        the rate of every transfer natively only need the process-wide limit.
+    :type per_transfer: bool
+
+    :return: Limiter combining a token bucket of its own, if a per-transfer
+        limit is set, and the token bucket shared by all transfers, if a
+        process-wide limit is set
+    :rtype: RateLimiter
+    """
+    with rate_limit_lock:
+        global_bucket = rate_limit_cache.get("bucket")
+        if global_bucket is None and rate_limit_config["rate"]:
+            global_bucket = TokenBucket(rate_limit_config["rate"])
+            rate_limit_cache["bucket"] = global_bucket
+        transfer_rate = rate_limit_config["transfer_rate"]
+    transfer_bucket = None
+    if per_transfer and transfer_rate:
+        transfer_bucket = TokenBucket(transfer_rate)
+    return RateLimiter(transfer_bucket, global_bucket)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client retry policy of the requests made to the servers."""
+
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+from .config import (
+    DOWNLOAD_RETRY_LIMIT,
+    DOWNLOAD_RETRY_SLEEP,
+    RETRY_BACKOFF_MAX,
+    RETRY_BREAKER_PAUSE,
+    RETRY_BREAKER_THRESHOLD,
+    RETRY_STATUS_CODES,
+)
+from .printer import display_message
+from .session import get_session
+
+retry_lock = threading.Lock()
+retry_config = {
+    "limit": DOWNLOAD_RETRY_LIMIT,
+    "sleep": DOWNLOAD_RETRY_SLEEP,
+    "breaker_threshold": RETRY_BREAKER_THRESHOLD,
+    "breaker_pause": RETRY_BREAKER_PAUSE,
+}
+circuit_breakers = {}
+
+
+class RetryableError(IOError):
+    """Failure of a request which is worth retrying later."""
+
+    def __init__(self, msg, retry_after=None, response=None):
+        """Initialise class instance.
+
+        :param msg: Description of the failure
+        :param retry_after: Delay in seconds requested by the server
+        :param response: Response of the server, if any
+        :type msg: str
+        :type retry_after: float
+        :type response: requests.Response
+        """
+        super().__init__(msg)
+        self.retry_after = retry_after
+        self.response = response
+
+
+RETRYABLE_ERRORS = (
+    RetryableError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    Urllib3HTTPError,
+)
+"""Exceptions of the transfers which are retried."""
+
+
+def configure_retry(limit=None, sleep=None, breaker_threshold=None, breaker_pause=None):
+    """Configure the retry policy of all requests of the process.
+
+    :param limit: Number of retries of a failed request
+    :param sleep: Base delay in seconds of the exponential backoff
+    :param breaker_threshold: Number of consecutive failures pausing a host
+    :param breaker_pause: Time in seconds a failing host is paused for
+    :type limit: int
+    :type sleep: float
+    :type breaker_threshold: int
+    :type breaker_pause: float
+    """
+    with retry_lock:
+        if limit is not None:
+            retry_config["limit"] = limit
+        if sleep is not None:
+            retry_config["sleep"] = sleep
+        if breaker_threshold is not None:
+            retry_config["breaker_threshold"] = breaker_threshold
+        if breaker_pause is not None:
+            retry_config["breaker_pause"] = breaker_pause
+        circuit_breakers.clear()
+
+
+def get_retry_limit():
+    """Return the configured number of retries of a failed request."""
+    with retry_lock:
+        return retry_config["limit"]
+
+
+def parse_retry_after(value):
+    """Return the delay requested by a Retry-After header.
+
+    :param value: Value of the header, in seconds or as an HTTP date
+    :type value: str
+
+    :return: Delay in seconds, or None if the header is missing or invalid
+    :rtype: float
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0)
+
+
+def get_retry_delay(attempt, retry_after=None, sleep=None):
+    """Return the delay before retrying a failed request.
+
+    The delay grows exponentially with the number of failed attempts, up to
+    RETRY_BACKOFF_MAX, and is randomised between its half and its full value
+    so that the clients failing together do not retry together. The server
+    is never asked again before the delay it requested with Retry-After.
+
+    :param attempt: Number of the failed attempt, starting from 0
+    :param retry_after: Delay in seconds requested by the server
+    :param sleep: Base delay in seconds, the configured one if not given
+    :type attempt: int
+    :type retry_after: float
+    :type sleep: float
+
+    :return: Delay in seconds
+    :rtype: float
+    """
+    if sleep is None:
+        with retry_lock:
+            sleep = retry_config["sleep"]
+    backoff = min(sleep * 2**attempt, RETRY_BACKOFF_MAX)
+    delay = random.uniform(backoff / 2, backoff)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class CircuitBreaker:
+    """Circuit breaker pausing the requests made to a failing host.
+
+    After breaker_threshold consecutive failures the host is paused for
+    breaker_pause seconds, during which every request to it waits instead of
+    hammering it. The first request after the pause probes the host: a
+    single failure pauses it again, a success closes the circuit.
+    """
+
+    def __init__(self, host, threshold, pause):
+        """Initialise class instance.
+
+        :param host: Network location of the host
+        :param threshold: Number of consecutive failures pausing the host
+        :param pause: Time in seconds the host is paused for
+        :type host: str
+        :type threshold: int
+        :type pause: float
+        """
+        self.host = host
+        self.threshold = threshold
+        self.pause = pause
+        self.failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def get_pause(self):
+        """Return the time in seconds until the host can be asked again."""
+        with self.lock:
+            return max(self.open_until - time.monotonic(), 0)
+
+    def wait(self):
+        """Wait until the host can be asked again."""
+        pause = self.get_pause()
+        if pause > 0:
+            time.sleep(pause)
+
+    def record_success(self):
+        """Close the circuit after a successful request."""
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        """Count a failed request, pausing the host after too many of them."""
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold or self.open_until > time.monotonic():
+                return
+            self.open_until = time.monotonic() + self.pause
+            # the request after the pause probes the host
+            self.failures = self.threshold - 1
+        display_message(
+            msg_type="note",
+            msg="Server {} keeps failing. Pausing requests for {} seconds.".format(
+                self.host, self.pause
+            ),
+        )
+
+
+def get_circuit_breaker(location):
+    """Return the circuit breaker of the host of a location.
+
+    :param location: Remote location on the host
+    :type location: str
+
+    :return: Circuit breaker shared by all requests to the host
+    :rtype: CircuitBreaker
+    """
+    host = urlparse(location).netloc
+    with retry_lock:
+        breaker = circuit_breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                host, retry_config["breaker_threshold"], retry_config["breaker_pause"]
+            )
+            circuit_breakers[host] = breaker
+        return breaker
+
+
+def call_with_retry(attempt_request, location, limit=None, sleep=None):
+    """Call a request until it succeeds, retrying its retryable failures.
+
+    :param attempt_request: Callable making the request, called with the
+        number of the attempt starting from 0, so that later attempts can
+        resume from what the failed ones achieved
+    :param location: Remote location the request is made to
+    :param limit: Number of retries, the configured one if not given
+    :param sleep: Base delay in seconds of the exponential backoff, the
+        configured one if not given
+    :type attempt_request: callable
+    :type location: str
+    :type limit: int
+    :type sleep: float
+
+    :return: Return value of the successful call
+    :raises: The exception of the last attempt if all attempts failed
+    """
+    if limit is None:
+        limit = get_retry_limit()
+    breaker = get_circuit_breaker(location)
+    attempt = 0
+    while True:
+        breaker.wait()
+        try:
+            result = attempt_request(attempt)
+        except RETRYABLE_ERRORS as e:
+            breaker.record_failure()
+            if attempt >= limit:
+                raise
+            delay = get_retry_delay(attempt, getattr(e, "retry_after", None), sleep)
+            attempt += 1
+            display_message(
+                msg_type="note",
+                msg="{}. Retrying {}/{} in {:.1f} seconds".format(
+                    e, attempt, limit, delay
+                ),
+            )
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def check_retry_status(response):
+    """Raise RetryableError if the status of a response asks to retry later.
+
+    :param response: Response of the server
+    :type response: requests.Response
+    """
+    if response.status_code in RETRY_STATUS_CODES:
+        response.close()
+        raise RetryableError(
+            "Server responded with status {}".format(response.status_code),
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+            response=response,
+        )
+
+
+def request_with_retry(method, url, **kwargs):
+    """Make a request with the shared session, retrying transient failures.
+
+    :param method: HTTP method of the request
+    :param url: URL of the request
+    :type method: str
+    :type url: str
+
+    :return: Response of the server, the last one if it kept asking to retry
+    :rtype: requests.Response
+    """
+
+    def attempt_request(_attempt):
+        response = get_session().request(method, url, **kwargs)
+        check_retry_status(response)
+        return response
+
+    try:
+        return call_with_retry(attempt_request, url)
+    except RetryableError as e:
+        if e.response is None:
+            raise
+        return e.response
@@ -0,0 +1,601 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client scheduler of the downloads of several records."""
+
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+
+from .config import DOWNLOAD_PREFETCH_RECORDS
+from .downloader import (
+    DownloadError,
+    download_file,
+    download_files_in_batch,
+    fetch_cached_files,
+    get_default_download_engine,
+    get_download_files_by_filters,
+    get_download_path,
+    get_file_host,
+    get_file_subdirectories,
+    get_transfer_order,
+)
+from .journal import DownloadJournal, get_journal_path
+from .printer import display_message
+from .searcher import get_files_list, get_recids_by_query, get_record_as_json
+from .utils import format_size
+from .workqueue import WorkQueue, download_files_with_queue, get_queue_path
+
+RecordFiles = namedtuple(
+    "RecordFiles", ["recid", "file_locations", "file_sizes", "file_checksums"]
+)
+"""Selected files of a record with the sizes and checksums of all its files."""
+
+
+def get_record_selectors(server=None, recids=(), dois=(), titles=(), query=None):
+    """Return the selectors of the records to download.
+
+    :param server: CERN Open Data server to query
+    :param recids: Record IDs
+    :param dois: Digital Object Identifiers of records
+    :param titles: Record titles
+    :param query: Search query of the portal selecting more records
+    :type server: str
+    :type recids: tuple
+    :type dois: tuple
+    :type titles: tuple
+    :type query: str
+
+    :return: List of (recid, doi, title) tuples selecting one record each, or
+        a single empty selector if no record is given
+    :rtype: list
+    """
+    recids = list(recids)
+    if query:
+        recids.extend(get_recids_by_query(server=server, query=query))
+    selectors = []
+    seen = set()
+    for recid in recids:
+        if str(recid) not in seen:
+            seen.add(str(recid))
+            selectors.append((recid, None, None))
+    selectors.extend((None, doi, None) for doi in dois)
+    selectors.extend((None, None, title) for title in titles)
+    return selectors or [(None, None, None)]
+
+
+class RecordPrefetcher:
+    """Iterator over the selected files of records, fetching metadata ahead.
+
+    The metadata of the next DOWNLOAD_PREFETCH_RECORDS records is fetched in
+    the background while the files of the current record are downloading, so
+    that the transfers never wait for the metadata of the next record. When
+    several records are downloaded, the records which cannot be fetched or
+    have no files selected are reported and skipped instead of stopping the
+    run, the former being listed in the failed attribute.
+    """
+
+    def __init__(
+        self,
+        server,
+        selectors,
+        protocol=None,
+        expand=None,
+        names=None,
+        regexp=None,
+        ranges=None,
+        shard=None,
+        ahead=None,
+    ):
+        """Initialise class instance.
+
+        :param server: CERN Open Data server to query
+        :param selectors: List of (recid, doi, title) tuples of the records
+        :param protocol: Protocol to be used in links [http,xrootd]
+        :param expand: Flag for expanding file indexes
+        :param names: Tuple of file names filters input
+        :param regexp: Regexp string for filtering of file locations
+        :param ranges: Tuple of ranges filters input
+        :param shard: Shard of the selected files of every record (i/N)
+        :param ahead: Number of records fetched ahead
+        :type server: str
+        :type selectors: list
+        :type protocol: str
+        :type expand: bool
+        :type names: tuple
+        :type regexp: str
+        :type ranges: tuple
+        :type shard: str
+        :type ahead: int
+        """
+        self.server = server
+        self.selectors = selectors
+        self.protocol = protocol
+        self.expand = expand
+        self.filters = {
+            "names": names,
+            "regexp": regexp,
+            "ranges": ranges,
+            "shard": shard,
+        }
+        self.ahead = ahead or DOWNLOAD_PREFETCH_RECORDS
+        self.failed = []
+
+    def fetch(self, selector):
+        """Return the metadata and file list of a record."""
+        record_json = get_record_as_json(self.server, *selector)
+        return record_json, get_files_list(
+            self.server, record_json, self.protocol, self.expand
+        )
+
+    def select(self, record_json, files_list):
+        """Return the files of a record selected by the filters."""
+        file_locations = [file_[0] for file_ in files_list]
+        # file index listings carry the size of the indexed files, not their own
+        file_sizes = {file_[0]: file_[1] if file_[2] else None for file_ in files_list}
+        return RecordFiles(
+            recid=record_json["metadata"]["recid"],
+            file_locations=get_download_files_by_filters(
+                file_locations=file_locations, file_sizes=file_sizes, **self.filters
+            ),
+            file_sizes=file_sizes,
+            file_checksums={file_[0]: file_[2] for file_ in files_list},
+        )
+
+    def __iter__(self):
+        """Yield the selected files of every record, in the order of the records."""
+        selectors = iter(self.selectors)
+        recids = set()
+        with ThreadPoolExecutor(max_workers=self.ahead) as executor:
+            futures = deque(
+                (selector, executor.submit(self.fetch, selector))
+                for selector in islice(selectors, self.ahead)
+            )
+            while futures:
+                selector, future = futures.popleft()
+                for next_selector in islice(selectors, 1):
+                    futures.append(
+                        (next_selector, executor.submit(self.fetch, next_selector))
+                    )
+                try:
+                    record_files = self.select(*future.result())
+                except SystemExit as e:
+                    if len(self.selectors) == 1:
+                        raise
+                    if e.code:
+                        self.failed.append(selector)
+                    continue
+                if str(record_files.recid) not in recids:
+                    recids.add(str(record_files.recid))
+                    yield record_files
+
+
+class TransferPool:
+    """Pool of concurrent file transfers shared by the downloads of all records.
+
+    Submitting a transfer blocks while enough transfers are queued to keep the
+    pool busy, so that the next records are prepared just before their files
+    are needed. With a single job the files are downloaded in the calling
+    thread, their failures being recorded in their futures all the same, so
+    that a failed file does not stop the downloads of the other records.
+    """
+
+    def __init__(self, jobs=1):
+        """Initialise class instance.
+
+        :param jobs: Maximum number of concurrent transfers
+        :type jobs: int
+        """
+        self.executor = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        self.slots = threading.Semaphore(2 * jobs)
+        self.futures = set()
+        self.lock = threading.Lock()
+
+    def submit(self, download_file, index, file_location):
+        """Schedule the download of a file.
+
+        :return: Future of the download
+        :rtype: concurrent.futures.Future
+        """
+        if self.executor is None:
+            future = Future()
+            try:
+                download_file(index, file_location)
+            except (Exception, SystemExit) as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+            return future
+        self.slots.acquire()
+        future = self.executor.submit(download_file, index, file_location)
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self.release)
+        return future
+
+    def release(self, future):
+        """Free the slot of a finished transfer."""
+        with self.lock:
+            self.futures.discard(future)
+        self.slots.release()
+
+    def cancel(self):
+        """Cancel the transfers which did not start yet."""
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.cancel()
+
+    def close(self):
+        """Wait for the scheduled transfers to finish."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+class RecordDownload:
+    """Download of the selected files of a record."""
+
+    def __init__(self, record_files, base_path, options):
+        """Initialise class instance.
+
+        :param record_files: Selected files of the record
+        :param base_path: Download directory of the record
+        :param options: Keyword arguments of download_file common to all files
+        :type record_files: RecordFiles
+        :type base_path: str
+        :type options: dict
+        """
+        self.record_files = record_files
+        self.base_path = base_path
+        self.options = options
+        self.file_subdirs = get_file_subdirectories(record_files.file_locations)
+        self.journal = None
+        self.cached_files = {}
+        self.downloaded_files = None
+        self.futures = []
+        self.failed_file_locations = []
+        self.skipped_files = []
+        self.transferred = 0
+        self.lock = threading.Lock()
+
+    def get_path(self, file_location):
+        """Return the directory a file of the record is downloaded to."""
+        return get_download_path(self.base_path, file_location, self.file_subdirs)
+
+    def download_file(self, index, file_location):
+        """Download a selected file of the record.
+
+        :param index: Index of the file in the selected files of the record
+        :param file_location: Remote location of the file
+        :type index: int
+        :type file_location: str
+
+        :return: False if the file failed to download, True otherwise
+        :rtype: bool
+        """
+        downloaded_file = self.cached_files.get(file_location)
+        if self.downloaded_files is not None:
+            downloaded_file = downloaded_file or self.downloaded_files.get(
+                file_location
+            )
+            # files being downloaded by another process are waited for
+            if downloaded_file is None and file_location not in self.downloaded_files:
+                self.failed_file_locations.append(file_location)
+                return False
+        else:
+            display_message(
+                msg_type="info",
+                msg="Downloading file {} of {}".format(
+                    index + 1, len(self.record_files.file_locations)
+                ),
+            )
+        try:
+            downloaded_file = download_file(
+                path=self.get_path(file_location),
+                file_location=file_location,
+                file_size=self.record_files.file_sizes[file_location],
+                file_checksum=self.record_files.file_checksums[file_location],
+                downloaded_file=downloaded_file,
+                journal=self.journal,
+                **self.options
+            )
+        except DownloadError as e:
+            display_message(msg_type="error", msg=str(e))
+            self.failed_file_locations.append(file_location)
+            return False
+        if downloaded_file["skipped"]:
+            self.skipped_files.append(downloaded_file)
+        elif file_location not in self.cached_files:
+            with self.lock:
+                self.transferred += downloaded_file["size"]
+        return True
+
+    def is_finished(self):
+        """Return True if all scheduled files of the record are finished."""
+        return all(future.done() for _file_location, future in self.futures)
+
+    def finish(self):
+        """Collect the failed files of the record and close its journal."""
+        failed = set(self.failed_file_locations)
+        for file_location, future in self.futures:
+            if future.exception() is not None:
+                failed.add(file_location)
+        self.futures = []
+        self.failed_file_locations = [
+            file_location
+            for file_location in self.record_files.file_locations
+            if file_location in failed
+        ]
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+
+class DownloadScheduler:
+    """Scheduler of the downloads of the files of several records.
+
+    The files of all records are downloaded by a single transfer pool, the
+    files of the next record being queued while the last files of the
+    previous one are still transferring, so that the link does not idle
+    between records. Download engines transferring files in batches, and
+    downloads shared through a work queue, download the records one after
+    another instead.
+    """
+
+    def __init__(
+        self,
+        protocol,
+        download_engine=None,
+        jobs=1,
+        order=None,
+        journal=True,
+        queue=False,
+        cache=None,
+        history=None,
+        options=None,
+    ):
+        """Initialise class instance.
+
+        :param protocol: Protocol to be used for downloading files
+        :param download_engine: Library to be used in downloading files, chosen
+            from the download history for the first record if not given
+        :param jobs: Maximum number of concurrent transfers
+        :param order: Transfer order policy of the files of every record
+        :param journal: Record the state of the files in a journal per record?
+        :param queue: Share the downloads through a work queue per record?
+        :param cache: Download cache shared by all records
+        :param history: Throughput history recording the throughput of the run
+        :param options: Keyword arguments of download_file common to all files
+        :type protocol: str
+        :type download_engine: str
+        :type jobs: int
+        :type order: str
+        :type journal: bool
+        :type queue: bool
+        :type cache: DownloadCache
+        :type history: ThroughputHistory
+        :type options: dict
+        """
+        self.protocol = protocol
+        self.download_engine = download_engine
+        self.jobs = jobs
+        self.order = order
+        self.journal = journal
+        self.queue = queue
+        self.cache = cache
+        self.history = history
+        self.options = dict(options or {})
+        self.pool = TransferPool(jobs)
+        self.records = []
+        self.host = None
+        self.start_time = None
+
+    def get_download_engine(self, file_locations):
+        """Return the download engine, choosing it for the first record."""
+        if self.host is None and file_locations:
+            self.host = get_file_host(file_locations[0])
+        if not self.download_engine:
+            self.download_engine = get_default_download_engine(
+                self.protocol, self.host, self.history, self.jobs
+            )
+        return self.download_engine
+
+    def record_throughput(self):
+        """Record the bytes transferred by the run over its wall time.
+
+        The throughput of the whole run is recorded for every engine, so that
+        engines transferring files one by one or in batches are compared
+        alike.
+        """
+        if self.history is None or self.start_time is None or self.host is None:
+            return
+        self.history.record(
+            self.download_engine,
+            self.host,
+            sum(record.transferred for record in self.records),
+            time.monotonic() - self.start_time,
+            self.jobs,
+        )
+
+    def add_record(self, record_files):
+        """Schedule the download of the selected files of a record.
+
+        :param record_files: Selected files of the record
+        :type record_files: RecordFiles
+        """
+        base_path = record_files.recid
+        if not os.path.isdir(base_path):
+            try:
+                os.mkdir(base_path)
+            except OSError:
+                display_message(
+                    msg_type="error",
+                    msg="Creation of the directory {} failed".format(base_path),
+                )
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        file_locations = record_files.file_locations
+        download_engine = self.get_download_engine(file_locations)
+        record = RecordDownload(
+            record_files,
+            base_path,
+            dict(
+                self.options,
+                protocol=self.protocol,
+                download_engine=download_engine,
+                progress=self.jobs == 1,
+                cache=self.cache,
+            ),
+        )
+        self.records.append(record)
+        transfer_order = get_transfer_order(
+            file_locations, record_files.file_sizes, self.order
+        )
+        file_downloads = [
+            (record.get_path(file_locations[index]), file_locations[index])
+            for index in transfer_order
+        ]
+        work_queue = WorkQueue(get_queue_path(base_path)) if self.queue else None
+        # SQLite databases cannot be shared safely over network file systems
+        if self.journal and not self.queue:
+            record.journal = DownloadJournal(get_journal_path(base_path))
+            record.journal.plan(
+                (
+                    file_location,
+                    path + "/" + file_location.split("/")[-1],
+                    record_files.file_sizes[file_location],
+                )
+                for path, file_location in file_downloads
+            )
+        record.cached_files = fetch_cached_files(
+            self.cache,
+            file_downloads,
+            record_files.file_sizes,
+            record_files.file_checksums,
+        )
+        record.downloaded_files = download_files_in_batch(
+            self.protocol,
+            download_engine,
+            [file_ for file_ in file_downloads if file_[1] not in record.cached_files],
+            jobs=self.jobs,
+            segments=self.options.get("segments", 1),
+            progress=self.jobs == 1,
+            journal=record.journal,
+            file_sizes=record_files.file_sizes,
+            incremental=self.options.get("incremental"),
+            queue=work_queue,
+        )
+        if work_queue is not None:
+            record.failed_file_locations += download_files_with_queue(
+                record.download_file,
+                file_locations,
+                jobs=self.jobs,
+                order=transfer_order,
+                queue=work_queue,
+            )
+        for index in transfer_order if work_queue is None else []:
+            record.futures.append(
+                (
+                    file_locations[index],
+                    self.pool.submit(
+                        record.download_file, index, file_locations[index]
+                    ),
+                )
+            )
+        self.finish_records()
+
+    def finish_records(self):
+        """Finish the records whose files are all downloaded."""
+        for record in self.records:
+            if record.futures and record.is_finished():
+                record.finish()
+
+    def download(self, records):
+        """Download the selected files of records until all are finished.
+
+        :param records: Iterable over the selected files of the records
+        :type records: iterable
+        """
+        try:
+            for record_files in records:
+                self.add_record(record_files)
+            self.pool.close()
+        except KeyboardInterrupt:
+            self.pool.cancel()
+            raise
+        for record in self.records:
+            record.finish()
+        self.record_throughput()
+
+    def report(self, failed_records=None):
+        """Display the failed and skipped files of all records.
+
+        :param failed_records: Selectors of the records which failed to fetch
+        :type failed_records: list
+
+        :return: True if all files of all records were downloaded
+        :rtype: bool
+        """
+        several = len(self.records) > 1 or bool(failed_records)
+        success = not failed_records
+        for record in self.records:
+            if not record.failed_file_locations:
+                continue
+            success = False
+            file_locations = record.record_files.file_locations
+            display_message(
+                msg_type="error",
+                msg="Download of {} of {} files{} failed:\n{}".format(
+                    len(record.failed_file_locations),
+                    len(file_locations),
+                    (
+                        " of record {}".format(record.record_files.recid)
+                        if several
+                        else ""
+                    ),
+                    "\n".join(
+                        "  {} {}".format(
+                            file_locations.index(file_location) + 1, file_location
+                        )
+                        for file_location in record.failed_file_locations
+                    ),
+                ),
+            )
+        if failed_records:
+            display_message(
+                msg_type="error",
+                msg="Download of {} records failed:\n{}".format(
+                    len(failed_records),
+                    "\n".join(
+                        "  " + " ".join(str(value) for value in selector if value)
+                        for selector in failed_records
+                    ),
+                ),
+            )
+        if not success:
+            return False
+        skipped_files = [
+            skipped for record in self.records for skipped in record.skipped_files
+        ]
+        if skipped_files:
+            display_message(
+                msg_type="info",
+                msg="Skipped {} of {} files already downloaded, saving {}".format(
+                    len(skipped_files),
+                    sum(
+                        len(record.record_files.file_locations)
+                        for record in self.records
+                    ),
+                    format_size(sum(skipped["size"] for skipped in skipped_files)),
+                ),
+            )
+        return True
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # This file is part of cernopendata-client.
 #
-# Copyright (C) 2020, 2024, 2025 CERN.
+# Copyright (C) 2020, 2024, 2025, 2026 CERN.
 #
 # cernopendata-client is free software; you can redistribute it and/or modify
 # it under the terms of the GPLv3 license; see LICENSE file for more details.
@@ -11,12 +11,17 @@
 from __future__ import print_function
 
 import sys
-import requests
 
 from urllib.parse import quote
 
-from .config import SERVER_HTTP_URI, SERVER_ROOT_URI, SERVER_HTTPS_URI
+from .config import (
+    SEARCH_PAGE_SIZE,
+    SERVER_HTTP_URI,
+    SERVER_ROOT_URI,
+    SERVER_HTTPS_URI,
+)
 from .printer import display_message
+from .retry import request_with_retry
 
 
 def verify_recid(server=None, recid=None):
@@ -31,7 +36,7 @@ def verify_recid(server=None, recid=None):
     :rtype: bool
     """
     input_record_url = server + "/record/" + str(recid)
-    input_record_url_check = requests.get(input_record_url)
+    input_record_url_check = request_with_retry("GET", input_record_url)
 
     if input_record_url_check.status_code == 200:
         base_record_id = str(recid)
@@ -60,7 +65,7 @@ def get_recid_api(server=None, base_record_id=None):
     :rtype: str
     """
     record_api_url = server + "/api/records/" + base_record_id
-    record_api = requests.get(record_api_url)
+    record_api = request_with_retry("GET", record_api_url)
     try:
         record_api.raise_for_status()
     except Exception:
@@ -95,7 +100,7 @@ def get_recid(server=None, title=None, doi=None):
         + "?page=1&size=1&q={}:".format(name)
         + quote('"{}"'.format(value), safe="")
     )
-    response = requests.get(url)
+    response = request_with_retry("GET", url)
     response_json = response.json()
     try:
         response.raise_for_status()
@@ -123,6 +128,49 @@ def get_recid(server=None, title=None, doi=None):
             return response_json["hits"]["hits"][0]["id"]
 
 
+def get_recids_by_query(server=None, query=None):
+    """Return the record IDs of all records matching a search query.
+
+    :param server: CERN Open Data server to query
+    :param query: Search query of the portal
+    :type server: str
+    :type query: str
+
+    :return: List of record IDs in the order of the search results
+    :rtype: list
+    """
+    recids = []
+    page = 1
+    while True:
+        url = (
+            server
+            + "/api/records"
+            + "?page={}&size={}&q=".format(page, SEARCH_PAGE_SIZE)
+            + quote(query, safe="")
+        )
+        response = request_with_retry("GET", url)
+        try:
+            response.raise_for_status()
+        except Exception as e:
+            display_message(
+                msg_type="error",
+                msg="Connection to server failed: \n reason: {}.".format(e),
+            )
+            sys.exit(1)
+        hits = response.json()["hits"]
+        recids.extend(hit["id"] for hit in hits["hits"])
+        if len(hits["hits"]) < SEARCH_PAGE_SIZE or len(recids) >= hits["total"]:
+            break
+        page += 1
+    if not recids:
+        display_message(
+            msg_type="error",
+            msg="No records match the query {}.".format(query),
+        )
+        sys.exit(2)
+    return recids
+
+
 def get_record_as_json(server=None, recid=None, doi=None, title=None):
     """Return record content in json by its recid, doi or title.
 
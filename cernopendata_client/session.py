@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client shared HTTP connection pool utilities."""
+
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import pycurl
+
+    pycurl_available = True
+except ImportError:
+    pycurl_available = False
+
+from .config import DOWNLOAD_HTTP_VERSION, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE
+from .printer import display_message
+
+session_lock = threading.Lock()
+session_config = {
+    "pool_connections": HTTP_POOL_CONNECTIONS,
+    "pool_maxsize": HTTP_POOL_MAXSIZE,
+    "http_version": DOWNLOAD_HTTP_VERSION,
+}
+session_cache = {}
+http1_hosts = set()
+
+
+def configure_session(pool_connections=None, pool_maxsize=None, http_version=None):
+    """Configure the connection pool of the shared HTTP session.
+
+    The shared session is recreated with the new pool limits the next time
+    it is requested.
+
+    :param pool_connections: Number of hosts to keep connection pools for
+    :param pool_maxsize: Maximum number of kept-alive connections per host
+    :param http_version: HTTP version of the pycurl transfers, one of 'auto',
+        '2' or '1.1'
+    :type pool_connections: int
+    :type pool_maxsize: int
+    :type http_version: str
+    """
+    with session_lock:
+        if pool_connections:
+            session_config["pool_connections"] = pool_connections
+        if pool_maxsize:
+            session_config["pool_maxsize"] = pool_maxsize
+        if http_version:
+            session_config["http_version"] = http_version
+        session = session_cache.pop("requests", None)
+    if session is not None:
+        session.close()
+
+
+def get_session():
+    """Return the requests session shared by all commands of the process.
+
+    Connections are kept alive and reused, together with their TLS sessions,
+    for every request made to the same host.
+
+    :return: Shared HTTP session
+    :rtype: requests.Session
+    """
+    with session_lock:
+        session = session_cache.get("requests")
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=session_config["pool_connections"],
+                pool_maxsize=session_config["pool_maxsize"],
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session_cache["requests"] = session
+        return session
+
+
+def get_curl_share():
+    """Return the pycurl share handle used by all pycurl transfers.
+
+    The share handle lets independent curl handles reuse DNS lookups, TLS
+    sessions and open connections.
+
+    :return: Shared pycurl handle
+    :rtype: pycurl.CurlShare
+    """
+    with session_lock:
+        share = session_cache.get("pycurl")
+        if share is None:
+            share = pycurl.CurlShare()
+            share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+            share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+            if hasattr(pycurl, "LOCK_DATA_CONNECT"):
+                share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+            session_cache["pycurl"] = share
+        return share
+
+
+def is_curl_http2_available():
+    """Return True if libcurl was built with HTTP/2 support."""
+    return bool(pycurl.version_info()[4] & getattr(pycurl, "VERSION_HTTP2", 0))
+
+
+def get_curl_http_version(file_location):
+    """Return the HTTP version pycurl transfers of a location should request.
+
+    HTTP/2 is negotiated through TLS ALPN for HTTPS locations, so that
+    servers without HTTP/2 support keep being spoken to over HTTP/1.1 with
+    kept-alive connections. HTTP/2 without negotiation (prior knowledge) is
+    only used on cleartext connections when configured, and not any more
+    for servers which refused it.
+
+    :param file_location: Remote location of the file
+    :type file_location: str
+
+    :return: pycurl HTTP version constant
+    :rtype: int
+    """
+    url = urlparse(file_location)
+    with session_lock:
+        http_version = session_config["http_version"]
+        refused = url.netloc in http1_hosts
+    if http_version == "1.1" or refused or not is_curl_http2_available():
+        return pycurl.CURL_HTTP_VERSION_1_1
+    if url.scheme == "https":
+        return pycurl.CURL_HTTP_VERSION_2TLS
+    if http_version == "2":
+        return pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE
+    return pycurl.CURL_HTTP_VERSION_1_1
+
+
+def is_curl_http2(http_version):
+    """Return True if a pycurl HTTP version constant may use HTTP/2."""
+    return http_version in (
+        getattr(pycurl, "CURL_HTTP_VERSION_2TLS", None),
+        getattr(pycurl, "CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE", None),
+    )
+
+
+def check_curl_http2_refused(file_location, http_version, errnum, responded=False):
+    """Fall back to HTTP/1.1 for a server which refused HTTP/2 prior knowledge.
+
+    A server speaking HTTP/1.1 only answers the HTTP/2 connection preface with
+    garbage or by closing the connection, so the transfer fails with an
+    HTTP/2 or connection error before any response is received.
+
+    :param file_location: Remote location of the failed transfer
+    :param http_version: pycurl HTTP version constant of the failed transfer
+    :param errnum: pycurl error code of the failed transfer
+    :param responded: Did the server send a response status?
+    :type file_location: str
+    :type http_version: int
+    :type errnum: int
+    :type responded: bool
+
+    :return: True if the transfer should be retried over HTTP/1.1
+    :rtype: bool
+    """
+    if http_version != getattr(pycurl, "CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE", None):
+        return False
+    if responded or errnum not in (
+        pycurl.E_HTTP2,
+        pycurl.E_SEND_ERROR,
+        pycurl.E_RECV_ERROR,
+    ):
+        return False
+    host = urlparse(file_location).netloc
+    with session_lock:
+        refused = host in http1_hosts
+        http1_hosts.add(host)
+    if not refused:
+        display_message(
+            msg_type="note",
+            msg="Server {} does not speak HTTP/2. Falling back to HTTP/1.1.".format(
+                host
+            ),
+        )
+    return True
+
+
+def get_curl_retry_errors():
+    """Return the pycurl error codes of the transfer failures worth retrying.
+
+    :return: pycurl error codes of connection failures, timeouts and broken
+        transfers
+    :rtype: set
+    """
+    return {
+        getattr(pycurl, name)
+        for name in (
+            "E_COULDNT_CONNECT",
+            "E_PARTIAL_FILE",
+            "E_OPERATION_TIMEDOUT",
+            "E_GOT_NOTHING",
+            "E_SEND_ERROR",
+            "E_RECV_ERROR",
+            "E_HTTP2",
+            "E_HTTP2_STREAM",
+        )
+        if hasattr(pycurl, name)
+    }
@@ -32,3 +32,76 @@ def parse_parameters(filter_input):
             msg="{} - Wrong input format".format(filter_input),
         )
         sys.exit(2)
+
+
+def format_size(size):
+    """Return a human readable size.
+
+    :param size: Size in bytes
+    :type size: int
+
+    :return: Size in the largest binary unit keeping it at least one
+    :rtype: str
+    """
+    units = ["B", "KiB", "MiB", "GiB", "TiB"]
+    unit = 0
+    while size >= 1024 and unit < len(units) - 1:
+        size /= 1024.0
+        unit += 1
+    if unit == 0:
+        return "{} B".format(size)
+    return "{:.1f} {}".format(size, units[unit])
+
+
+def parse_size(size_input, option="--cache-size", quantity="Size", unit="bytes"):
+    """Return a number of bytes.
+
+    :param size_input: Number of bytes, optionally with a K, M, G or T
+        suffix for KiB, MiB, GiB or TiB
+    :param option: Command-line option the size was given with
+    :param quantity: Name of the quantity in the error message
+    :param unit: Unit of the quantity in the error message
+    :type size_input: str
+    :type option: str
+    :type quantity: str
+    :type unit: str
+
+    :return: Number of bytes, None for no limit
+    :rtype: int
+    """
+    if size_input is None:
+        return None
+    multipliers = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    size = str(size_input).strip().upper()
+    try:
+        multiplier = multipliers.get(size[-1:], 1)
+        if size[-1:] in multipliers:
+            size = size[:-1]
+        value = int(float(size) * multiplier)
+        if value < 0:
+            raise ValueError(size_input)
+        return value or None
+    except ValueError:
+        display_message(
+            msg_type="error",
+            msg="Invalid value for {}: {} - {} should be a number of {}, "
+            "optionally followed by K, M, G or T".format(
+                option, size_input, quantity, unit
+            ),
+        )
+        sys.exit(2)
+
+
+def parse_rate(rate_input, option="--limit-rate"):
+    """Return a transfer rate in bytes per second.
+
+    :param rate_input: Rate in bytes per second, optionally with a K, M or G
+        suffix for KiB, MiB or GiB per second
+    :param option: Command-line option the rate was given with
+    :type rate_input: str
+    :type option: str
+
+    :return: Rate in bytes per second, None for no limit
+    :rtype: int
+    """
+    return parse_size(rate_input, option, "Rate", "bytes per second")
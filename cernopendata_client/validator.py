@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # This file is part of cernopendata-client.
 #
-# Copyright (C) 2020, 2025 CERN.
+# Copyright (C) 2020, 2025, 2026 CERN.
 #
 # cernopendata-client is free software; you can redistribute it and/or modify
 # it under the terms of the GPLv3 license; see LICENSE file for more details.
@@ -9,6 +9,8 @@
 """cernopendata-client input validation methods."""
 
 import click
+import os
+import stat
 import sys
 
 from .printer import display_message
@@ -109,6 +111,36 @@ def validate_range(range=None, count=None):
     return True
 
 
+def validate_shard(shard=None):
+    """Return True if shard is valid, exit otherwise.
+
+    :param shard: Shard of the files, as index and count of shards (i/N)
+    :type shard: str
+
+    :return: Bool after verifying shard
+    :rtype: bool
+    """
+    try:
+        shard_index, shard_count = [int(value) for value in shard.split("/")]
+    except Exception:
+        display_message(
+            msg_type="error",
+            msg="Invalid value for {}: {} - Shard should have index and count of shards(i/N)".format(
+                "--shard", shard
+            ),
+        )
+        sys.exit(2)
+    if shard_index <= 0 or shard_index > shard_count:
+        display_message(
+            msg_type="error",
+            msg="Invalid value for {}: {} - Shard index should be between 1 and {}".format(
+                "--shard", shard, shard_count
+            ),
+        )
+        sys.exit(2)
+    return True
+
+
 def validate_directory(directory=None):
     """Return True if directory path is correct, exit otherwise.
 
@@ -183,3 +215,80 @@ def validate_retry_sleep(retry_sleep=None):
         )
         sys.exit(2)
     return True
+
+
+def validate_jobs(jobs=None):
+    """Return True if number of download jobs is valid, exit otherwise.
+
+    :param jobs: Number of files downloaded concurrently.
+
+    :return: Bool after verifying jobs
+    :rtype: bool
+    """
+    if jobs is None or jobs <= 0:
+        display_message(
+            msg_type="error",
+            msg="Invalid value for {}: {} - Number of jobs should be a positive integer".format(
+                "--jobs", jobs
+            ),
+        )
+        sys.exit(2)
+    return True
+
+
+def validate_segments(segments=None):
+    """Return True if number of download segments is valid, exit otherwise.
+
+    :param segments: Number of byte ranges a file is downloaded in.
+
+    :return: Bool after verifying segments
+    :rtype: bool
+    """
+    if segments is None or segments <= 0:
+        display_message(
+            msg_type="error",
+            msg="Invalid value for {}: {} - Number of segments should be a positive integer".format(
+                "--segments", segments
+            ),
+        )
+        sys.exit(2)
+    return True
+
+
+def validate_output(output=None, protocol=None):
+    """Return True if the output to stream files to is valid, exit otherwise.
+
+    :param output: '-' for the standard output, path of a named pipe, or None
+        for saving the files
+    :param protocol: Protocol to be used for downloading files
+    :type output: str
+    :type protocol: str
+
+    :return: Bool after verifying output
+    :rtype: bool
+    """
+    if output is None:
+        return True
+    if protocol == "xrootd":
+        display_message(
+            msg_type="error",
+            msg="Invalid value for {}: {} - Files can be streamed over HTTP protocol only".format(
+                "--output", output
+            ),
+        )
+        sys.exit(2)
+    if output == "-":
+        return True
+    try:
+        is_pipe = stat.S_ISFIFO(os.stat(output).st_mode)
+    except OSError:
+        is_pipe = False
+    if not is_pipe:
+        display_message(
+            msg_type="error",
+            msg="Invalid value for {}: {} - Output should be - or a named pipe".format(
+                "--output", output
+            ),
+        )
+        sys.exit(2)
+    return True
@@ -14,6 +14,11 @@ import sys
 import click
 import zlib
 
+from .config import (
+    DOWNLOAD_PART_SUFFIX,
+    DOWNLOAD_SEGMENTS_SUFFIX,
+    VERIFIER_CHUNK_SIZE,
+)
 from .printer import display_message
 
 
@@ -38,8 +43,73 @@ def get_file_checksum(afile):
     :return: Adler32 checksum of file
     :rtype: str
     """
+    return format_adler32_checksum(get_file_adler32(afile))
+
+
+def get_file_adler32(afile):
+    """Return the ADLER32 value of a file, reading it in chunks.
+
+    :param afile: file name
+    :type afile: str
+
+    :return: Adler32 value of file
+    :rtype: int
+    """
+    value = 1
     with open(afile, "rb") as f:
-        return "adler32:{:08x}".format(zlib.adler32(f.read(), 1) & 0xFFFFFFFF)
+        for data in iter(lambda: f.read(VERIFIER_CHUNK_SIZE), b""):
+            value = zlib.adler32(data, value)
+    return value & 0xFFFFFFFF
+
+
+def format_adler32_checksum(value):
+    """Return the ADLER32 checksum string of an ADLER32 value.
+
+    :param value: Adler32 value
+    :type value: int
+
+    :return: Adler32 checksum in the format used by the server
+    :rtype: str
+    """
+    return "adler32:{:08x}".format(value & 0xFFFFFFFF)
+
+
+def combine_adler32(adler1, adler2, size2):
+    """Return the ADLER32 value of two concatenated blocks of data.
+
+    Port of zlib's adler32_combine(), which is not exposed by Python.
+
+    :param adler1: Adler32 value of the first block
+    :param adler2: Adler32 value of the second block
+    :param size2: Size of the second block in bytes
+    :type adler1: int
+    :type adler2: int
+    :type size2: int
+
+    :return: Adler32 value of the concatenated blocks
+    :rtype: int
+    """
+    base = 65521
+    rem = size2 % base
+    sum1 = ((adler1 & 0xFFFF) + (adler2 & 0xFFFF) - 1) % base
+    sum2 = (rem * (adler1 & 0xFFFF) + (adler1 >> 16) + (adler2 >> 16) - rem) % base
+    return sum1 | (sum2 << 16)
+
+
+def get_file_info(afile):
+    """Return the local file information of a file.
+
+    :param afile: file name
+    :type afile: str
+
+    :return: Dictionary containing (checksum, name, size) of the file
+    :rtype: dict
+    """
+    return {
+        "name": os.path.basename(afile),
+        "size": get_file_size(afile),
+        "checksum": get_file_checksum(afile),
+    }
 
 
 def get_file_info_local(recid):
@@ -59,13 +129,10 @@ def get_file_info_local(recid):
         return file_info_local
 
     for afile in os.listdir(adir):
-        file_info_local.append(
-            {
-                "name": afile,
-                "size": get_file_size(adir + os.path.sep + afile),
-                "checksum": get_file_checksum(adir + os.path.sep + afile),
-            }
-        )
+        # skip the files of unfinished downloads
+        if afile.endswith((DOWNLOAD_PART_SUFFIX, DOWNLOAD_SEGMENTS_SUFFIX)):
+            continue
+        file_info_local.append(get_file_info(adir + os.path.sep + afile))
 
     return file_info_local
 
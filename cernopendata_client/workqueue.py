@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download work queue shared by several processes."""
+
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+
+from .config import DOWNLOAD_QUEUE_LEASE_TIME, DOWNLOAD_QUEUE_SUFFIX
+from .downloader import download_files_in_parallel
+from .printer import display_message
+
+
+def get_queue_path(base_path):
+    """Return the path of the work queue stored next to a record directory.
+
+    :param base_path: Download directory of the record
+    :type base_path: str
+
+    :return: Path of the work queue directory
+    :rtype: str
+    """
+    return os.path.normpath(str(base_path)) + DOWNLOAD_QUEUE_SUFFIX
+
+
+class WorkQueue:
+    """Work queue coordinating the processes downloading the same record.
+
+    The queue is a directory on the file system shared by the processes,
+    possibly on different nodes. A process claims a file by creating its
+    lease file exclusively, which is atomic on network file systems too, and
+    marks it done once downloaded. Leases are renewed in the background while
+    the files are downloaded, and the lease of a process which stopped
+    renewing it for DOWNLOAD_QUEUE_LEASE_TIME seconds is reclaimed by the
+    others. The age of the leases is measured with the clock of the file
+    server, from the modification time of a heartbeat file of every process,
+    so that the clocks of the nodes do not need to agree.
+    """
+
+    def __init__(self, path, lease_time=None):
+        """Initialise class instance.
+
+        :param path: Directory of the work queue
+        :param lease_time: Time in seconds after which a lease which was not
+            renewed is abandoned
+        :type path: str
+        :type lease_time: float
+        """
+        self.path = path
+        self.lease_time = lease_time or DOWNLOAD_QUEUE_LEASE_TIME
+        self.worker = "{}-{}-{}".format(
+            socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8]
+        )
+        for directory in ("leases", "done", "workers"):
+            os.makedirs(os.path.join(path, directory), exist_ok=True)
+        self.heartbeat_path = os.path.join(path, "workers", self.worker)
+        self.leases = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.renewer = threading.Thread(target=self.renew_leases, daemon=True)
+        self.renewer.start()
+
+    def get_time(self):
+        """Return the current time of the file server."""
+        with open(self.heartbeat_path, "a"):
+            pass
+        os.utime(self.heartbeat_path)
+        return os.stat(self.heartbeat_path).st_mtime
+
+    def get_key(self, file_location):
+        """Return the key of a file in the queue."""
+        return hashlib.sha1(file_location.encode()).hexdigest()
+
+    def get_lease_path(self, file_location):
+        """Return the path of the lease file of a file."""
+        return os.path.join(self.path, "leases", self.get_key(file_location))
+
+    def get_done_path(self, file_location):
+        """Return the path of the marker of a downloaded file."""
+        return os.path.join(self.path, "done", self.get_key(file_location))
+
+    def is_done(self, file_location):
+        """Return True if a file was downloaded by any process."""
+        return os.path.exists(self.get_done_path(file_location))
+
+    def claim(self, file_location):
+        """Claim a file to download, reclaiming an abandoned lease of it.
+
+        :param file_location: Remote location of the file
+        :type file_location: str
+
+        :return: True if the file was claimed by this process, False if it is
+            downloaded or being downloaded by another process
+        :rtype: bool
+        """
+        if self.is_done(file_location):
+            return False
+        lease_path = self.get_lease_path(file_location)
+        for _attempt in range(2):
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self.reclaim(lease_path, file_location):
+                    return False
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(self.worker)
+            if self.is_done(file_location):
+                # finished by the previous owner of the lease meanwhile
+                os.remove(lease_path)
+                return False
+            with self.lock:
+                self.leases[file_location] = lease_path
+            return True
+        return False
+
+    def reclaim(self, lease_path, file_location):
+        """Remove the lease of a file if it was abandoned by its process.
+
+        The lease is first renamed to a name of this process, so that only
+        one of the processes reclaiming it at the same time succeeds.
+
+        :return: True if the lease does not exist any more
+        :rtype: bool
+        """
+        try:
+            if self.get_time() - os.stat(lease_path).st_mtime < self.lease_time:
+                return False
+        except FileNotFoundError:
+            return True
+        stale_path = "{}.{}".format(lease_path, self.worker)
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return True
+        if self.get_time() - os.stat(stale_path).st_mtime < self.lease_time:
+            # renewed meanwhile, give it back
+            try:
+                os.link(stale_path, lease_path)
+            except OSError:
+                pass
+            os.remove(stale_path)
+            return False
+        os.remove(stale_path)
+        display_message(
+            msg_type="note",
+            msg="Reclaiming abandoned file {}.".format(file_location.split("/")[-1]),
+        )
+        return True
+
+    def renew_leases(self):
+        """Renew the leases of the claimed files until the queue is closed."""
+        while not self.stopped.wait(self.lease_time / 3):
+            self.get_time()
+            with self.lock:
+                leases = list(self.leases.items())
+            for file_location, lease_path in leases:
+                try:
+                    with open(lease_path) as f:
+                        owned = f.read() == self.worker
+                    if owned:
+                        os.utime(lease_path)
+                except OSError:
+                    owned = False
+                if not owned:
+                    with self.lock:
+                        self.leases.pop(file_location, None)
+                    display_message(
+                        msg_type="note",
+                        msg="Lost the claim of file {} to another process.".format(
+                            file_location.split("/")[-1]
+                        ),
+                    )
+
+    def complete(self, file_location):
+        """Mark a claimed file as downloaded and drop its lease."""
+        with open(self.get_done_path(file_location), "w") as f:
+            f.write(self.worker)
+        self.release(file_location)
+
+    def release(self, file_location):
+        """Drop the lease of a claimed file, so that other processes can claim it."""
+        with self.lock:
+            lease_path = self.leases.pop(file_location, None)
+        if lease_path is None:
+            return
+        try:
+            with open(lease_path) as f:
+                # not reclaimed by another process meanwhile
+                if f.read() == self.worker:
+                    os.remove(lease_path)
+        except OSError:
+            pass
+
+    def close(self):
+        """Stop renewing leases, releasing the claimed files."""
+        self.stopped.set()
+        self.renewer.join()
+        with self.lock:
+            file_locations = list(self.leases)
+        for file_location in file_locations:
+            self.release(file_location)
+        try:
+            os.remove(self.heartbeat_path)
+        except OSError:
+            pass
+
+
+def download_files_with_queue(
+    download_file, file_locations, jobs=1, order=None, queue=None
+):
+    """Download the files not claimed by other processes until all are done.
+
+    Every file is claimed from the work queue before it is downloaded. Files
+    claimed by other processes are skipped and checked again after a while,
+    so that their leases are reclaimed if their processes went away, until
+    every file is downloaded by any process or failed in this one.
+
+    :param download_file: Callable downloading one file, called with the
+        file index (starting from 0) and the remote file location, returning
+        False if the file failed to download
+    :param file_locations: List of remote file locations
+    :param jobs: Maximum number of concurrent downloads
+    :param order: Indexes of the file locations in transfer order
+    :param queue: Work queue shared with the other processes, closed when
+        done, or None to download all files
+    :type download_file: callable
+    :type file_locations: list
+    :type jobs: int
+    :type order: list
+    :type queue: WorkQueue
+
+    :return: List of file locations that failed to download, in input order
+    :rtype: list
+    """
+    if queue is None:
+        return download_files_in_parallel(download_file, file_locations, jobs, order)
+    if order is None:
+        order = range(len(file_locations))
+    failed = set()
+
+    def queued_download_file(index, file_location):
+        if not queue.claim(file_location):
+            return
+        try:
+            downloaded = download_file(index, file_location)
+        except BaseException:
+            queue.release(file_location)
+            raise
+        if downloaded is False:
+            # leave the failed file to the other processes
+            queue.release(file_location)
+            failed.add(file_location)
+            return
+        queue.complete(file_location)
+
+    def get_remaining():
+        return [
+            index
+            for index in order
+            if file_locations[index] not in failed
+            and not queue.is_done(file_locations[index])
+        ]
+
+    try:
+        remaining = get_remaining()
+        while remaining:
+            failed.update(
+                download_files_in_parallel(
+                    queued_download_file, file_locations, jobs, remaining
+                )
+            )
+            remaining = get_remaining()
+            if remaining:
+                display_message(
+                    msg_type="note",
+                    msg="Waiting for {} files downloaded by other processes.".format(
+                        len(remaining)
+                    ),
+                )
+                time.sleep(queue.lease_time / 3)
+    finally:
+        queue.close()
+    return [
+        file_location
+        for file_location in file_locations
+        if file_location in failed and not queue.is_done(file_location)
+    ]
@@ -2,19 +2,36 @@
 #
 # This file is part of cernopendata-client.
 #
-# Copyright (C) 2025 CERN.
+# Copyright (C) 2025, 2026 CERN.
 #
 # cernopendata-client is free software; you can redistribute it and/or modify
 # it under the terms of the GPLv3 license; see LICENSE file for more details.
 
 """Pytest configuration and shared fixtures."""
 
+import json
 import os
 import shutil
+import threading
+import time
+import zlib
+
+from urllib.parse import parse_qs, urlparse
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 from click.testing import CliRunner
 
+from cernopendata_client.config import (
+    DOWNLOAD_RETRY_LIMIT,
+    DOWNLOAD_RETRY_SLEEP,
+    RETRY_BREAKER_PAUSE,
+    RETRY_BREAKER_THRESHOLD,
+)
+from cernopendata_client.journal import get_journal_path
+from cernopendata_client.retry import configure_retry
+
 
 @pytest.fixture(autouse=True)
 def cleanup_download_directories():
@@ -26,6 +43,7 @@ def cleanup_download_directories():
     for test_dir in test_dirs:
         if os.path.isdir(test_dir):
             shutil.rmtree(test_dir)
+        remove_download_journal(test_dir)
 
     yield
 
@@ -33,9 +51,184 @@ def cleanup_download_directories():
     for test_dir in test_dirs:
         if os.path.isdir(test_dir):
             shutil.rmtree(test_dir)
+        remove_download_journal(test_dir)
+
+
+def remove_download_journal(test_dir):
+    """Remove the download journal stored next to a test download directory."""
+    for suffix in ("", "-wal", "-shm"):
+        journal_file = get_journal_path(test_dir) + suffix
+        if os.path.isfile(journal_file):
+            os.remove(journal_file)
+
+
+@pytest.fixture(autouse=True)
+def isolate_throughput_history(tmp_path, monkeypatch):
+    """Keep the download throughput history of the tests in a temporary directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+@pytest.fixture(autouse=True)
+def reset_retry_policy():
+    """Restore the default retry policy changed by a test."""
+    yield
+    configure_retry(
+        limit=DOWNLOAD_RETRY_LIMIT,
+        sleep=DOWNLOAD_RETRY_SLEEP,
+        breaker_threshold=RETRY_BREAKER_THRESHOLD,
+        breaker_pause=RETRY_BREAKER_PAUSE,
+    )
 
 
 @pytest.fixture
 def cli_runner():
     """Provide a Click CLI test runner."""
     return CliRunner()
+
+
+ERROR_PAGE = b"<!DOCTYPE html>\n<html><body>Something went wrong.</body></html>\n"
+
+
+class OpenDataRequestHandler(BaseHTTPRequestHandler):
+    """Serve record metadata and files like the CERN Open Data portal."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Keep the test output quiet."""
+
+    def do_HEAD(self):
+        """Serve HEAD requests."""
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        """Serve GET requests with optional byte ranges."""
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        self.server.connections.add(self.client_address)
+        path = self.path.split("?")[0]
+        if self.command == "GET" and self.server.unavailable.get(path):
+            self.server.unavailable[path] -= 1
+            return self._send(503, b"", "text/plain", send_body, {"Retry-After": "7"})
+        if path.startswith("/record/") and path.split("/")[-1] in self.server.records:
+            return self._send(200, b"", "text/html", send_body)
+        if path == "/api/records":
+            return self._send_search(send_body)
+        if path.startswith("/api/records/"):
+            recid = path.split("/")[-1]
+            if recid in self.server.records:
+                body = json.dumps(self.server.records[recid]).encode()
+                return self._send(200, body, "application/json", send_body)
+        if self.command == "GET" and self.server.error_pages.get(path):
+            self.server.error_pages[path] -= 1
+            return self._send(200, ERROR_PAGE, "text/html", send_body)
+        if self.command == "GET" and self.server.truncated.get(path):
+            self.server.truncated[path] -= 1
+            return self._send_truncated(self.server.files[path])
+        if path in self.server.files:
+            time.sleep(self.server.delays.get(path, 0))
+            return self._send_file(self.server.files[path], send_body)
+        return self._send(404, b"Not found", "text/plain", send_body)
+
+    def _send_search(self, send_body):
+        params = parse_qs(urlparse(self.path).query)
+        recids = self.server.searches.get(params["q"][0], [])
+        page, size = int(params["page"][0]), int(params["size"][0])
+        hits = [
+            {"id": int(recid), "metadata": self.server.records[str(recid)]["metadata"]}
+            for recid in recids[(page - 1) * size : page * size]
+        ]
+        body = json.dumps({"hits": {"total": len(recids), "hits": hits}}).encode()
+        return self._send(200, body, "application/json", send_body)
+
+    def _send_file(self, content, send_body):
+        byte_range = self.headers.get("Range")
+        if not byte_range or not self.server.accept_ranges:
+            return self._send(200, content, "application/octet-stream", send_body)
+        start, end = byte_range.split("=")[1].split("-")
+        start = int(start)
+        end = int(end) if end else len(content) - 1
+        self.send_response(206)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header(
+            "Content-Range", "bytes {}-{}/{}".format(start, end, len(content))
+        )
+        self.end_headers()
+        if send_body:
+            self.wfile.write(content[start : end + 1])
+
+    def _send_truncated(self, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content[: len(content) // 2])
+        self.close_connection = True
+
+    def _send(self, status, body, content_type, send_body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+class OpenDataServer(ThreadingHTTPServer):
+    """Local stand-in for the CERN Open Data portal."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        """Bind the server to a free local port."""
+        super().__init__(("127.0.0.1", 0), OpenDataRequestHandler)
+        self.url = "http://127.0.0.1:{}".format(self.server_address[1])
+        self.records = {}
+        self.searches = {}
+        self.files = {}
+        self.requests = []
+        self.connections = set()
+        self.accept_ranges = True
+        self.error_pages = {}
+        self.delays = {}
+        self.truncated = {}
+        self.unavailable = {}
+
+    def handle_error(self, request, client_address):
+        """Ignore clients closing connections before reading the response."""
+
+    def add_record(self, recid, files):
+        """Publish a record with the given file names and contents."""
+        files_metadata = []
+        for name, content in files.items():
+            path = "/eos/opendata/test/{}/{}".format(recid, name)
+            self.files[path] = content
+            files_metadata.append(
+                {
+                    "uri": "root://eospublic.cern.ch/" + path,
+                    "size": len(content),
+                    "checksum": "adler32:{:08x}".format(
+                        zlib.adler32(content, 1) & 0xFFFFFFFF
+                    ),
+                }
+            )
+        self.records[str(recid)] = {
+            "metadata": {"recid": str(recid), "files": files_metadata}
+        }
+        return ["{}{}".format(self.url, file_["uri"][25:]) for file_ in files_metadata]
+
+
+@pytest.fixture
+def opendata_server(tmp_path, monkeypatch):
+    """Run a local Open Data server and download into a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    server = OpenDataServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
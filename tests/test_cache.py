@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download cache tests."""
+
+import os
+import zlib
+
+import pytest
+
+from cernopendata_client.cache import DownloadCache, copy_file
+
+
+def write_file(path, content):
+    """Write a file and return its ADLER32 checksum in the server format."""
+    with open(path, "wb") as f:
+        f.write(content)
+    return "adler32:{:08x}".format(zlib.adler32(content, 1) & 0xFFFFFFFF)
+
+
+@pytest.mark.local
+def test_copy_file(tmp_path, mocker):
+    """Test materialising files by reflink, hardlink and copy."""
+    src = str(tmp_path / "src")
+    write_file(src, b"content")
+    ioctl = mocker.patch("cernopendata_client.cache.fcntl.ioctl")
+    assert copy_file(src, str(tmp_path / "link")) == "reflink"
+    assert ioctl.call_count == 1
+    ioctl.side_effect = OSError
+    assert copy_file(src, str(tmp_path / "link")) == "hardlink"
+    assert os.stat(src).st_ino == os.stat(str(tmp_path / "link")).st_ino
+    mocker.patch("os.link", side_effect=OSError)
+    assert copy_file(src, str(tmp_path / "link")) in ("copy_file_range", "copy")
+    assert os.stat(src).st_ino != os.stat(str(tmp_path / "link")).st_ino
+    with open(str(tmp_path / "link"), "rb") as f:
+        assert f.read() == b"content"
+
+
+@pytest.mark.local
+def test_download_cache(tmp_path, mocker):
+    """Test storing, fetching and evicting cached files."""
+    mocker.patch("cernopendata_client.cache.fcntl.ioctl", side_effect=OSError)
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=10)
+    file_a = str(tmp_path / "a")
+    file_b = str(tmp_path / "b")
+    checksum_a = write_file(file_a, b"aaaa")
+    checksum_b = write_file(file_b, b"bbbbbb")
+    assert cache.get_object_path(None, 4) is None
+    assert cache.get_object_path("md5:abc", 4) is None
+    assert cache.fetch(checksum_a, 4, str(tmp_path / "a2")) is None
+    cache.store(file_a, checksum_a, 4)
+    cache.store(file_b, checksum_b, 6)
+    assert cache.fetch(checksum_a, 4, str(tmp_path / "a2")) == "hardlink"
+    with open(str(tmp_path / "a2"), "rb") as f:
+        assert f.read() == b"aaaa"
+    # cached files are read-only, so that hardlinks cannot change them
+    assert not os.stat(cache.get_object_path(checksum_a, 4)).st_mode & 0o222
+    assert not os.stat(str(tmp_path / "a2")).st_mode & 0o222
+    # the size must match as well as the checksum
+    assert cache.fetch(checksum_a, 5, str(tmp_path / "a3")) is None
+    # a cached file changed in place is not used and is stored again
+    object_b = cache.get_object_path(checksum_b, 6)
+    os.chmod(object_b, 0o644)
+    assert cache.fetch(checksum_b, 6, str(tmp_path / "b2")) is None
+    cache.store(file_b, checksum_b, 6)
+    assert cache.fetch(checksum_b, 6, str(tmp_path / "b2")) == "hardlink"
+
+    # the least recently used file is evicted when going over the limit
+    os.utime(cache.get_object_path(checksum_b, 6), (1, 1))
+    file_c = str(tmp_path / "c")
+    checksum_c = write_file(file_c, b"cc")
+    cache.store(file_c, checksum_c, 2)
+    assert not os.path.exists(cache.get_object_path(checksum_b, 6))
+    assert os.path.exists(cache.get_object_path(checksum_a, 4))
+    assert os.path.exists(cache.get_object_path(checksum_c, 2))
+    # files larger than the cache are not stored
+    file_d = str(tmp_path / "d")
+    checksum_d = write_file(file_d, b"d" * 11)
+    cache.store(file_d, checksum_d, 11)
+    assert not os.path.exists(cache.get_object_path(checksum_d, 11))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client segment checkpoint tests."""
+
+import os
+import zlib
+
+import pytest
+
+from cernopendata_client.checkpoint import (
+    SegmentCheckpoint,
+    get_checkpoint_path,
+    get_checkpoint_segments,
+    remove_checkpoint,
+)
+
+
+@pytest.mark.local
+def test_segment_checkpoint(tmp_path, mocker):
+    """Test that the segment checkpoint persists the durable progress of segments."""
+    mocker.patch("cernopendata_client.checkpoint.DOWNLOAD_CHECKPOINT_SIZE", 100)
+    part_path = str(tmp_path / "file.root.part")
+    assert get_checkpoint_path(part_path) == part_path + ".segments"
+    file_segments = [(0, 249), (250, 499)]
+    content = os.urandom(500)
+    with open(part_path, "wb") as f:
+        f.truncate(500)
+    checkpoint = SegmentCheckpoint(part_path, 500, file_segments)
+    assert not checkpoint.resumed
+    checkpoint.save()
+    with open(part_path, "r+b") as f:
+        f.seek(250)
+        f.write(content[250:300])
+        # not checkpointed before enough of the segment is written
+        checkpoint.update(250, 300, zlib.adler32(content[250:300]), f)
+        f.write(content[300:400])
+        checkpoint.update(250, 400, zlib.adler32(content[250:400]), f)
+        f.write(content[400:450])
+    assert get_checkpoint_segments(part_path, 500) == file_segments
+    assert get_checkpoint_segments(part_path, 600) == []
+
+    checkpoint = SegmentCheckpoint(part_path, 500, file_segments)
+    assert checkpoint.resumed
+    assert checkpoint.get_written() == 150
+    assert checkpoint.get_progress(0) == (0, 1)
+    assert checkpoint.get_progress(250) == (400, zlib.adler32(content[250:400]))
+    with open(part_path, "r+b") as f:
+        f.seek(400)
+        f.write(content[400:500])
+        # the end of a segment is always checkpointed
+        checkpoint.update(250, 500, zlib.adler32(content[250:500]), f)
+    checkpoint = SegmentCheckpoint(part_path, 500, file_segments)
+    assert checkpoint.get_progress(250) == (500, zlib.adler32(content[250:500]))
+
+    # a checkpoint of other segments is not resumed
+    assert not SegmentCheckpoint(part_path, 500, [(0, 499)]).resumed
+    remove_checkpoint(part_path)
+    remove_checkpoint(part_path)
+    assert not SegmentCheckpoint(part_path, 500, file_segments).resumed
@@ -9,12 +9,21 @@
 
 """cernopendata-client cli command download-files test."""
 
+import json
 import os
+import threading
+import time
+import zlib
 
 import pytest
 
+import cernopendata_client.downloader
 from cernopendata_client.cli import download_files
 from cernopendata_client.config import SERVER_HTTPS_URI
+from cernopendata_client.history import ThroughputHistory
+from cernopendata_client.journal import DownloadJournal, get_journal_path
+from cernopendata_client.ratelimit import configure_rate_limit
+from cernopendata_client.workqueue import WorkQueue
 
 
 def test_dry_run_from_recid(cli_runner):
@@ -357,3 +366,1122 @@ def test_download_files_filter_multiple_range_single_regexp(cli_runner):
     for file_location in test_files:
         assert os.path.isfile(file_location), "{} not downloaded".format(file_location)
     assert test_result_range.output.endswith("\n==> Success!\n")
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+def test_download_files_jobs(cli_runner, opendata_server, download_engine):
+    """Test download_files() command with --jobs against a local server."""
+    if download_engine.startswith("pycurl"):
+        pytest.importorskip("pycurl")
+    files = {"file{}.txt".format(i): os.urandom(1000 * i) for i in range(1, 9)}
+    opendata_server.add_record(1, files)
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--jobs",
+            4,
+            "--download-engine",
+            download_engine,
+        ],
+    )
+    assert test_result.exit_code == 0
+    for name, content in files.items():
+        with open(os.path.join("1", name), "rb") as f:
+            assert f.read() == content
+    assert test_result.output.endswith("\n==> Success!\n")
+
+
+@pytest.mark.local
+def test_download_files_jobs_wrong(cli_runner):
+    """Test download_files() command with wrong --jobs value."""
+    test_result = cli_runner.invoke(download_files, ["--recid", 1, "--jobs", 0])
+    assert test_result.exit_code == 2
+    assert "Invalid value for --jobs" in test_result.output
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl"])
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_download_files_segments(
+    cli_runner, opendata_server, mocker, download_engine, accept_ranges
+):
+    """Test download_files() command with --segments against a local server."""
+    if download_engine == "pycurl":
+        pytest.importorskip("pycurl")
+    mocker.patch("cernopendata_client.downloader.DOWNLOAD_SEGMENT_MIN_SIZE", 1000)
+    opendata_server.accept_ranges = accept_ranges
+    content = os.urandom(10000)
+    opendata_server.add_record(1, {"big.root": content})
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--segments",
+            4,
+            "--download-engine",
+            download_engine,
+        ],
+    )
+    assert test_result.exit_code == 0
+    with open("1/big.root", "rb") as f:
+        assert f.read() == content
+    ranges = [
+        headers.get("Range")
+        for method, path, headers in opendata_server.requests
+        if method == "GET" and path.endswith("big.root")
+    ]
+    if accept_ranges:
+        assert sorted(ranges) == [
+            "bytes=0-2499",
+            "bytes=2500-4999",
+            "bytes=5000-7499",
+            "bytes=7500-9999",
+        ]
+        assert "(4 segments)" in test_result.output
+    else:
+        assert "Server does not support byte ranges" in test_result.output
+    assert test_result.output.endswith("\n==> Success!\n")
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl"])
+@pytest.mark.parametrize("segments", [1, 4])
+def test_download_files_verify_streamed_checksum(
+    cli_runner, opendata_server, mocker, download_engine, segments
+):
+    """Test that --verify uses the checksum computed while downloading."""
+    if download_engine == "pycurl":
+        pytest.importorskip("pycurl")
+    mocker.patch("cernopendata_client.downloader.DOWNLOAD_SEGMENT_MIN_SIZE", 1000)
+    get_file_info = mocker.spy(cernopendata_client.downloader, "get_file_info")
+    opendata_server.add_record(1, {"big.root": os.urandom(10000)})
+    args = ["--recid", 1, "--server", opendata_server.url, "--verify"]
+    args += ["--segments", segments, "--download-engine", download_engine]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert "Verifying file big.root" in test_result.output
+    assert test_result.output.endswith("\n==> Success!\n")
+    assert get_file_info.call_count == 0
+
+    # the server now serves different content than the metadata describes
+    opendata_server.files["/eos/opendata/test/1/big.root"] = os.urandom(10000)
+    test_result = cli_runner.invoke(download_files, args + ["--no-incremental"])
+    assert test_result.exit_code == 1
+    assert "File checksum does not match." in test_result.output
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl"])
+def test_download_files_reuse_connections(cli_runner, opendata_server, download_engine):
+    """Test that metadata and file requests reuse kept-alive connections."""
+    if download_engine == "pycurl":
+        pytest.importorskip("pycurl")
+    files = {"file{}.txt".format(i): os.urandom(100) for i in range(10)}
+    opendata_server.add_record(1, files)
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--download-engine",
+            download_engine,
+        ],
+    )
+    assert test_result.exit_code == 0
+    # record metadata, then one GET and no HEAD request per file
+    assert len(opendata_server.requests) == 12
+    assert len(opendata_server.connections) <= 2
+
+
+@pytest.mark.local
+def test_download_files_pycurl_multi_failure(cli_runner, opendata_server, mocker):
+    """Test that pycurl-multi reports files failing to download in order."""
+    pytest.importorskip("pycurl")
+    mocker.patch("cernopendata_client.downloader.get_retry_delay", return_value=0)
+    files = {"file{}.txt".format(i): os.urandom(100) for i in range(1, 5)}
+    file_locations = opendata_server.add_record(1, files)
+    # the server drops the connection when serving the third file
+    opendata_server.files["/eos/opendata/test/1/file3.txt"] = None
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--jobs",
+            2,
+            "--download-engine",
+            "pycurl-multi",
+            "--retry-limit",
+            2,
+        ],
+    )
+    assert test_result.exit_code == 1
+    assert "file3.txt: Download error occured" in test_result.output
+    assert "Retrying 2/2" in test_result.output
+    assert (
+        "Download of 1 of 4 files failed:\n  3 {}".format(file_locations[2])
+        in test_result.output
+    )
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["pycurl", "pycurl-multi"])
+def test_download_files_http2_fallback(cli_runner, opendata_server, download_engine):
+    """Test falling back to HTTP/1.1 keep-alive for servers refusing HTTP/2."""
+    pytest.importorskip("pycurl")
+    files = {"file{}.txt".format(i): os.urandom(100) for i in range(1, 5)}
+    opendata_server.add_record(1, files)
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--jobs",
+            2,
+            "--download-engine",
+            download_engine,
+            "--http-version",
+            "2",
+        ],
+    )
+    assert test_result.exit_code == 0
+    assert test_result.output.count("Falling back to HTTP/1.1") == 1
+    for name, content in files.items():
+        with open(os.path.join("1", name), "rb") as f:
+            assert f.read() == content
+    # record metadata, then one GET request per file
+    assert len(opendata_server.requests) == 6
+    assert len(opendata_server.connections) <= 3
+
+
+class FakeXRootDStatus(object):
+    """Stand-in for the XRootD status of an operation."""
+
+    def __init__(self, ok=True, message=""):
+        self.ok = ok
+        self.message = message
+
+
+class FakeCopyProcess(object):
+    """Stand-in for the XRootD copy process copying files of the stand-in server."""
+
+    files = {}
+    instances = []
+
+    def __init__(self):
+        self.jobs = []
+        self.parallel_jobs = None
+        FakeCopyProcess.instances.append(self)
+
+    def add_job(self, source, target, **kwargs):
+        self.jobs.append((source, target, kwargs))
+
+    def parallel(self, jobs):
+        self.parallel_jobs = jobs
+
+    def prepare(self):
+        return FakeXRootDStatus()
+
+    def run(self, handler=None):
+        results = []
+        for job_id, (source, target, _kwargs) in enumerate(self.jobs, 1):
+            content = self.files.get(source.split("eospublic.cern.ch/")[-1])
+            handler.begin(job_id, len(self.jobs), source, target)
+            if content is None:
+                status = FakeXRootDStatus(
+                    False, "[ERROR] Server responded with an error"
+                )
+            else:
+                with open(target, "wb") as f:
+                    f.write(content)
+                handler.update(job_id, len(content), len(content))
+                status = FakeXRootDStatus()
+            handler.end(job_id, {"status": status})
+            assert not handler.should_cancel(job_id)
+            results.append({"status": status})
+        return FakeXRootDStatus(), results
+
+
+@pytest.mark.local
+def test_download_files_xrootd_batch(cli_runner, opendata_server, mocker):
+    """Test that XRootD downloads all files in one batch and reports failures."""
+    files = {"file{}.txt".format(i): os.urandom(100) for i in range(1, 5)}
+    file_locations = opendata_server.add_record(1, files)
+    FakeCopyProcess.files = dict(opendata_server.files)
+    FakeCopyProcess.files["/eos/opendata/test/1/file3.txt"] = None
+    FakeCopyProcess.instances = []
+    xrootdclient = mocker.patch(
+        "cernopendata_client.downloader.xrootdclient", create=True
+    )
+    xrootdclient.CopyProcess = FakeCopyProcess
+    mocker.patch("cernopendata_client.downloader.xrootd_available", True)
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--protocol",
+            "xrootd",
+            "--jobs",
+            3,
+            "--segments",
+            4,
+        ],
+    )
+    assert test_result.exit_code == 1
+    assert len(FakeCopyProcess.instances) == 1
+    assert FakeCopyProcess.instances[0].parallel_jobs == 3
+    assert len(FakeCopyProcess.instances[0].jobs) == 4
+    xrootdclient.EnvPutInt.assert_called_once_with("SubStreamsPerChannel", 4)
+    assert "Server responded with an error" in test_result.output
+    assert (
+        "Download of 1 of 4 files failed:\n  3 {}".format(
+            file_locations[2].replace(opendata_server.url, "root://eospublic.cern.ch/")
+        )
+        in test_result.output
+    )
+    with open("1/file1.txt", "rb") as f:
+        assert f.read() == files["file1.txt"]
+
+
+@pytest.mark.local
+def test_download_files_journal(cli_runner, opendata_server, mocker):
+    """Test that a restarted download skips the files the journal shows complete."""
+    mocker.patch("cernopendata_client.downloader.time.sleep")
+    files = {"file{}.txt".format(i): os.urandom(100) for i in range(1, 5)}
+    opendata_server.add_record(1, files)
+    # the server drops the connection when serving the third file
+    opendata_server.files["/eos/opendata/test/1/file3.txt"] = None
+    args = ["--recid", 1, "--server", opendata_server.url, "--retry-limit", 1]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 1
+    assert "Number of retries exceeded." in test_result.output
+    journal = DownloadJournal(get_journal_path("1"))
+    states = [
+        journal.get("{}/eos/opendata/test/1/{}".format(opendata_server.url, name))
+        for name in sorted(files)
+    ]
+    assert [state["state"] for state in states] == [
+        "verified",
+        "verified",
+        "in-progress",
+        "verified",
+    ]
+    assert states[0]["bytes"] == 100
+    journal.close()
+
+    opendata_server.files["/eos/opendata/test/1/file3.txt"] = files["file3.txt"]
+    del opendata_server.requests[:]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert test_result.output.count("is already downloaded. Skipping.") == 3
+    assert sorted(
+        (method, path)
+        for method, path, headers in opendata_server.requests
+        if "eos" in path
+    ) == [
+        ("GET", "/eos/opendata/test/1/file3.txt"),
+    ]
+    with open("1/file3.txt", "rb") as f:
+        assert f.read() == files["file3.txt"]
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+def test_download_files_error_page(
+    cli_runner, opendata_server, mocker, download_engine
+):
+    """Test that the error page is detected while downloading and retried."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    mocker.patch("cernopendata_client.downloader.time.sleep")
+    get_file_info = mocker.spy(cernopendata_client.downloader, "get_file_info")
+    files = {"file1.root": os.urandom(5000), "file2.root": os.urandom(5000)}
+    opendata_server.add_record(1, files)
+    opendata_server.error_pages["/eos/opendata/test/1/file2.root"] = 2
+    args = ["--recid", 1, "--server", opendata_server.url, "--verify"]
+    args += ["--download-engine", download_engine, "--retry-limit", 3]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert "Retrying 2/3" in test_result.output
+    assert "Retrying 3/3" not in test_result.output
+    assert get_file_info.call_count == 0
+    for name, content in files.items():
+        with open("1/" + name, "rb") as f:
+            assert f.read() == content
+
+    # the error page is never written to disk
+    opendata_server.error_pages["/eos/opendata/test/1/file2.root"] = 2
+    os.remove("1/file2.root")
+    args[-1] = 1
+    test_result = cli_runner.invoke(download_files, args + ["--no-journal"])
+    assert test_result.exit_code == 1
+    assert "Number of retries exceeded." in test_result.output
+    assert not os.path.exists("1/file2.root") or not os.path.getsize("1/file2.root")
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_download_files_missing_file(
+    cli_runner, opendata_server, mocker, download_engine, jobs
+):
+    """Test that a file missing on the server fails at once without retries."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    mocker.patch("cernopendata_client.downloader.time.sleep")
+    files = {"file1.root": os.urandom(5000), "file2.root": os.urandom(5000)}
+    opendata_server.add_record(1, files)
+    del opendata_server.files["/eos/opendata/test/1/file2.root"]
+    args = ["--recid", 1, "--server", opendata_server.url]
+    args += ["--download-engine", download_engine, "--jobs", jobs]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 1
+    assert "file2.root" in test_result.output
+    assert "server responded with status 404" in test_result.output
+    assert "Download of 1 of 2 files failed:" in test_result.output
+    assert "Retrying" not in test_result.output
+    assert [
+        path
+        for method, path, _ in opendata_server.requests
+        if method == "GET" and path.endswith("file2.root")
+    ] == ["/eos/opendata/test/1/file2.root"]
+    with open("1/file1.root", "rb") as f:
+        assert f.read() == files["file1.root"]
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+def test_download_files_resume_from_metadata(
+    cli_runner, opendata_server, download_engine
+):
+    """Test that incomplete files are resumed using the metadata sizes only."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    content = os.urandom(1000)
+    opendata_server.add_record(1, {"file.root": content})
+    os.mkdir("1")
+    with open("1/file.root", "wb") as f:
+        f.write(content[:300])
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--download-engine",
+            download_engine,
+            "--verify",
+        ],
+    )
+    assert test_result.exit_code == 0
+    assert "File file.root is incomplete. Resuming download." in test_result.output
+    file_requests = [
+        (method, headers.get("Range"))
+        for method, path, headers in opendata_server.requests
+        if path.endswith("file.root")
+    ]
+    assert file_requests == [("GET", "bytes=300-")]
+    with open("1/file.root", "rb") as f:
+        assert f.read() == content
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl-multi"])
+def test_download_files_incremental(cli_runner, opendata_server, download_engine):
+    """Test that complete files are skipped without downloading them again."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    files = {"file1.root": os.urandom(3000), "file2.root": os.urandom(2000)}
+    opendata_server.add_record(1, files)
+    args = ["--recid", 1, "--server", opendata_server.url, "--no-journal"]
+    args += ["--download-engine", download_engine]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert "Skipped" not in test_result.output
+
+    # a file with the metadata size is complete, a shorter one is resumed
+    with open("1/file2.root", "r+b") as f:
+        f.truncate(1500)
+    del opendata_server.requests[:]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert "File file1.root is already downloaded. Skipping." in test_result.output
+    assert "Skipped 1 of 2 files already downloaded, saving 2.9 KiB" in (
+        test_result.output
+    )
+    assert [
+        (path, headers.get("Range"))
+        for method, path, headers in opendata_server.requests
+        if "eos" in path
+    ] == [("/eos/opendata/test/1/file2.root", "bytes=1500-")]
+
+    test_result = cli_runner.invoke(download_files, args + ["--no-incremental"])
+    assert test_result.exit_code == 0
+    assert "Skipped" not in test_result.output
+    for name, content in files.items():
+        with open("1/" + name, "rb") as f:
+            assert f.read() == content
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+def test_download_files_limit_rate(cli_runner, opendata_server, download_engine):
+    """Test that the download rate of all files together is limited."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    files = {"file{}.root".format(i): os.urandom(60 * 1024) for i in range(2)}
+    opendata_server.add_record(1, files)
+    start = time.monotonic()
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--download-engine",
+            download_engine,
+            "--jobs",
+            2,
+            "--limit-rate",
+            "100K",
+        ],
+    )
+    configure_rate_limit()
+    assert test_result.exit_code == 0
+    # 120 KiB minus the burst of 50 KiB at 100 KiB per second
+    assert time.monotonic() - start >= 0.6
+
+
+@pytest.mark.local
+def test_download_files_limit_rate_wrong(cli_runner):
+    """Test `download-files --limit-rate` command for wrong values."""
+    test_result = cli_runner.invoke(
+        download_files, ["--recid", 1, "--limit-rate", "fast"]
+    )
+    assert test_result.exit_code == 2
+    assert "Invalid value for --limit-rate: fast" in test_result.output
+
+
+class FakeXRootDFile(object):
+    """Stand-in for an XRootD file of the stand-in server."""
+
+    files = {}
+    delay = 0
+    fail_from = None
+    opened = []
+
+    def open(self, url, timeout=0):
+        self.content = self.files.get(url.split("eospublic.cern.ch/")[-1])
+        self.closed = False
+        if self.content is not None:
+            self.opened.append(self)
+        return FakeXRootDStatus(self.content is not None, "[ERROR] No such file"), None
+
+    def read(self, offset=0, size=0, timeout=0):
+        time.sleep(self.delay)
+        if self.fail_from is not None and offset >= self.fail_from:
+            return FakeXRootDStatus(False, "[ERROR] Operation expired"), None
+        return FakeXRootDStatus(), self.content[offset : offset + size]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("fastest", ["http", "xrootd"])
+def test_download_files_race(cli_runner, opendata_server, mocker, fastest):
+    """Test racing HTTP against XRootD and failing over when XRootD stalls."""
+    mocker.patch("cernopendata_client.downloader.DOWNLOAD_RACE_PROBE_SIZE", 1000)
+    xrootdclient = mocker.patch(
+        "cernopendata_client.downloader.xrootdclient", create=True
+    )
+    xrootdclient.File = FakeXRootDFile
+    mocker.patch("cernopendata_client.downloader.xrootd_available", True)
+    content = os.urandom(5000)
+    opendata_server.add_record(1, {"file.root": content})
+    FakeXRootDFile.files = dict(opendata_server.files)
+    # XRootD stalls after the probe
+    FakeXRootDFile.fail_from = 1000
+    FakeXRootDFile.delay = 0.3 if fastest == "http" else 0
+    if fastest == "xrootd":
+        opendata_server.delays["/eos/opendata/test/1/file.root"] = 0.3
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--download-engine",
+            "race",
+            "--verify",
+        ],
+    )
+    assert test_result.exit_code == 0
+    assert "File: ./1/file.root (over {})".format(fastest) in test_result.output
+    if fastest == "xrootd":
+        assert "Failing over to http." in test_result.output
+        assert ("GET", "bytes=1000-") in [
+            (method, headers.get("Range"))
+            for method, path, headers in opendata_server.requests
+        ]
+    with open("1/file.root", "rb") as f:
+        assert f.read() == content
+
+
+@pytest.mark.local
+def test_download_files_race_probes(cli_runner, opendata_server, mocker):
+    """Test that race probes read at most their size and close their files."""
+    mocker.patch("cernopendata_client.downloader.DOWNLOAD_RACE_PROBE_SIZE", 1000)
+    mocker.patch("cernopendata_client.downloader.time.sleep")
+    xrootdclient = mocker.patch(
+        "cernopendata_client.downloader.xrootdclient", create=True
+    )
+    xrootdclient.File = FakeXRootDFile
+    mocker.patch("cernopendata_client.downloader.xrootd_available", True)
+    content = os.urandom(5000)
+    (file_location,) = opendata_server.add_record(1, {"file.root": content})
+    FakeXRootDFile.files = dict(opendata_server.files)
+    FakeXRootDFile.fail_from = None
+    FakeXRootDFile.delay = 0
+    FakeXRootDFile.opened = []
+    # the server ignores byte ranges and sends the whole file
+    opendata_server.accept_ranges = False
+    downloader = cernopendata_client.downloader.DownloaderRace(
+        ".", file_location, None, "wb", None, file_size=len(content)
+    )
+    assert b"".join(downloader.read("http", 0, 1000)) == content[:1000]
+    args = ["--recid", 1, "--server", opendata_server.url]
+    args += ["--download-engine", "race", "--verify"]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    with open("1/file.root", "rb") as f:
+        assert f.read() == content
+    # every read opened its own XRootD file and closed it
+    assert len(FakeXRootDFile.opened) >= 2
+    assert all(xrootd_file.closed for xrootd_file in FakeXRootDFile.opened)
+
+    # a download failing over both protocols is retried
+    opendata_server.error_pages["/eos/opendata/test/1/file.root"] = 10
+    FakeXRootDFile.fail_from = 0
+    args += ["--no-incremental", "--retry-limit", 1]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 1
+    assert "failed over all protocols. Retrying 1/1" in test_result.output
+    assert "Number of retries exceeded." in test_result.output
+    assert "(over " not in test_result.output
+
+    # a file missing on the server fails at once
+    opendata_server.error_pages.clear()
+    del opendata_server.files["/eos/opendata/test/1/file.root"]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 1
+    assert "server responded with status 404" in test_result.output
+    assert "Retrying" not in test_result.output
+    assert "(over " not in test_result.output
+
+
+@pytest.mark.local
+def test_download_files_engine_from_history(cli_runner, opendata_server, mocker):
+    """Test selecting the historically fastest engine when none is given."""
+    pytest.importorskip("pycurl")
+    mocker.patch("cernopendata_client.history.random.random", return_value=0.5)
+    opendata_server.add_record(1, {"file.root": os.urandom(1000)})
+    host = opendata_server.url.split("://")[1]
+    history = ThroughputHistory()
+    for engine, throughput in (
+        ("requests", 1000),
+        ("pycurl", 3000),
+        ("pycurl-multi", 2000),
+    ):
+        history.record(engine, host, throughput, 1.0)
+    history.save()
+    test_result = cli_runner.invoke(
+        download_files, ["--recid", 1, "--server", opendata_server.url]
+    )
+    assert test_result.exit_code == 0
+    assert "Using pycurl download engine" in test_result.output
+    history = ThroughputHistory()
+    assert history.history[host]["pycurl --jobs 1"]["transfers"] == 2
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_download_files_output_stdout(
+    cli_runner, opendata_server, mocker, accept_ranges
+):
+    """Test streaming files in order to the standard output with retries."""
+    mocker.patch("cernopendata_client.downloader.time.sleep")
+    opendata_server.accept_ranges = accept_ranges
+    files = {"file{}.csv".format(i): os.urandom(200000) for i in range(1, 4)}
+    opendata_server.add_record(1, files)
+    opendata_server.error_pages["/eos/opendata/test/1/file1.csv"] = 1
+    opendata_server.truncated["/eos/opendata/test/1/file2.csv"] = 1
+    test_result = cli_runner.invoke(
+        download_files,
+        ["--recid", 1, "--server", opendata_server.url, "--output", "-", "--verify"],
+    )
+    assert test_result.exit_code == 0
+    assert test_result.stdout_bytes == b"".join(files.values())
+    assert "Received the error page of the server. Retrying 1/10" in (
+        test_result.stderr
+    )
+    assert "Streaming file 3 of 3" in test_result.stderr
+    assert not os.path.exists("1")
+    # the truncated transfer is resumed from the last written byte, which
+    # is skipped to if the server sends the whole file again
+    ranges = [
+        headers.get("Range")
+        for _, path, headers in opendata_server.requests
+        if path.endswith("file2.csv")
+    ]
+    assert len(ranges) == 2
+    assert ranges[0] is None
+    assert 0 < int(ranges[1].split("=")[1].rstrip("-")) <= 100000
+
+
+@pytest.mark.local
+def test_download_files_output_named_pipe(cli_runner, opendata_server, tmp_path):
+    """Test streaming files to a named pipe."""
+    files = {"file{}.csv".format(i): os.urandom(5000) for i in range(1, 3)}
+    opendata_server.add_record(1, files)
+    pipe = str(tmp_path / "pipe")
+    os.mkfifo(pipe)
+    received = []
+
+    def read_pipe():
+        with open(pipe, "rb") as f:
+            received.append(f.read())
+
+    reader = threading.Thread(target=read_pipe)
+    reader.start()
+    test_result = cli_runner.invoke(
+        download_files,
+        ["--recid", 1, "--server", opendata_server.url, "--output", pipe],
+    )
+    reader.join()
+    assert test_result.exit_code == 0
+    assert "Streaming file 2 of 2" in test_result.stdout
+    assert received == [b"".join(files.values())]
+
+
+@pytest.mark.local
+def test_download_files_output_wrong(cli_runner, tmp_path):
+    """Test streaming files to an output which is not a pipe."""
+    test_result = cli_runner.invoke(
+        download_files, ["--recid", 1, "--output", str(tmp_path / "file")]
+    )
+    assert test_result.exit_code == 2
+    assert "Output should be - or a named pipe" in test_result.output
+    test_result = cli_runner.invoke(
+        download_files, ["--recid", 1, "--output", "-", "--protocol", "xrootd"]
+    )
+    assert test_result.exit_code == 2
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl-multi"])
+def test_download_files_order(cli_runner, opendata_server, download_engine):
+    """Test transferring the largest files first keeping the file numbering."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    files = {"small.txt": b"1", "large.txt": b"123", "medium.txt": b"12"}
+    opendata_server.add_record(1, files)
+    test_result = cli_runner.invoke(
+        download_files,
+        [
+            "--recid",
+            1,
+            "--server",
+            opendata_server.url,
+            "--order",
+            "largest-first",
+            "--download-engine",
+            download_engine,
+        ],
+    )
+    assert test_result.exit_code == 0
+    requested = [
+        path.split("/")[-1]
+        for method, path, _ in opendata_server.requests
+        if path.startswith("/eos/")
+    ]
+    assert requested == ["large.txt", "medium.txt", "small.txt"]
+    if download_engine == "requests":
+        assert test_result.output.index(
+            "Downloading file 2 of 3\n  -> File: ./1/large.txt"
+        ) < test_result.output.index("Downloading file 1 of 3")
+
+
+@pytest.mark.local
+def test_download_files_cache(cli_runner, opendata_server, tmp_path):
+    """Test that files shared by records are downloaded once into the cache."""
+    files = {"file1.root": os.urandom(1000), "file2.root": os.urandom(1000)}
+    opendata_server.add_record(1, files)
+    opendata_server.add_record(2, {"copy.root": files["file1.root"]})
+    cache_dir = str(tmp_path / "cache")
+    args = ["--server", opendata_server.url, "--cache-dir", cache_dir]
+    test_result = cli_runner.invoke(download_files, ["--recid", 1] + args)
+    assert test_result.exit_code == 0
+    del opendata_server.requests[:]
+    test_result = cli_runner.invoke(download_files, ["--recid", 2] + args)
+    assert test_result.exit_code == 0
+    assert "File copy.root found in the download cache (hardlink)." in (
+        test_result.output
+    )
+    assert not [path for _, path, _ in opendata_server.requests if "/eos/" in path]
+    with open("2/copy.root", "rb") as f:
+        assert f.read() == files["file1.root"]
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+def test_download_files_retry_resume(
+    cli_runner, opendata_server, mocker, download_engine
+):
+    """Test that a broken transfer is retried from the byte offset reached."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    mocker.patch("cernopendata_client.downloader.get_retry_delay", return_value=0)
+    mocker.patch("cernopendata_client.retry.get_retry_delay", return_value=0)
+    files = {"file1.root": os.urandom(200000), "file2.root": os.urandom(200000)}
+    opendata_server.add_record(1, files)
+    opendata_server.truncated["/eos/opendata/test/1/file2.root"] = 1
+    args = ["--recid", 1, "--server", opendata_server.url, "--verify"]
+    args += ["--download-engine", download_engine]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert "Retrying 1/10" in test_result.output
+    ranges = [
+        headers.get("Range")
+        for _, path, headers in opendata_server.requests
+        if path.endswith("file2.root")
+    ]
+    assert len(ranges) == 2
+    assert ranges[0] is None
+    assert 0 < int(ranges[1].split("=")[1].rstrip("-")) <= 100000
+    for name, content in files.items():
+        with open("1/" + name, "rb") as f:
+            assert f.read() == content
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl"])
+def test_download_files_retry_after(
+    cli_runner, opendata_server, mocker, download_engine
+):
+    """Test that the delay requested by an unavailable server is honoured."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    sleep = mocker.patch("cernopendata_client.retry.time.sleep")
+    files = {"file1.root": os.urandom(5000)}
+    opendata_server.add_record(1, files)
+    opendata_server.unavailable["/api/records/1"] = 1
+    opendata_server.unavailable["/eos/opendata/test/1/file1.root"] = 2
+    args = ["--recid", 1, "--server", opendata_server.url, "--verify"]
+    args += ["--download-engine", download_engine, "--retry-sleep", 1]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert test_result.output.count("Server responded with status 503") == 3
+    assert [call[0][0] for call in sleep.call_args_list].count(7) == 3
+    with open("1/file1.root", "rb") as f:
+        assert f.read() == files["file1.root"]
+
+
+@pytest.mark.local
+def test_download_files_shard(cli_runner, opendata_server):
+    """Test that the shards of a record split its files without coordination."""
+    sizes = [50000, 10, 20000, 30, 15000, 40, 5000, 60]
+    files = {"file{}.root".format(i): os.urandom(size) for i, size in enumerate(sizes)}
+    file_locations = opendata_server.add_record(1, files)
+    args = ["--recid", 1, "--server", opendata_server.url, "--dry-run"]
+    shards = []
+    for i in range(1, 4):
+        test_result = cli_runner.invoke(
+            download_files, args + ["--shard", "{}/3".format(i)]
+        )
+        assert test_result.exit_code == 0
+        shards.append(test_result.output.split())
+    assert sorted(sum(shards, [])) == sorted(file_locations)
+    assert shards[0] == [file_locations[0]]
+    test_result = cli_runner.invoke(download_files, args + ["--shard", "9/9"])
+    assert test_result.exit_code == 0
+    assert "No files in shard 9/9" in test_result.output
+    test_result = cli_runner.invoke(download_files, args + ["--shard", "4/3"])
+    assert test_result.exit_code == 2
+
+
+@pytest.mark.local
+def test_download_files_queue(cli_runner, opendata_server):
+    """Test that queued processes skip done files and reclaim abandoned ones."""
+    files = {"file{}.txt".format(i): os.urandom(100) for i in range(1, 5)}
+    file_locations = opendata_server.add_record(1, files)
+    queue = WorkQueue("1.queue")
+    queue.close()
+    # another process downloaded the third file and died downloading the second
+    with open(queue.get_done_path(file_locations[2]), "w") as f:
+        f.write("node2-1234-abcdef01")
+    lease_path = queue.get_lease_path(file_locations[1])
+    with open(lease_path, "w") as f:
+        f.write("node2-1234-abcdef01")
+    os.utime(lease_path, (time.time() - 600, time.time() - 600))
+    test_result = cli_runner.invoke(
+        download_files,
+        ["--recid", 1, "--server", opendata_server.url, "--queue", "--jobs", 2],
+    )
+    assert test_result.exit_code == 0
+    assert "Reclaiming abandoned file file2.txt." in test_result.output
+    assert sorted(
+        path for method, path, headers in opendata_server.requests if "eos" in path
+    ) == [
+        "/eos/opendata/test/1/file1.txt",
+        "/eos/opendata/test/1/file2.txt",
+        "/eos/opendata/test/1/file4.txt",
+    ]
+    assert not os.path.exists("1/file3.txt")
+    assert os.listdir("1.queue/leases") == []
+    assert len(os.listdir("1.queue/done")) == 4
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_download_files_queue_failure(cli_runner, opendata_server, mocker, jobs):
+    """Test that a queued file failing to download is released, not completed."""
+    mocker.patch("cernopendata_client.downloader.time.sleep")
+    files = {"file{}.txt".format(i): os.urandom(100) for i in range(1, 4)}
+    file_locations = opendata_server.add_record(1, files)
+    del opendata_server.files["/eos/opendata/test/1/file2.txt"]
+    test_result = cli_runner.invoke(
+        download_files,
+        ["--recid", 1, "--server", opendata_server.url, "--queue", "--jobs", jobs],
+    )
+    assert test_result.exit_code == 1
+    assert "Success!" not in test_result.output
+    assert "Download of 1 of 3 files failed:" in test_result.output
+    assert "file2.txt" in test_result.output
+    queue = WorkQueue("1.queue")
+    assert not queue.is_done(file_locations[1])
+    assert queue.is_done(file_locations[0]) and queue.is_done(file_locations[2])
+    queue.close()
+    assert os.listdir("1.queue/leases") == []
+
+
+@pytest.mark.local
+def test_download_files_several_records(cli_runner, opendata_server):
+    """Test downloading several records and search results in one run."""
+    files = {}
+    for recid in range(1, 4):
+        files[recid] = {
+            "file{}.txt".format(i): os.urandom(100 * recid) for i in range(1, 4)
+        }
+        opendata_server.add_record(recid, files[recid])
+    opendata_server.searches["experiment:TEST"] = ["2", "3"]
+    args = ["--server", opendata_server.url, "--recid", 1, "--jobs", 2]
+    test_result = cli_runner.invoke(
+        download_files, args + ["--query", "experiment:TEST", "--dry-run"]
+    )
+    assert test_result.exit_code == 0
+    assert len(test_result.output.split()) == 9
+    test_result = cli_runner.invoke(
+        download_files, args + ["--query", "experiment:TEST"]
+    )
+    assert test_result.exit_code == 0
+    for recid in range(1, 4):
+        for name, content in files[recid].items():
+            with open("{}/{}".format(recid, name), "rb") as f:
+                assert f.read() == content
+    test_result = cli_runner.invoke(download_files, args + ["--recid", 7])
+    assert test_result.exit_code == 1
+    assert "Download of 1 records failed:\n  7" in test_result.output
+    assert test_result.output.count("is already downloaded. Skipping.") == 3
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl-multi"])
+def test_download_files_several_records_failure(
+    cli_runner, opendata_server, download_engine
+):
+    """Test that a failed file does not stop the downloads of the next records."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    files = {}
+    for recid in range(1, 4):
+        files[recid] = {"file{}.txt".format(i): os.urandom(100) for i in range(1, 3)}
+        opendata_server.add_record(recid, files[recid])
+    del opendata_server.files["/eos/opendata/test/1/file1.txt"]
+    args = ["--server", opendata_server.url, "--jobs", 1]
+    args += ["--download-engine", download_engine]
+    for recid in range(1, 4):
+        args += ["--recid", recid]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 1
+    assert "Download of 1 of 2 files of record 1 failed:" in test_result.output
+    assert os.path.isfile("1/file2.txt")
+    for recid in range(2, 4):
+        for name, content in files[recid].items():
+            with open("{}/{}".format(recid, name), "rb") as f:
+                assert f.read() == content
+    assert os.path.isfile(ThroughputHistory().path)
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+def test_download_files_part_file(cli_runner, opendata_server, download_engine):
+    """Test that files are written to part files renamed once complete."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    content = os.urandom(1000)
+    opendata_server.add_record(1, {"file.root": content, "other.root": b"other"})
+    os.mkdir("1")
+    # a killed run left the first bytes of the file
+    with open("1/file.root.part", "wb") as f:
+        f.write(content[:300])
+    args = ["--recid", 1, "--server", opendata_server.url]
+    args += ["--download-engine", download_engine]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert "File file.root is incomplete. Resuming download." in test_result.output
+    assert sorted(os.listdir("1")) == ["file.root", "other.root"]
+    with open("1/file.root", "rb") as f:
+        assert f.read() == content
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl-multi"])
+def test_download_files_complete_part_file(
+    cli_runner, opendata_server, download_engine
+):
+    """Test that a part file left complete is validated instead of downloaded again."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    content = os.urandom(1000)
+    opendata_server.add_record(1, {"file.root": content})
+    os.mkdir("1")
+    # a run was killed before renaming the complete part file
+    with open("1/file.root.part", "wb") as f:
+        f.write(content)
+    args = ["--recid", 1, "--server", opendata_server.url, "--verify"]
+    args += ["--download-engine", download_engine]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert "File file.root was downloaded completely." in test_result.output
+    assert not [
+        path for _, path, _ in opendata_server.requests if path.endswith("file.root")
+    ]
+    assert os.listdir("1") == ["file.root"]
+
+    # a corrupted complete part file is removed
+    with open("1/file.root.part", "wb") as f:
+        f.write(os.urandom(1000))
+    os.remove("1/file.root")
+    test_result = cli_runner.invoke(download_files, args + ["--no-journal"])
+    assert test_result.exit_code == 1
+    assert "File checksum does not match." in test_result.output
+    assert os.listdir("1") == []
+
+
+@pytest.mark.local
+@pytest.mark.parametrize("download_engine", ["requests", "pycurl", "pycurl-multi"])
+def test_download_files_segment_checkpoint(
+    cli_runner, opendata_server, download_engine
+):
+    """Test that a killed segmented download fetches only the missing byte ranges."""
+    if download_engine != "requests":
+        pytest.importorskip("pycurl")
+    content = os.urandom(10000)
+    opendata_server.add_record(1, {"big.root": content})
+    os.mkdir("1")
+    # a killed run wrote the first segment and a part of the second one
+    with open("1/big.root.part", "wb") as f:
+        f.write(content[:3500] + os.urandom(6500))
+    with open("1/big.root.part.segments", "w") as f:
+        json.dump(
+            {
+                "size": 10000,
+                "segments": [
+                    [0, 4999, 3500, zlib.adler32(content[:3500])],
+                    [5000, 9999, 5000, 1],
+                ],
+            },
+            f,
+        )
+    args = ["--recid", 1, "--server", opendata_server.url, "--verify"]
+    args += ["--download-engine", download_engine]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert (
+        "Resuming download of big.root from 3500 of 10000 bytes written."
+        in test_result.output
+    )
+    assert sorted(
+        headers.get("Range")
+        for method, path, headers in opendata_server.requests
+        if method == "GET" and path.endswith("big.root")
+    ) == ["bytes=3500-4999", "bytes=5000-9999"]
+    assert os.listdir("1") == ["big.root"]
+    with open("1/big.root", "rb") as f:
+        assert f.read() == content
+
+
+@pytest.mark.local
+def test_download_files_concurrent_runs(opendata_server):
+    """Test that concurrent runs download a file once into its destination."""
+    pytest.importorskip("fcntl")
+    content = os.urandom(1000)
+    (file_location,) = opendata_server.add_record(1, {"file.root": content})
+    opendata_server.delays["/eos/opendata/test/1/file.root"] = 0.5
+    os.mkdir("1")
+    downloaded_files = []
+
+    def download():
+        downloaded_files.append(
+            cernopendata_client.downloader.download_file(
+                path="1",
+                file_location=file_location,
+                protocol="http",
+                download_engine="requests",
+                progress=False,
+                file_size=len(content),
+                file_checksum=opendata_server.records["1"]["metadata"]["files"][0][
+                    "checksum"
+                ],
+                incremental=True,
+            )
+        )
+
+    threads = [threading.Thread(target=download) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(
+        downloaded_file["skipped"] for downloaded_file in downloaded_files
+    ) == [
+        False,
+        True,
+    ]
+    assert [
+        path for method, path, headers in opendata_server.requests if "eos" in path
+    ] == ["/eos/opendata/test/1/file.root"]
+    assert os.listdir("1") == ["file.root"]
+    with open("1/file.root", "rb") as f:
+        assert f.read() == content
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client serve-cache test suite."""
+
+import os
+import threading
+
+import pytest
+import requests
+
+import cernopendata_client.proxy
+from cernopendata_client.cli import download_files, serve_cache
+from cernopendata_client.proxy import CacheProxy, parse_byte_range
+
+
+@pytest.fixture
+def cache_proxy(opendata_server, tmp_path):
+    """Run a caching proxy of the local Open Data server."""
+    proxy = CacheProxy(("127.0.0.1", 0), opendata_server.url, str(tmp_path / "cache"))
+    proxy.url = "http://127.0.0.1:{}".format(proxy.server_address[1])
+    thread = threading.Thread(target=proxy.serve_forever, daemon=True)
+    thread.start()
+    yield proxy
+    proxy.shutdown()
+    proxy.server_close()
+
+
+def upstream_requests(opendata_server, prefix="/"):
+    """Return the GET requests the upstream server received."""
+    return [
+        path
+        for method, path, _ in opendata_server.requests
+        if method == "GET" and path.startswith(prefix)
+    ]
+
+
+@pytest.mark.local
+def test_parse_byte_range():
+    """Test parsing HTTP byte ranges."""
+    assert parse_byte_range("bytes=0-9", 100) == (0, 9)
+    assert parse_byte_range("bytes=90-", 100) == (90, 99)
+    assert parse_byte_range("bytes=-10", 100) == (90, 99)
+    assert parse_byte_range("bytes=50-200", 100) == (50, 99)
+    assert parse_byte_range("bytes=100-", 100) is None
+    assert parse_byte_range("bytes=0-1,5-6", 100) is None
+    assert parse_byte_range("lines=0-1", 100) is None
+
+
+@pytest.mark.local
+def test_serve_cache_download_files(cli_runner, opendata_server, cache_proxy):
+    """Test that clients of the proxy download from the upstream server once."""
+    files = {"file1.root": os.urandom(5000), "file2.root": os.urandom(5000)}
+    opendata_server.add_record(1, files)
+    args = ["--recid", 1, "--server", cache_proxy.url, "--no-journal"]
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    upstream = len(opendata_server.requests)
+    os.rename("1", "first")
+    test_result = cli_runner.invoke(download_files, args)
+    assert test_result.exit_code == 0
+    assert len(opendata_server.requests) == upstream
+    for name, content in files.items():
+        with open(os.path.join("1", name), "rb") as f:
+            assert f.read() == content
+
+
+@pytest.mark.local
+def test_serve_cache_ranges(opendata_server, cache_proxy):
+    """Test serving byte ranges of cached files."""
+    content = os.urandom(10000)
+    opendata_server.add_record(1, {"file.root": content})
+    url = cache_proxy.url + "/eos/opendata/test/1/file.root"
+    assert requests.get(url).content == content
+    response = requests.get(url, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 100-199/10000"
+    assert response.content == content[100:200]
+    response = requests.get(url, headers={"Range": "bytes=-10"})
+    assert response.content == content[-10:]
+    response = requests.get(url, headers={"Range": "bytes=10000-"})
+    assert response.status_code == 416
+    response = requests.head(url)
+    assert response.headers["Content-Length"] == "10000"
+    assert upstream_requests(opendata_server, "/eos/") == [
+        "/eos/opendata/test/1/file.root"
+    ]
+
+
+@pytest.mark.local
+def test_serve_cache_uncached_ranges(opendata_server, cache_proxy, mocker):
+    """Test passing byte ranges through while the file is fetched into the cache."""
+    content = os.urandom(100000)
+    opendata_server.add_record(1, {"file.root": content})
+    fetched = threading.Event()
+    get_file = cache_proxy.get_file
+
+    def wait_get_file(path):
+        fetched.wait(5)
+        return get_file(path)
+
+    mocker.patch.object(cache_proxy, "get_file", side_effect=wait_get_file)
+    url = cache_proxy.url + "/eos/opendata/test/1/file.root"
+    response = requests.get(url, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 100-199/100000"
+    assert response.content == content[100:200]
+    # the range is served before the whole file is fetched
+    assert not cache_proxy.is_file_cached("/eos/opendata/test/1/file.root")
+    response = requests.get(url, headers={"Range": "bytes=99990-"})
+    assert response.content == content[-10:]
+    fetched.set()
+    assert requests.get(url).content == content
+    assert cache_proxy.is_file_cached("/eos/opendata/test/1/file.root")
+    response = requests.get(url, headers={"Range": "bytes=0-9"})
+    assert response.content == content[:10]
+    # the file itself is fetched once, the ranges are passed through
+    assert sorted(
+        headers.get("Range", "")
+        for method, path, headers in opendata_server.requests
+        if method == "GET" and path.startswith("/eos/")
+    ) == ["", "bytes=100-199", "bytes=99990-"]
+
+
+@pytest.mark.local
+def test_serve_cache_size(opendata_server, tmp_path, mocker):
+    """Test tracking the size of the cache and evicting entries over its limit."""
+    cache_dir = str(tmp_path / "cache")
+    old_path = os.path.join(cache_dir, "objects", "files", "00", "old")
+    os.makedirs(os.path.dirname(old_path))
+    with open(old_path, "wb") as f:
+        f.write(b"0" * 600)
+    os.utime(old_path, (1, 1))
+    proxy = CacheProxy(("127.0.0.1", 0), opendata_server.url, cache_dir, 1000)
+    try:
+        assert proxy.cache_size == 600
+        evict_files = mocker.spy(cernopendata_client.proxy, "evict_files")
+        cache_path = proxy.get_cache_path("files", "/a")
+        proxy.store(cache_path, lambda f: f.write(b"a" * 300))
+        assert proxy.cache_size == 900
+        # replacing an entry accounts for the size difference only
+        proxy.store(cache_path, lambda f: f.write(b"a" * 350))
+        assert proxy.cache_size == 950
+        # the cache is walked only when it grows over its limit
+        assert not evict_files.called
+        proxy.store(proxy.get_cache_path("files", "/b"), lambda f: f.write(b"b" * 200))
+        assert evict_files.call_count == 1
+        assert proxy.cache_size == 550
+        assert not os.path.exists(old_path)
+    finally:
+        proxy.server_close()
+
+
+@pytest.mark.local
+def test_serve_cache_concurrent_clients(opendata_server, cache_proxy):
+    """Test that concurrent clients requesting a file share one upstream fetch."""
+    content = os.urandom(100000)
+    opendata_server.add_record(1, {"file.root": content})
+    opendata_server.delays["/eos/opendata/test/1/file.root"] = 0.2
+    url = cache_proxy.url + "/eos/opendata/test/1/file.root"
+    responses = []
+
+    def fetch():
+        responses.append(requests.get(url).content)
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert responses == [content] * 8
+    assert len(upstream_requests(opendata_server, "/eos/")) == 1
+
+
+@pytest.mark.local
+def test_serve_cache_error_page(opendata_server, cache_proxy):
+    """Test that the error page of the upstream server is never cached."""
+    content = os.urandom(1000)
+    opendata_server.add_record(1, {"file.root": content})
+    opendata_server.error_pages["/eos/opendata/test/1/file.root"] = 1
+    url = cache_proxy.url + "/eos/opendata/test/1/file.root"
+    assert requests.get(url).status_code == 502
+    assert requests.get(url).content == content
+    assert requests.get(url).content == content
+    assert len(upstream_requests(opendata_server, "/eos/")) == 2
+
+
+@pytest.mark.local
+def test_serve_cache_command(cli_runner, tmp_path, mocker):
+    """Test running the caching proxy until interrupted."""
+    serve_forever = mocker.patch(
+        "cernopendata_client.cli.CacheProxy.serve_forever",
+        side_effect=KeyboardInterrupt,
+    )
+    test_result = cli_runner.invoke(
+        serve_cache, ["--cache-dir", str(tmp_path / "cache"), "--port", 0]
+    )
+    assert test_result.exit_code == 0
+    assert "Serving http://opendata.cern.ch from" in test_result.output
+    assert serve_forever.called
@@ -9,13 +9,30 @@
 
 """cernopendata-client downloader unit tests."""
 
+import io
+import os
+
 import pytest
 
 from cernopendata_client.downloader import (
+    DownloadError,
+    download_file,
+    download_files_in_parallel,
+    finalize_part_file,
     get_download_files_by_name,
     get_download_files_by_regexp,
     get_download_files_by_range,
+    get_default_download_engine,
+    get_download_files_by_shard,
+    get_file_segments,
     get_file_subdirectories,
+    get_part_path,
+    get_transfer_order,
+    get_xrootd_file_location,
+    is_download_error_page,
+    iter_response,
+    lock_part_file,
+    open_part_file,
 )
 
 
@@ -117,6 +134,43 @@ def test_get_download_files_by_regexp_no_match():
     assert result == []
 
 
+@pytest.mark.local
+def test_get_download_files_by_shard():
+    """Test splitting files into disjoint shards of near-equal total size."""
+    file_sizes = {
+        "http://example.com/file{}.root".format(i): size
+        for i, size in enumerate([1000, 1, 500, 2, 300, 3, 200, 4, 100, 5, None])
+    }
+    file_locations = list(file_sizes)
+    shards = [
+        get_download_files_by_shard(
+            shard="{}/3".format(i),
+            file_locations=file_locations,
+            file_sizes=file_sizes,
+        )
+        for i in range(1, 4)
+    ]
+    assert sorted(sum(shards, [])) == sorted(file_locations)
+    shard_bytes = [sum(file_sizes[f] or 0 for f in shard) for shard in shards]
+    assert shard_bytes == [1000, 600, 515]
+    # every job gets the same assignment, in input order
+    assert (
+        shards[0]
+        == get_download_files_by_shard(
+            shard="1/3",
+            file_locations=list(reversed(file_locations)),
+            file_sizes=file_sizes,
+        )[::-1]
+    )
+    assert shards[1] == sorted(shards[1], key=file_locations.index)
+    assert (
+        get_download_files_by_shard(
+            shard="3/3", file_locations=file_locations[:2], file_sizes=file_sizes
+        )
+        == []
+    )
+
+
 @pytest.mark.local
 def test_get_download_files_by_range_single():
     """Test filtering files by a single range."""
@@ -258,3 +312,241 @@ def test_get_file_subdirectories_empty_list():
     """Test with an empty file list."""
     result = get_file_subdirectories([])
     assert result == {}
+
+
+@pytest.mark.local
+def test_download_files_in_parallel():
+    """Test that parallel downloads report failures in input order."""
+    file_locations = ["http://example.com/{}.txt".format(i) for i in range(10)]
+    downloaded = []
+
+    def download_file(index, file_location):
+        if index % 3 == 0:
+            raise SystemExit(1)
+        downloaded.append(index)
+
+    failed = download_files_in_parallel(download_file, file_locations, jobs=4)
+    assert failed == [file_locations[i] for i in (0, 3, 6, 9)]
+    assert sorted(downloaded) == [1, 2, 4, 5, 7, 8]
+
+
+@pytest.mark.local
+def test_download_files_in_parallel_single_job():
+    """Test that a single job downloads serially and stops at the first error."""
+    file_locations = ["http://example.com/{}.txt".format(i) for i in range(3)]
+    downloaded = []
+
+    def download_file(index, file_location):
+        if index == 1:
+            raise SystemExit(1)
+        downloaded.append(index)
+
+    pytest.raises(
+        SystemExit, download_files_in_parallel, download_file, file_locations, 1
+    )
+    assert downloaded == [0]
+
+
+@pytest.mark.local
+def test_download_files_in_parallel_order():
+    """Test that files are transferred in order and failures reported in input order."""
+    file_locations = ["http://example.com/{}.txt".format(i) for i in range(4)]
+    downloaded = []
+
+    def download_file(index, file_location):
+        downloaded.append(index)
+        if index % 2 == 0:
+            raise SystemExit(1)
+
+    failed = download_files_in_parallel(
+        download_file, file_locations, jobs=2, order=[3, 2, 1, 0]
+    )
+    assert failed == [file_locations[0], file_locations[2]]
+    assert sorted(downloaded) == [0, 1, 2, 3]
+    downloaded.clear()
+    pytest.raises(
+        SystemExit,
+        download_files_in_parallel,
+        download_file,
+        file_locations,
+        jobs=1,
+        order=[3, 2, 1, 0],
+    )
+    assert downloaded == [3, 2]
+
+
+@pytest.mark.local
+def test_get_transfer_order():
+    """Test the transfer order policies."""
+    file_locations = ["a", "b", "c", "d"]
+    file_sizes = {"a": 10, "b": None, "c": 30, "d": 20}
+    assert get_transfer_order(file_locations, file_sizes) == [0, 1, 2, 3]
+    assert get_transfer_order(file_locations, file_sizes, "largest-first") == [
+        2,
+        3,
+        0,
+        1,
+    ]
+    assert get_transfer_order(file_locations, file_sizes, "smallest-first") == [
+        0,
+        3,
+        2,
+        1,
+    ]
+
+
+@pytest.mark.local
+def test_get_file_segments():
+    """Test splitting a file into byte ranges."""
+    assert get_file_segments(100, 4, min_segment_size=10) == [
+        (0, 24),
+        (25, 49),
+        (50, 74),
+        (75, 99),
+    ]
+    assert get_file_segments(101, 2, min_segment_size=10) == [(0, 50), (51, 100)]
+    # small files are not split below the minimum segment size
+    assert get_file_segments(100, 8, min_segment_size=40) == [(0, 49), (50, 99)]
+    assert get_file_segments(100, 8, min_segment_size=1000) == [(0, 99)]
+    assert get_file_segments(0, 8, min_segment_size=10) == []
+
+
+@pytest.mark.local
+def test_iter_response(mocker):
+    """Test that response chunks grow while the server fills them quickly."""
+    mocker.patch("cernopendata_client.downloader.DOWNLOAD_CHUNK_SIZE_MIN", 4)
+    mocker.patch("cernopendata_client.downloader.DOWNLOAD_CHUNK_SIZE_MAX", 16)
+    content = bytes(range(100))
+    response = mocker.Mock()
+    response.raw = io.BytesIO(content)
+    chunks = [bytes(chunk) for chunk in iter_response(response)]
+    assert b"".join(chunks) == content
+    assert [len(chunk) for chunk in chunks[:4]] == [4, 8, 16, 16]
+
+
+@pytest.mark.local
+def test_is_download_error_page():
+    """Test recognising the error page of the server from the response start."""
+    html = b"\n<!DOCTYPE html>\n<html>"
+    location = "http://opendata.cern.ch/eos/opendata/file.root"
+    assert not is_download_error_page(location, 200, {}, b"\x00\x01root")
+    assert not is_download_error_page(location, 206, {}, b"\x00\x01root")
+    assert is_download_error_page(location, 404, {}, b"Not found")
+    assert is_download_error_page(location, 200, {"content-type": "text/html"}, b"")
+    assert is_download_error_page(location, 200, {}, html)
+    assert not is_download_error_page(location[:-4] + "html", 200, {}, html)
+
+
+@pytest.mark.local
+def test_get_xrootd_file_location():
+    """Test deriving the XRootD location of files served over HTTP."""
+    assert (
+        get_xrootd_file_location("http://opendata.cern.ch/eos/opendata/cms/a.root")
+        == "root://eospublic.cern.ch//eos/opendata/cms/a.root"
+    )
+    assert (
+        get_xrootd_file_location("http://opendata.cern.ch/record/1/file_index/a.txt")
+        is None
+    )
+
+
+@pytest.mark.local
+def test_open_part_file(tmp_path):
+    """Test that a part file is written by one downloader at a time."""
+    pytest.importorskip("fcntl")
+    part_path = get_part_path(str(tmp_path / "file.root"))
+    part_file = open_part_file(part_path)
+    assert open_part_file(part_path, blocking=False) is None
+    # the lock follows the part file once it is renamed
+    os.replace(part_path, str(tmp_path / "file.root"))
+    other_part_file = open_part_file(part_path, blocking=False)
+    assert other_part_file is not None
+    other_part_file.close()
+    part_file.close()
+
+
+@pytest.mark.local
+def test_lock_part_file_adopt_incomplete_file(tmp_path):
+    """Test that an incomplete file is only adopted if its expected size is larger."""
+    pytest.importorskip("fcntl")
+    file_dest = str(tmp_path / "file.root")
+    part_path = get_part_path(file_dest)
+    with open(file_dest, "wb") as f:
+        f.write(b"data")
+    for file_size in (None, 4):
+        with lock_part_file(part_path, file_size):
+            assert not os.path.getsize(part_path)
+        assert not os.path.exists(part_path)
+        assert os.path.getsize(file_dest) == 4
+    with lock_part_file(part_path, 10):
+        assert not os.path.exists(file_dest)
+        with open(part_path, "rb") as f:
+            assert f.read() == b"data"
+        # the adopted part file is locked
+        assert open_part_file(part_path, blocking=False) is None
+
+
+@pytest.mark.local
+def test_finalize_part_file(tmp_path):
+    """Test that part files are renamed only if their size and checksum match."""
+    file_dest = str(tmp_path / "file.root")
+    downloaded_file = {"name": "file.root", "size": 4, "checksum": "adler32:1"}
+    with open(get_part_path(file_dest), "wb") as f:
+        f.write(b"data")
+    pytest.raises(DownloadError, finalize_part_file, file_dest, downloaded_file, 5)
+    assert not os.path.exists(get_part_path(file_dest))
+    assert not os.path.exists(file_dest)
+    with open(get_part_path(file_dest), "wb") as f:
+        f.write(b"data")
+    pytest.raises(
+        DownloadError, finalize_part_file, file_dest, downloaded_file, 4, "adler32:2"
+    )
+    assert not os.path.exists(get_part_path(file_dest))
+    with open(get_part_path(file_dest), "wb") as f:
+        f.write(b"data")
+    finalize_part_file(file_dest, downloaded_file, 4, "adler32:1")
+    assert not os.path.exists(get_part_path(file_dest))
+    with open(file_dest, "rb") as f:
+        assert f.read() == b"data"
+
+
+@pytest.mark.local
+def test_download_file_errors(opendata_server, mocker):
+    """Test that failed downloads raise DownloadError instead of exiting."""
+    mocker.patch("cernopendata_client.downloader.time.sleep")
+    file_location = opendata_server.add_record(1, {"file.root": b"data"})[0]
+    os.mkdir("1")
+    opendata_server.error_pages["/eos/opendata/test/1/file.root"] = 2
+    with pytest.raises(DownloadError, match="Number of retries exceeded."):
+        download_file(
+            path="1",
+            file_location=file_location,
+            protocol="http",
+            download_engine="requests",
+            retry_limit=1,
+            progress=False,
+            file_size=4,
+        )
+    del opendata_server.files["/eos/opendata/test/1/file.root"]
+    with pytest.raises(DownloadError, match="server responded with status 404"):
+        download_file(
+            path="1",
+            file_location=file_location,
+            protocol="http",
+            download_engine="requests",
+            progress=False,
+            file_size=4,
+        )
+    assert os.listdir("1") == []
+
+
+@pytest.mark.local
+def test_get_default_download_engine(mocker):
+    """Test selecting the available download engine when none is given."""
+    mocker.patch("cernopendata_client.downloader.requests_available", True)
+    mocker.patch("cernopendata_client.downloader.pycurl_available", False)
+    assert get_default_download_engine("https", "host") == "requests"
+    mocker.patch("cernopendata_client.downloader.requests_available", False)
+    mocker.patch("cernopendata_client.downloader.pycurl_available", True)
+    assert get_default_download_engine("https", "host") == "pycurl"
+    assert get_default_download_engine("xrootd", "host") == "xrootd"
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download throughput history tests."""
+
+import json
+
+import pytest
+
+from cernopendata_client.history import (
+    ThroughputHistory,
+    get_history_key,
+    get_history_path,
+)
+
+
+@pytest.mark.local
+def test_get_history_path(tmp_path):
+    """Test that the history is stored in the user cache directory."""
+    assert get_history_path() == str(
+        tmp_path / "cache" / "cernopendata-client" / "throughput.json"
+    )
+
+
+@pytest.mark.local
+def test_throughput_history_save(tmp_path):
+    """Test that concurrent runs merge their throughput into the history file."""
+    path = str(tmp_path / "throughput.json")
+    history1 = ThroughputHistory(path)
+    history2 = ThroughputHistory(path)
+    history1.record("requests", "host", 1000, 1.0)
+    history1.record("requests", "host", 2000, 1.0)
+    history1.record("pycurl", "host", 0, 1.0)
+    history2.record("pycurl", "host", 4000, 1.0)
+    history2.record("pycurl", "host", 8000, 1.0, jobs=4)
+    history1.save()
+    history2.save()
+    with open(path) as f:
+        stored = json.load(f)
+    assert get_history_key("requests", 1) == "requests --jobs 1"
+    assert stored["host"]["requests --jobs 1"]["throughput"] == pytest.approx(1300.0)
+    assert stored["host"]["requests --jobs 1"]["transfers"] == 2
+    assert stored["host"]["pycurl --jobs 1"]["throughput"] == 4000.0
+    assert stored["host"]["pycurl --jobs 4"]["throughput"] == 8000.0
+    assert ThroughputHistory(path).history == stored
+
+
+@pytest.mark.local
+def test_throughput_history_select(tmp_path, mocker):
+    """Test exploring unknown engines and then selecting the fastest one."""
+    history = ThroughputHistory(str(tmp_path / "throughput.json"))
+    engines = ["requests", "pycurl"]
+    assert history.select(engines, "host") == "requests"
+    history.record("requests", "host", 1000, 1.0)
+    assert history.select(engines, "host") == "pycurl"
+    history.record("pycurl", "host", 3000, 1.0)
+    random = mocker.patch("cernopendata_client.history.random")
+    random.random.return_value = 0.5
+    assert history.select(engines, "host") == "pycurl"
+    # runs with another number of jobs are not compared
+    assert history.select(engines, "host", jobs=4) == "requests"
+    # occasional re-exploration
+    random.random.return_value = 0.01
+    random.choice.return_value = "requests"
+    assert history.select(engines, "host") == "requests"
+    # stale history is refreshed
+    random.random.return_value = 0.5
+    history.history["host"]["requests --jobs 1"]["time"] = 0
+    assert history.select(engines, "host") == "requests"
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client HTTP/2 small file download benchmark.
+
+Many small files are downloaded with the pycurl-multi engine through a proxy
+adding network latency, once from the HTTP/1.1 stand-in server over kept-alive
+connections and once from an nghttpd HTTP/2 server multiplexing the transfers.
+Run with ``pytest -s tests/test_http2_benchmark.py`` to see the timings. The
+timings are only printed, so that the test does not depend on the load of the
+machine running it.
+"""
+
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+
+from cernopendata_client.config import DOWNLOAD_HTTP_VERSION
+from cernopendata_client.downloader import (
+    download_files_with_curl_multi,
+    get_part_path,
+)
+from cernopendata_client.session import configure_session
+
+BENCHMARK_FILES = 200
+BENCHMARK_FILE_SIZE = 2048
+BENCHMARK_JOBS = 4
+BENCHMARK_LATENCY = 0.01
+
+
+class LatencyProxy:
+    """Forward TCP connections to a server, delaying all data by a latency."""
+
+    def __init__(self, port, latency):
+        """Listen on a free local port and forward connections to a server port."""
+        self.port = port
+        self.latency = latency
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.url = "http://127.0.0.1:{}".format(self.listener.getsockname()[1])
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        """Forward every accepted connection to the server."""
+        while True:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(("127.0.0.1", self.port))
+            for src, dst in ((client, upstream), (upstream, client)):
+                self.pipe(src, dst)
+
+    def pipe(self, src, dst):
+        """Copy the data of a socket into another one after the latency."""
+        chunks = queue.Queue()
+
+        def read():
+            while True:
+                try:
+                    data = src.recv(65536)
+                except OSError:
+                    data = b""
+                chunks.put((time.monotonic() + self.latency, data))
+                if not data:
+                    return
+
+        def write():
+            while True:
+                due, data = chunks.get()
+                time.sleep(max(due - time.monotonic(), 0))
+                try:
+                    if not data:
+                        dst.shutdown(socket.SHUT_WR)
+                        return
+                    dst.sendall(data)
+                except OSError:
+                    return
+
+        threading.Thread(target=read, daemon=True).start()
+        threading.Thread(target=write, daemon=True).start()
+
+    def close(self):
+        """Stop accepting connections."""
+        self.listener.close()
+
+
+@pytest.fixture
+def nghttpd_server(tmp_path):
+    """Run an nghttpd HTTP/2 cleartext server serving a temporary directory."""
+    nghttpd = shutil.which("nghttpd")
+    if nghttpd is None:
+        pytest.skip("nghttpd is not installed")
+    root = tmp_path / "h2"
+    root.mkdir()
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen(
+        [nghttpd, "--no-tls", "-d", str(root), "-a", "127.0.0.1", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    yield root, port
+    process.terminate()
+    process.wait()
+
+
+def download_small_files(server_port, paths, dest, http_version):
+    """Return the time taken to download files through a latency proxy."""
+    proxy = LatencyProxy(server_port, BENCHMARK_LATENCY)
+    os.mkdir(dest)
+    configure_session(http_version=http_version)
+    try:
+        start = time.monotonic()
+        downloaded = download_files_with_curl_multi(
+            [(dest, proxy.url + path) for path in paths],
+            max_transfers=BENCHMARK_JOBS,
+            progress=False,
+        )
+        elapsed = time.monotonic() - start
+    finally:
+        configure_session(http_version=DOWNLOAD_HTTP_VERSION)
+        proxy.close()
+    assert len(downloaded) == len(paths)
+    return elapsed
+
+
+@pytest.mark.local
+def test_http2_small_files_benchmark(opendata_server, nghttpd_server):
+    """Test downloading many small files over HTTP/1.1 and HTTP/2 and time it."""
+    pytest.importorskip("pycurl")
+    root, http2_port = nghttpd_server
+    paths = []
+    for i in range(BENCHMARK_FILES):
+        path = "/eos/opendata/test/1/file{}.txt".format(i)
+        content = os.urandom(BENCHMARK_FILE_SIZE)
+        opendata_server.files[path] = content
+        (root / path[1:]).parent.mkdir(parents=True, exist_ok=True)
+        (root / path[1:]).write_bytes(content)
+        paths.append(path)
+    http1_time = download_small_files(
+        opendata_server.server_address[1], paths, "http1", "1.1"
+    )
+    http2_time = download_small_files(http2_port, paths, "http2", "2")
+    print(
+        "\n{} files of {} bytes, {} jobs, {} ms latency: "
+        "HTTP/1.1 keep-alive {:.2f} s, HTTP/2 multiplexing {:.2f} s "
+        "({:.1f}x)".format(
+            BENCHMARK_FILES,
+            BENCHMARK_FILE_SIZE,
+            BENCHMARK_JOBS,
+            int(BENCHMARK_LATENCY * 1000),
+            http1_time,
+            http2_time,
+            http1_time / http2_time,
+        )
+    )
+    for path in paths:
+        name = path.split("/")[-1]
+        for dest in ("http1", "http2"):
+            # batch downloads are renamed once validated by download_file
+            with open(get_part_path(os.path.join(dest, name)), "rb") as f:
+                assert f.read() == opendata_server.files[path]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download journal tests."""
+
+import pytest
+
+from cernopendata_client.journal import DownloadJournal, get_journal_path
+
+
+@pytest.mark.local
+def test_download_journal(tmp_path):
+    """Test that the download journal persists file states across instances."""
+    journal_path = get_journal_path(str(tmp_path / "1"))
+    assert journal_path == str(tmp_path / "1.journal")
+    file_dest = str(tmp_path / "file.txt")
+    journal = DownloadJournal(journal_path)
+    journal.plan([("root://server/file.txt", file_dest, 3)])
+    assert journal.get("root://server/file.txt")["state"] == "planned"
+    assert journal.get_downloaded_file("root://server/file.txt", file_dest) is None
+    journal.update("root://server/file.txt", "verified", 3, "adler32:024d0127")
+    with pytest.raises(ValueError):
+        journal.update("root://server/file.txt", "lost")
+    journal.close()
+
+    journal = DownloadJournal(journal_path)
+    # planning again keeps the state of known files
+    journal.plan([("root://server/file.txt", file_dest, 3)])
+    assert journal.get("root://server/file.txt")["state"] == "verified"
+    # the local file is missing
+    assert journal.get_downloaded_file("root://server/file.txt", file_dest) is None
+    with open(file_dest, "wb") as f:
+        f.write(b"abc")
+    assert journal.get_downloaded_file("root://server/file.txt", file_dest) == {
+        "name": "file.txt",
+        "size": 3,
+        "checksum": "adler32:024d0127",
+    }
+    journal.close()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download bandwidth limiting tests."""
+
+import threading
+import time
+
+import pytest
+
+from cernopendata_client.ratelimit import (
+    TokenBucket,
+    configure_rate_limit,
+    get_rate_limit,
+    get_rate_limiter,
+)
+
+
+@pytest.mark.local
+def test_token_bucket(mocker):
+    """Test that the token bucket allows a burst and then waits for tokens."""
+    clock = mocker.patch("cernopendata_client.ratelimit.time")
+    clock.monotonic.return_value = 100.0
+    bucket = TokenBucket(1000)
+    bucket.consume(500)
+    assert clock.sleep.call_count == 0
+    # chunks larger than the bucket put it in debt
+    bucket.consume(2000)
+    clock.sleep.assert_called_once_with(2.0)
+    clock.monotonic.return_value = 103.0
+    bucket.consume(500)
+    assert clock.sleep.call_count == 1
+
+
+@pytest.mark.local
+def test_token_bucket_concurrent():
+    """Test that concurrent consumers share the rate of the bucket."""
+    bucket = TokenBucket(100000)
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=lambda: [bucket.consume(10000) for _ in range(5)])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 200000 bytes minus the burst of 50000 bytes at 100000 bytes per second
+    assert time.monotonic() - start >= 1.4
+
+
+@pytest.mark.local
+def test_get_rate_limiter():
+    """Test that transfers have their own limit and share the global one."""
+    assert not get_rate_limiter()
+    configure_rate_limit(rate=1000, transfer_rate=500)
+    try:
+        assert get_rate_limit() == (1000, 500)
+        limiter1 = get_rate_limiter()
+        limiter2 = get_rate_limiter()
+        assert len(limiter1.buckets) == 2
+        assert limiter1.buckets[1] is limiter2.buckets[1]
+        assert limiter1.buckets[0] is not limiter2.buckets[0]
+        assert len(get_rate_limiter(per_transfer=False).buckets) == 1
+    finally:
+        configure_rate_limit()
+    assert get_rate_limit() == (None, None)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client retry policy tests."""
+
+import email.utils
+import time
+
+import pytest
+import requests
+
+from cernopendata_client.config import RETRY_BACKOFF_MAX
+from cernopendata_client.retry import (
+    CircuitBreaker,
+    RetryableError,
+    call_with_retry,
+    configure_retry,
+    get_retry_delay,
+    parse_retry_after,
+)
+
+
+@pytest.mark.local
+def test_parse_retry_after():
+    """Test parsing Retry-After headers in seconds and as HTTP dates."""
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after("soon") is None
+    date = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= parse_retry_after(date) <= 60
+
+
+@pytest.mark.local
+def test_get_retry_delay():
+    """Test that the retry delay backs off exponentially with jitter."""
+    for attempt in range(4):
+        delay = get_retry_delay(attempt, sleep=2)
+        assert 2**attempt <= delay <= 2 ** (attempt + 1)
+    assert get_retry_delay(30, sleep=2) <= RETRY_BACKOFF_MAX
+    assert get_retry_delay(0, retry_after=60, sleep=2) == 60
+
+
+@pytest.mark.local
+def test_circuit_breaker(mocker):
+    """Test that a failing host is paused and probed after the pause."""
+    clock = mocker.patch("cernopendata_client.retry.time")
+    clock.monotonic.return_value = 100.0
+    breaker = CircuitBreaker("opendata.cern.ch", threshold=3, pause=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.get_pause() == 0
+    breaker.record_failure()
+    assert breaker.get_pause() == 30
+    breaker.wait()
+    clock.sleep.assert_called_once_with(30)
+    # the first failure after the pause opens the circuit again
+    clock.monotonic.return_value = 130.0
+    breaker.record_failure()
+    assert breaker.get_pause() == 30
+    clock.monotonic.return_value = 160.0
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.get_pause() == 0
+
+
+@pytest.mark.local
+def test_call_with_retry(mocker):
+    """Test that transient failures are retried, resuming later attempts."""
+    sleep = mocker.patch("cernopendata_client.retry.time.sleep")
+    configure_retry(limit=3, sleep=1, breaker_threshold=10)
+    attempts = []
+
+    def attempt_request(attempt):
+        attempts.append(attempt)
+        if attempt == 0:
+            raise requests.exceptions.ConnectionError("connection refused")
+        if attempt == 1:
+            raise RetryableError("Server responded with status 503", retry_after=20)
+        return "done"
+
+    assert call_with_retry(attempt_request, "http://example.org/file") == "done"
+    assert attempts == [0, 1, 2]
+    assert 0.5 <= sleep.call_args_list[0][0][0] <= 1
+    assert sleep.call_args_list[1][0][0] == 20
+
+    # permanent failures are not retried
+    def fail(attempt):
+        attempts.append(attempt)
+        raise ValueError("permanent")
+
+    del attempts[:]
+    pytest.raises(ValueError, call_with_retry, fail, "http://example.org/file")
+    assert attempts == [0]
+
+    # the last failure is raised once the retries are exhausted
+    def fail_transiently(attempt):
+        raise RetryableError("Server responded with status 503")
+
+    pytest.raises(
+        RetryableError, call_with_retry, fail_transiently, "http://example.org/file"
+    )
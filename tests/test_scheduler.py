@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download scheduler tests."""
+
+import threading
+import time
+
+import pytest
+
+from cernopendata_client.scheduler import (
+    RecordPrefetcher,
+    TransferPool,
+    get_record_selectors,
+)
+
+
+@pytest.mark.local
+def test_get_record_selectors(opendata_server, mocker):
+    """Test selecting records by record IDs, DOIs and a paged search query."""
+    mocker.patch("cernopendata_client.searcher.SEARCH_PAGE_SIZE", 2)
+    for recid in range(1, 6):
+        opendata_server.add_record(recid, {"file.txt": b"data"})
+    opendata_server.searches["type:Dataset"] = ["3", "1", "4", "5"]
+    assert get_record_selectors(
+        opendata_server.url, (1, 2), ("10.7483/OPENDATA.TEST",), (), "type:Dataset"
+    ) == [
+        (1, None, None),
+        (2, None, None),
+        (3, None, None),
+        (4, None, None),
+        (5, None, None),
+        (None, "10.7483/OPENDATA.TEST", None),
+    ]
+    assert (
+        len([path for _, path, _ in opendata_server.requests if "q=type" in path]) == 2
+    )
+    assert get_record_selectors(opendata_server.url) == [(None, None, None)]
+    with pytest.raises(SystemExit) as e:
+        get_record_selectors(opendata_server.url, query="type:Nothing")
+    assert e.value.code == 2
+
+
+@pytest.mark.local
+def test_record_prefetcher(opendata_server):
+    """Test that record metadata is fetched a bounded number of records ahead."""
+    for recid in range(1, 7):
+        opendata_server.add_record(recid, {"file{}.txt".format(recid): b"data"})
+    selectors = [(recid, None, None) for recid in (1, 2, 9, 3, 1, 4, 5, 6)]
+    records = RecordPrefetcher(opendata_server.url, selectors, ahead=2)
+    iterator = iter(records)
+    assert next(iterator).recid == "1"
+    time.sleep(0.5)
+    assert sorted(
+        path.split("/")[-1]
+        for _, path, _ in opendata_server.requests
+        if path.startswith("/record/")
+    ) == ["1", "2", "9"]
+    assert [record_files.recid for record_files in iterator] == [
+        "2",
+        "3",
+        "4",
+        "5",
+        "6",
+    ]
+    assert records.failed == [(9, None, None)]
+
+
+@pytest.mark.local
+def test_transfer_pool():
+    """Test that the transfer pool bounds the queued transfers."""
+    pool = TransferPool(jobs=2)
+    release = threading.Event()
+    futures = []
+
+    def download_file(index, file_location):
+        release.wait()
+        if index == 3:
+            raise IOError("failed")
+
+    def submit():
+        for index in range(8):
+            futures.append(pool.submit(download_file, index, "file"))
+
+    thread = threading.Thread(target=submit)
+    thread.start()
+    time.sleep(0.2)
+    assert len(futures) == 4
+    release.set()
+    thread.join()
+    pool.close()
+    assert [index for index, future in enumerate(futures) if future.exception()] == [3]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client shared HTTP session tests."""
+
+import pytest
+
+from cernopendata_client.config import DOWNLOAD_HTTP_VERSION, HTTP_POOL_MAXSIZE
+from cernopendata_client.session import (
+    check_curl_http2_refused,
+    configure_session,
+    get_curl_http_version,
+    get_session,
+    is_curl_http2_available,
+)
+
+
+@pytest.mark.local
+def test_get_session():
+    """Test that the HTTP session is shared and honours the pool limits."""
+    assert get_session() is get_session()
+    session = get_session()
+    configure_session(pool_maxsize=32)
+    assert get_session() is not session
+    assert get_session().get_adapter("https://opendata.cern.ch")._pool_maxsize == 32
+    configure_session(pool_maxsize=HTTP_POOL_MAXSIZE)
+
+
+@pytest.mark.local
+def test_get_curl_http_version():
+    """Test the negotiation of HTTP/2 and the fallback to HTTP/1.1."""
+    pycurl = pytest.importorskip("pycurl")
+    if not is_curl_http2_available():
+        pytest.skip("libcurl is built without HTTP/2 support")
+    https_location = "https://opendata.cern.ch/eos/opendata/file.root"
+    http_location = "http://127.0.0.1:1/eos/opendata/file.root"
+    assert get_curl_http_version(https_location) == pycurl.CURL_HTTP_VERSION_2TLS
+    assert get_curl_http_version(http_location) == pycurl.CURL_HTTP_VERSION_1_1
+    try:
+        configure_session(http_version="1.1")
+        assert get_curl_http_version(https_location) == pycurl.CURL_HTTP_VERSION_1_1
+        configure_session(http_version="2")
+        prior_knowledge = pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE
+        assert get_curl_http_version(http_location) == prior_knowledge
+        assert not check_curl_http2_refused(
+            http_location, prior_knowledge, pycurl.E_HTTP2, responded=True
+        )
+        assert check_curl_http2_refused(http_location, prior_knowledge, pycurl.E_HTTP2)
+        assert get_curl_http_version(http_location) == pycurl.CURL_HTTP_VERSION_1_1
+    finally:
+        configure_session(http_version=DOWNLOAD_HTTP_VERSION)
@@ -12,7 +12,12 @@
 import click
 import pytest
 
-from cernopendata_client.utils import parse_parameters
+from cernopendata_client.utils import (
+    format_size,
+    parse_parameters,
+    parse_rate,
+    parse_size,
+)
 
 
 @pytest.mark.local
@@ -21,3 +26,34 @@ def test_parse_parameters():
     pytest.raises(SystemExit, parse_parameters, (9))
     assert parse_parameters(("test.py",)) == ["test.py"]
     assert parse_parameters(("2-4,9-12",)) == ["2-4", "9-12"]
+
+
+@pytest.mark.local
+def test_format_size():
+    """Test format_size() method."""
+    assert format_size(100) == "100 B"
+    assert format_size(2048) == "2.0 KiB"
+    assert format_size(5 * 1024**3) == "5.0 GiB"
+    assert format_size(3 * 1024**5) == "3072.0 TiB"
+
+
+@pytest.mark.local
+def test_parse_rate():
+    """Test parse_rate() method."""
+    assert parse_rate(None) is None
+    assert parse_rate("0") is None
+    assert parse_rate("1000") == 1000
+    assert parse_rate("1.5k") == 1536
+    assert parse_rate("50M") == 50 * 1024**2
+    assert parse_rate("1G") == 1024**3
+    pytest.raises(SystemExit, parse_rate, "fast")
+    pytest.raises(SystemExit, parse_rate, "-1M")
+
+
+@pytest.mark.local
+def test_parse_size():
+    """Test parse_size() method."""
+    assert parse_size(None) is None
+    assert parse_size("2T") == 2 * 1024**4
+    assert parse_size("100g") == 100 * 1024**3
+    pytest.raises(SystemExit, parse_size, "big")
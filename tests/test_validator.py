@@ -16,9 +16,11 @@ from cernopendata_client.validator import (
     validate_recid,
     validate_server,
     validate_range,
+    validate_shard,
     validate_directory,
     validate_retry_limit,
     validate_retry_sleep,
+    validate_jobs,
 )
 
 
@@ -54,6 +56,17 @@ def test_validate_range():
     pytest.raises(SystemExit, validate_range, "3,2", 5)
 
 
+@pytest.mark.local
+def test_validate_shard():
+    """Test validate_shard()."""
+    assert validate_shard(shard="1/4") is True
+    assert validate_shard(shard="4/4") is True
+    pytest.raises(SystemExit, validate_shard, "0/4")
+    pytest.raises(SystemExit, validate_shard, "5/4")
+    pytest.raises(SystemExit, validate_shard, "1-4")
+    pytest.raises(SystemExit, validate_shard, "1/4/2")
+
+
 @pytest.mark.local
 def test_validate_directory():
     """Test validate_directory()."""
@@ -82,3 +95,13 @@ def test_validate_retry_sleep():
     pytest.raises(SystemExit, validate_retry_sleep, 0)
     pytest.raises(SystemExit, validate_retry_sleep, None)
     assert validate_retry_sleep(1) is True
+
+
+@pytest.mark.local
+def test_validate_jobs():
+    """Test validate_jobs()."""
+    pytest.raises(SystemExit, validate_jobs, 0)
+    pytest.raises(SystemExit, validate_jobs, -1)
+    pytest.raises(SystemExit, validate_jobs, None)
+    assert validate_jobs(1) is True
+    assert validate_jobs(8) is True
@@ -12,12 +12,15 @@
 import os
 import subprocess
 import tempfile
+import zlib
 
 import pytest
 import requests
 
 from cernopendata_client.cli import download_files, verify_files
 from cernopendata_client.verifier import (
+    combine_adler32,
+    get_file_adler32,
     get_file_size,
     get_file_checksum,
     get_file_info_local,
@@ -39,6 +42,23 @@ def test_get_file_checksum():
     assert get_file_checksum(afile) == "adler32:41cdd471"
 
 
+@pytest.mark.local
+def test_get_file_adler32():
+    """Test get_file_adler32()."""
+    afile = "./tests/test_version.py"
+    assert get_file_adler32(afile) == 0x41CDD471
+
+
+@pytest.mark.local
+def test_combine_adler32():
+    """Test combine_adler32() against ADLER32 of concatenated data."""
+    for size1, size2 in [(0, 10), (10, 0), (1000, 70000), (65521, 65522)]:
+        data1, data2 = os.urandom(size1), os.urandom(size2)
+        assert combine_adler32(
+            zlib.adler32(data1), zlib.adler32(data2), size2
+        ) == zlib.adler32(data1 + data2)
+
+
 def test_get_file_checksum_zero_padding():
     """Test get_file_checksum() zero-pads checksums to 8 hex characters.
 
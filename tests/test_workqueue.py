@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of cernopendata-client.
+#
+# Copyright (C) 2026 CERN.
+#
+# cernopendata-client is free software; you can redistribute it and/or modify
+# it under the terms of the GPLv3 license; see LICENSE file for more details.
+
+"""cernopendata-client download work queue tests."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from cernopendata_client.workqueue import (
+    WorkQueue,
+    download_files_with_queue,
+    get_queue_path,
+)
+
+
+@pytest.mark.local
+def test_get_queue_path():
+    """Test that the work queue is stored next to the record directory."""
+    assert get_queue_path("5500") == "5500.queue"
+    assert get_queue_path("downloads/5500/") == "downloads/5500.queue"
+
+
+@pytest.mark.local
+def test_work_queue_claim(tmp_path):
+    """Test that a file is claimed by one process at a time."""
+    queue1 = WorkQueue(str(tmp_path / "1.queue"))
+    queue2 = WorkQueue(str(tmp_path / "1.queue"))
+    try:
+        assert queue1.claim("http://example.org/file1.root")
+        assert not queue2.claim("http://example.org/file1.root")
+        assert queue2.claim("http://example.org/file2.root")
+        queue2.release("http://example.org/file2.root")
+        assert queue1.claim("http://example.org/file2.root")
+        queue1.complete("http://example.org/file1.root")
+        assert queue2.is_done("http://example.org/file1.root")
+        assert not queue2.claim("http://example.org/file1.root")
+    finally:
+        queue1.close()
+        queue2.close()
+    # closing a queue releases the files it claimed
+    queue3 = WorkQueue(str(tmp_path / "1.queue"))
+    assert queue3.claim("http://example.org/file2.root")
+    queue3.close()
+
+
+@pytest.mark.local
+def test_work_queue_reclaim(tmp_path):
+    """Test that abandoned leases are reclaimed and renewed ones are not."""
+    queue1 = WorkQueue(str(tmp_path / "1.queue"), lease_time=0.3)
+    queue2 = WorkQueue(str(tmp_path / "1.queue"), lease_time=0.3)
+    try:
+        assert queue1.claim("http://example.org/file1.root")
+        time.sleep(0.5)
+        assert not queue2.claim("http://example.org/file1.root")
+        # the process holding the lease stops renewing it
+        queue1.stopped.set()
+        queue1.renewer.join()
+        lease_path = queue1.get_lease_path("http://example.org/file1.root")
+        os.utime(lease_path, (time.time() - 10, time.time() - 10))
+        assert queue2.claim("http://example.org/file1.root")
+        with open(lease_path) as f:
+            assert f.read() == queue2.worker
+        # the former owner does not drop the reclaimed lease
+        queue1.release("http://example.org/file1.root")
+        assert os.path.exists(lease_path)
+    finally:
+        queue1.close()
+        queue2.close()
+
+
+@pytest.mark.local
+def test_download_files_with_queue(tmp_path):
+    """Test that concurrent processes download every file exactly once."""
+    file_locations = ["http://example.org/file{}.root".format(i) for i in range(20)]
+    downloads = []
+    failures = []
+
+    def worker(name):
+        def download_file(index, file_location):
+            downloads.append((name, file_location))
+            time.sleep(0.01)
+
+        queue = WorkQueue(str(tmp_path / "1.queue"), lease_time=0.3)
+        failures.extend(
+            download_files_with_queue(download_file, file_locations, 2, None, queue)
+        )
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert failures == []
+    assert sorted(location for _, location in downloads) == sorted(file_locations)
+    assert len({name for name, _ in downloads}) > 1
+    assert os.listdir(str(tmp_path / "1.queue" / "leases")) == []
+    assert len(os.listdir(str(tmp_path / "1.queue" / "done"))) == 20